@@ -8,7 +8,7 @@ Updated 2022/09 by Junliang
 import logging
 from collections import OrderedDict
 from math import ceil, floor
-from typing import Union, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
 from nifpga import Session
@@ -375,12 +375,37 @@ class NEEL_DAC(Instrument):
         """
         # TODO: move this block to dac.panel.channel and check if panel or channel is first
         values = np.zeros((self.max_panels, self.max_channels), dtype=float)
-        for panel in self.panels():
-            for channel in range(self.max_channels):
-                values[panel, channel] = self.get_value(panel, channel, precision)
+        channels = [(panel, channel) for panel in self.panels() for channel in range(self.max_channels)]
+        for (panel, channel), value in zip(channels, self.read_channel_values(channels, precision)):
+            values[panel, channel] = value
         return values
 
     def get_value(self, panel, channel, precision: Optional[int] = 4):
+        return self.read_channel_values([(panel, channel)], precision)[0]
+
+    def get_bulk_values(self, params: List[Parameter]) -> Dict[Parameter, float]:
+        """
+        Bulk snapshot protocol (see qube.measurement.parallel.snapshot_parameters).
+        The values of the channel parameters (dac.pX.cY.v) are read with a single call of .read_channel_values.
+        Other parameters are read one by one.
+        Returns:
+            dictionary {param: value}
+        """
+        channel_params = [p for p in params if isinstance(p.instrument, NEEL_DAC_Channel) and p.name == 'v']
+        channels = [(p.instrument.panel, p.instrument.channel) for p in channel_params]
+        values = {p: float(v) for p, v in zip(channel_params, self.read_channel_values(channels))}
+        for p in params:
+            if p not in values:
+                values[p] = p()
+        return values
+
+    def read_channel_values(self, channels: List[Tuple[int, int]], precision: Optional[int] = 4) -> List[float]:
+        """
+        Read the DAC values of several (panel, channel).
+        An eventual unfinished retrieving sequence is cleared once for all the channels. Then each channel is read
+        with its own retrieving handshake (DAC to retrieve, get/got DAC value, DAC data), since the FPGA has no
+        register to read several channels at once.
+        """
         # Get rid of an eventual unfinished retrieving sequence
         get_value = self.ref.registers['get DAC value']
         got_value = self.ref.registers['got DAC value']
@@ -396,21 +421,24 @@ class NEEL_DAC(Instrument):
         vrange = self.voltage_range
         to_real_unit = lambda v: (v - res) / res * vrange
 
-        num = panel * self.max_panels + channel
-        retrieve.write(num)
-        got_value.write(True)
-        get_value.write(True)
-        while got_value.read():
-            pass
-        value = data.read()
-        panel_channel, value = split_number(value, size=32)
-        # panel = int(panel_channel) // self.max_panels
-        # channel = int(panel_channel) % self.max_channels
-        value = to_real_unit(value)
-        got_value.write(True)
-        if precision:
-            value = np.round(value, precision)
-        return value
+        values = []
+        for panel, channel in channels:
+            num = panel * self.max_panels + channel
+            retrieve.write(num)
+            got_value.write(True)
+            get_value.write(True)
+            while got_value.read():
+                pass
+            value = data.read()
+            panel_channel, value = split_number(value, size=32)
+            # panel = int(panel_channel) // self.max_panels
+            # channel = int(panel_channel) % self.max_channels
+            value = to_real_unit(value)
+            got_value.write(True)  # end of the retrieving sequence of this channel
+            if precision:
+                value = np.round(value, precision)
+            values.append(value)
+        return values
 
     """===================================
     get/set for parameters
@@ -1734,6 +1762,9 @@ class Virtual_NEEL_DAC(NEEL_DAC):
         c = getattr(p, f'c{channel}')
         return c.v()
 
+    def read_channel_values(self, channels: List[Tuple[int, int]], precision: Optional[int] = 4) -> List[float]:
+        return [self._values[panel, channel] for panel, channel in channels]
+
     def set_values(self, arr):
         """
         arr: array of values with shape (max_panels x max_channels) --> same as get_values()
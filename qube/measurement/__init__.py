@@ -1,3 +1,5 @@
 from qube.measurement.content import qcodes_to_datafile, run_id_to_datafile
 from qube.measurement.controls import Controls
-from qube.measurement.sweeper import Sweeper
\ No newline at end of file
+from qube.measurement.sweeper import Sweeper
+from qube.measurement.async_sweeper import AsyncSweeper
+from qube.measurement.scheduler import SweepQueue
@@ -0,0 +1,249 @@
+import heapq
+import itertools
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+from qcodes import Parameter, DelegateParameter
+
+from qube.measurement.traversal import snake_order
+
+
+def gradient_loss(values: np.ndarray, points: np.ndarray) -> float:
+    """
+    Variation of the readout inside a cell multiplied by the size of the cell.
+    values: readout value at each corner of the cell, shape (corners, ...)
+    points: grid index of each corner of the cell, shape (corners, ndims)
+    """
+    values = np.asarray(values, dtype=float).reshape(len(values), -1)
+    variation = np.nanmax(np.ptp(values, axis=0))
+    size = np.linalg.norm(np.ptp(points, axis=0))
+    return float(variation * size) if np.isfinite(variation) else 0.
+
+
+def curvature_loss(values: np.ndarray, points: np.ndarray) -> float:
+    """
+    Maximum deviation of the readout at the corners of a cell from a linear fit (plane for 2 dims).
+    For cells with a single dimension (only 2 corners), it is the same as gradient_loss.
+    values: readout value at each corner of the cell, shape (corners, ...)
+    points: grid index of each corner of the cell, shape (corners, ndims)
+    """
+    values = np.asarray(values, dtype=float).reshape(len(values), -1)
+    points = np.asarray(points, dtype=float)
+    points = points[:, np.ptp(points, axis=0) > 0]
+    if points.shape[1] < 2 or not np.all(np.isfinite(values)):
+        return gradient_loss(values, points)
+    a = np.concatenate([np.ones((len(points), 1)), points], axis=1)
+    coef = np.linalg.lstsq(a, values, rcond=None)[0]
+    return float(np.max(np.abs(a @ coef - values)))
+
+
+LOSSES = {
+    'gradient': gradient_loss,
+    'curvature': curvature_loss,
+}
+
+
+class AdaptivePlan(object):
+    def __init__(self, sweep_parameters: Iterable, sweep_shape: Iterable[int],
+                 readout: Union[Any, Callable[[Dict], Any]],
+                 loss: Union[str, Callable[[np.ndarray, np.ndarray], float]] = 'gradient',
+                 initial_step: Union[int, Iterable[int]] = 4, max_points: int = None, max_time: float = None):
+        """
+        Sweep instructions that are generated from the measured results (adaptive refinement).
+        The sweep grid (sweep_shape) is the finest grid that can be measured. It starts with a coarse grid, where
+        every initial_step-th point of each dim is measured, and then it splits the cell (box between measured
+        points) with the largest loss into smaller cells and measures their new corners. It finishes when all the
+        cells have been refined, when max_points have been measured or after max_time seconds.
+
+        sweep_parameters: list of SweepParameter
+        sweep_shape: points for each dim
+        readout: qcodes parameter used to evaluate the loss, or function f(results) of the dictionary
+            {readout: value} of a step, which returns the value used to evaluate the loss.
+        loss: 'gradient', 'curvature' or custom function f(values, points) -> float (see gradient_loss)
+        initial_step: step (in points) of the coarse grid for all the dims or for each dim.
+        max_points: maximum number of measured points. If it is None, no limit.
+        max_time: maximum time in seconds. If it is None, no limit.
+
+        Iterating over the plan yields {qcodes parameter: value} dictionaries like SweepPlan, but the next steps are
+        only known after the results of the previous steps have been added with .add_result.
+        .order contains the canonical index (see traversal.get_traversal_order) of the points measured so far.
+        """
+        self.sweep_parameters = list(sweep_parameters)
+        self.sweep_shape = np.array(tuple(sweep_shape), dtype=int)
+        self.readout = readout
+        self.loss = self._get_loss_function(loss)
+        self.initial_step = self._get_initial_step(initial_step)
+        self.max_points = None if max_points is None else int(max_points)
+        self.max_time = max_time
+        self.parameters = [p.parameter for p in self.sweep_parameters]
+        self.order = []
+        self._values = {}  # {canonical index: value for the loss}
+        self._strides = np.concatenate([[1], np.cumprod(self.sweep_shape)[:-1]]).astype(int)
+        self._last_indices = [None] * len(self.sweep_parameters)
+        self._t_start = None
+        for sparam in self.sweep_parameters:
+            sparam.set_sweep_shape(self.sweep_shape)
+        self._sweep_values = [sparam.values for sparam in self.sweep_parameters]  # generated once
+
+    @property
+    def total_grid_points(self) -> int:
+        return int(np.prod(self.sweep_shape))
+
+    def add_result(self, step: int, results: Dict[Any, Any]):
+        """
+        Add the readout results of a step (results = {readout: value}).
+        """
+        index = self.order[step]
+        if isinstance(self.readout, (Parameter, DelegateParameter)):
+            value = results[self.readout]
+        else:
+            value = self.readout(results)
+        self._values[index] = value
+
+    def get_instruction(self, index: int) -> Dict[Any, Any]:
+        """
+        Dictionary {qcodes parameter: value} to go to a canonical index. Values are only applied if they are
+        different from the last applied values (or if refresh is True).
+        """
+        d = {}
+        for k, sparam in enumerate(self.sweep_parameters):
+            if sparam.apply is False:
+                continue
+            i = int(sparam.get_value_index(index))
+            if sparam.refresh is True or self._last_indices[k] != i:
+                d[sparam.parameter] = self._sweep_values[k][i]
+                self._last_indices[k] = i
+        return d
+
+    def get_order(self) -> np.ndarray:
+        """ Canonical index of the points measured so far """
+        return np.array(self.order, dtype=np.intp)
+
+    def __len__(self):
+        """ Maximum number of steps """
+        total = self.total_grid_points
+        return total if self.max_points is None else min(total, self.max_points)
+
+    def __iter__(self) -> Iterator[Dict[Any, Any]]:
+        self._t_start = time.perf_counter()
+        self._last_indices = [None] * len(self.sweep_parameters)
+        self.order = []
+        self._values = {}
+        measured = set()
+        for point in self._get_coarse_points():
+            if self._is_finished():
+                return
+            yield self._measure(point, measured)
+
+        cells = []
+        counter = itertools.count()  # tie breaker for the heap
+        for cell in self._get_coarse_cells():
+            self._push_cell(cells, counter, cell)
+        while cells:
+            _, _, _, cell = heapq.heappop(cells)
+            children = self._split_cell(cell)
+            for child in children:
+                for point in self._get_corners(child):
+                    if self._get_canonical_index(point) in measured:
+                        continue
+                    if self._is_finished():
+                        return
+                    yield self._measure(point, measured)
+                self._push_cell(cells, counter, child)
+
+    def _measure(self, point, measured: set) -> Dict[Any, Any]:
+        index = self._get_canonical_index(point)
+        measured.add(index)
+        self.order.append(index)
+        return self.get_instruction(index)
+
+    def _is_finished(self) -> bool:
+        if self.max_points is not None and len(self.order) >= self.max_points:
+            return True
+        if self.max_time is not None and time.perf_counter() - self._t_start >= self.max_time:
+            return True
+        return False
+
+    def _push_cell(self, cells: List, counter, cell):
+        lower, upper = cell
+        if np.all(upper - lower <= 1):
+            return  # cannot be split
+        points = np.array(self._get_corners(cell))
+        values = np.array([self._values.get(self._get_canonical_index(p), np.nan) for p in points])
+        loss = float(self.loss(values, points))
+        loss = 0. if np.isnan(loss) else loss
+        size = float(np.prod(upper - lower))
+        heapq.heappush(cells, (-loss, -size, next(counter), cell))
+
+    def _get_coarse_axes(self) -> List[np.ndarray]:
+        axes = []
+        for pts, step in zip(self.sweep_shape, self.initial_step):
+            axes.append(np.unique(np.append(np.arange(0, pts, step), pts - 1)))
+        return axes
+
+    def _get_coarse_points(self) -> List[np.ndarray]:
+        """ Points of the coarse grid in snake order """
+        axes = self._get_coarse_axes()
+        shape = [len(ax) for ax in axes]
+        coarse = np.array(np.unravel_index(snake_order(shape), shape, order='F')).T
+        return [np.array([ax[i] for ax, i in zip(axes, idx)]) for idx in coarse]
+
+    def _get_coarse_cells(self) -> List:
+        axes = self._get_coarse_axes()
+        bounds = [list(zip(ax[:-1], ax[1:])) if len(ax) > 1 else [(ax[0], ax[0])] for ax in axes]
+        cells = []
+        for cell_bounds in itertools.product(*bounds):
+            lower = np.array([b[0] for b in cell_bounds], dtype=int)
+            upper = np.array([b[1] for b in cell_bounds], dtype=int)
+            cells.append((lower, upper))
+        return cells
+
+    @staticmethod
+    def _split_cell(cell) -> List:
+        """ Split a cell in 2 along each dim with more than one point inside """
+        lower, upper = cell
+        splits = []
+        for lo, up in zip(lower, upper):
+            if up - lo >= 2:
+                mid = (lo + up) // 2
+                splits.append([(lo, mid), (mid, up)])
+            else:
+                splits.append([(lo, up)])
+        children = []
+        for child_bounds in itertools.product(*splits):
+            child_lower = np.array([b[0] for b in child_bounds], dtype=int)
+            child_upper = np.array([b[1] for b in child_bounds], dtype=int)
+            children.append((child_lower, child_upper))
+        return children
+
+    @staticmethod
+    def _get_corners(cell) -> List[np.ndarray]:
+        lower, upper = cell
+        corners = itertools.product(*[sorted({lo, up}) for lo, up in zip(lower, upper)])
+        return [np.array(c, dtype=int) for c in corners]
+
+    def _get_canonical_index(self, point: np.ndarray) -> int:
+        return int(np.dot(point, self._strides))
+
+    def _get_initial_step(self, step) -> np.ndarray:
+        step = np.array(step, dtype=int).reshape(-1)
+        if step.size == 1:
+            step = np.full(len(self.sweep_shape), step[0])
+        if step.size != len(self.sweep_shape):
+            raise ValueError('initial_step must be an integer or a list with one integer per dim')
+        if np.any(step < 1):
+            raise ValueError('initial_step must be >= 1')
+        return step
+
+    @staticmethod
+    def _get_loss_function(loss):
+        if callable(loss):
+            return loss
+        if loss not in LOSSES:
+            raise ValueError(f'Unknown loss ({loss}). Valid losses are {list(LOSSES.keys())} or a function')
+        return LOSSES[loss]
+
+    def __repr__(self):
+        names = [p.name for p in self.parameters]
+        return f'AdaptivePlan - measured: {len(self.order)}/{len(self)} - parameters: {names}'
@@ -0,0 +1,240 @@
+import asyncio
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Union
+
+from qube.measurement.parallel import group_by_instrument, set_parameters
+from qube.measurement.sweeper import Sweeper, SweepPlan, WriteBuffer, QcParamType
+from qube.measurement.adaptive import AdaptivePlan
+
+
+class AsyncSweeper(Sweeper):
+    def __init__(self, name='Sweep'):
+        """
+        Sweeper whose loop is executed by an asyncio event loop. It has the same configuration as Sweeper, but:
+            - apply and readout methods can be coroutine functions (async def f(...)). Synchronous methods are
+              executed in threads, so they don't block the event loop.
+              Ex: async def readout(params): await wait_until_finished(); return {p: p() for p in params}
+            - the default apply/readout methods (.async_apply, .async_readout) group the parameters by root
+              instrument and the instruments are set/readout concurrently. The time of each instrument is saved in
+              the time report (ex: 'readout[dmm]').
+            - callbacks and the progress bar are executed in a separate thread, in order, while the next steps are
+              acquired. An error in a callback stops the sweep. At most .callback_queue_size callbacks can be
+              pending; after that, the sweep waits for them.
+              The rate of the callbacks is limited by .set_callback_rate as in Sweeper.
+            - pipeline mode (see .set_pipeline) is not supported: .execute and .resume raise ValueError if it is
+              enabled.
+        Results are saved in the thread that executes the sweep, which owns the qcodes database connection.
+
+        If .execute is called from a thread with a running event loop (ex: jupyter notebook), the sweep is executed
+        in another thread. Use .execute_async to await the sweep without blocking the event loop.
+        Example:
+            sw = AsyncSweeper()
+            sw.sweep_linear(V1, 0, 1, dim=1)
+            sw.set_sweep_shape([100])
+            sw.set_readouts(zi_demod, daq_trace)
+            run_id = sw.execute()  # or: run_id = await sw.execute_async()
+        """
+        super().__init__(name)
+        self.callback_queue_size = 100
+        self.async_apply_method = self.async_apply
+        self.async_readout_method = self.async_readout
+        self.apply_method = self._sync_apply
+        self.readout_method = self._sync_readout
+
+    async def execute_async(self, test_run=False, **kwargs) -> int:
+        """
+        Coroutine version of .execute. The sweep is executed in another thread and the event loop is not blocked.
+        """
+        return await asyncio.to_thread(self.execute, test_run, **kwargs)
+
+    async def resume_async(self, run_id: int, **kwargs) -> int:
+        """
+        Coroutine version of .resume.
+        """
+        return await asyncio.to_thread(self.resume, run_id, **kwargs)
+
+    def reset(self):
+        super().reset()
+        self.callback_queue_size = 100
+        self.async_apply_method = self.async_apply
+        self.async_readout_method = self.async_readout
+        self.apply_method = self._sync_apply
+        self.readout_method = self._sync_readout
+
+    clear_all = reset  # alias for reset
+
+    def set_apply_method(self, f: Callable[[Dict[QcParamType, Any]], None]):
+        """
+        Custom apply method to set qcodes parameter values.
+        f is a function or a coroutine function which takes a dictionary ({qcodes_param: value}) as the only argument.
+        """
+        self.async_apply_method = f
+
+    def set_readout_method(self, f: Callable[[List[QcParamType]], Dict[QcParamType, Any]]):
+        """
+        Custom readout method to get qcodes parameter values.
+        f is a function or a coroutine function which takes a list of qcodes parameters as the only argument.
+        Returns:
+            dictionary {qcodes_param: value}
+        """
+        self.async_readout_method = f
+
+    def set_callback_queue_size(self, size: int):
+        """
+        Maximum number of callbacks waiting to be executed before the sweep waits for them.
+        """
+        size = int(size)
+        if size < 1:
+            raise ValueError('Callback queue size must be >= 1')
+        self.callback_queue_size = size
+
+    async def async_apply(self, instr: Dict[QcParamType, Any]):
+        """
+        Default apply method. The parameters are grouped by root instrument and each group is set in a thread, so
+        different instruments are set concurrently while the parameters of the same instrument are set in order.
+        The waiting time after applying depends on .apply_settle (see .set_config).
+        """
+        groups = group_by_instrument(instr.items(), key=lambda item: item[0])
+        settle = self.apply_settle
+        skip = settle is not False
+        delays = await self._gather_groups('apply', lambda items: set_parameters(items, skip_post_delay=skip), groups)
+        if settle is True:
+            await asyncio.sleep(max(delays, default=0))
+        elif skip:
+            await asyncio.sleep(float(settle))
+
+    async def async_readout(self, qc_params: List[QcParamType]) -> Dict[QcParamType, Any]:
+        """
+        Default readout method. The parameters are grouped by root instrument and each group is readout in a thread,
+        so the waiting times of different instruments overlap.
+        """
+        groups = group_by_instrument(qc_params)
+        outputs = await self._gather_groups('readout', self.default_readout, groups)
+        values = {}
+        [values.update(output) for output in outputs]
+        return {param: values[param] for param in qc_params}
+
+    """ Private methods """
+
+    def _execute(self, plan: Union[SweepPlan, AdaptivePlan], **kwargs) -> int:
+        if self.pipeline:
+            raise ValueError('AsyncSweeper cannot be executed in pipeline mode')
+        if not self._has_running_loop():
+            return super()._execute(plan, **kwargs)
+        # The loop of the sweep cannot run in a thread which already has a running event loop (ex: jupyter)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{self.name}_sweep') as executor:
+            return executor.submit(super()._execute, plan, **kwargs).result()
+
+    def _run_loop(self, datasaver, writer: WriteBuffer, bar, ordered_instrs, readouts, total_pts):
+        asyncio.run(self._run_loop_async(datasaver, writer, bar, ordered_instrs, readouts, total_pts))
+
+    async def _run_loop_async(self, datasaver, writer: WriteBuffer, bar, ordered_instrs, readouts, total_pts):
+        loop = asyncio.get_running_loop()
+        save = lambda index, results: self._save_step(datasaver, writer, index, results)
+        feedback = getattr(ordered_instrs, 'add_result', None)  # for adaptive sweeps
+        pending = collections.deque()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{self.name}_callbacks')
+        throttle = self._create_throttle(total_pts)
+        active = bar is not None or len(self._callback_methods) > 0
+        try:
+            for i, instr in self._get_steps(ordered_instrs):
+                results, timings = await self._run_step_async(i, instr, readouts, total_pts, save=save)
+                if feedback is not None: feedback(i, results)
+                if not active:
+                    continue
+                if not throttle.ready(i):
+                    throttle.hold(bar, i, results, timings)
+                    continue
+                pending.append(loop.run_in_executor(executor, self._callback_step, bar, i, results, timings))
+                while pending and (pending[0].done() or len(pending) > self.callback_queue_size):
+                    await pending.popleft()  # raise the errors of the callbacks
+            step = throttle.flush()
+            if step is not None:
+                pending.append(loop.run_in_executor(executor, self._callback_step, *step))
+            while pending:
+                await pending.popleft()
+        finally:
+            [future.cancel() for future in pending]
+            executor.shutdown(wait=True)
+
+    async def _run_step_async(self, index, instr, readouts, total_pts, save: Callable = None):
+        """
+        Coroutine version of ._run_step
+        """
+        if instr is None:
+            return self._skip_step(index, total_pts, save=save)
+        # Apply parameter values
+        self._start_step()
+        if self._ramp_policies: await asyncio.to_thread(self._ramp, instr)
+        await self._call(self.async_apply_method, instr)
+        self._end_apply()
+
+        # Perform readout
+        await self._call_process(self.pre_readout, self.pre_readout_wait)
+        self._start_readout()
+        if self._armed_fast_axis is not None:
+            await asyncio.to_thread(self._armed_fast_axis.acquire)
+        results = await self._call(self.async_readout_method, readouts)
+        self._end_readout(index, results, save=save)
+
+        await self._call_process(self.post_readout, self.post_readout_wait)
+        return self._end_step(index, results, total_pts)
+
+    async def _gather_groups(self, key: str, func: Callable[[List], Any], groups: Dict[Any, List]) -> List[Any]:
+        """
+        Execute func(items) for each group in a thread and wait for all of them.
+        The time of each group is added to the group timers (ex: 'readout[dmm]').
+        """
+        instruments = list(groups.keys())
+        outputs = await asyncio.gather(*[asyncio.to_thread(_timed_call, func, items) for items in groups.values()])
+        values = []
+        for instrument, (value, duration) in zip(instruments, outputs):
+            self._get_group_timer(key, instrument).add(duration)
+            values.append(value)
+        return values
+
+    async def _call_process(self, process: Callable, wait: Union[int, float]):
+        if wait < 0:
+            raise ValueError('Waiting time should be >=0')
+        if len(process.funcs) > 0:
+            await asyncio.to_thread(process)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @staticmethod
+    async def _call(method: Callable, arg):
+        if asyncio.iscoroutinefunction(method):
+            return await method(arg)
+        return await asyncio.to_thread(method, arg)
+
+    def _is_concurrent_apply(self) -> bool:
+        return getattr(self.async_apply_method, '__func__', None) is AsyncSweeper.async_apply
+
+    def _sync_apply(self, instr: Dict[QcParamType, Any]):
+        """ Apply method used outside the sweep loop (start_at and return_to) """
+        return self._run_sync(self.async_apply_method, instr)
+
+    def _sync_readout(self, qc_params: List[QcParamType]) -> Dict[QcParamType, Any]:
+        return self._run_sync(self.async_readout_method, qc_params)
+
+    @staticmethod
+    def _run_sync(method: Callable, arg):
+        if asyncio.iscoroutinefunction(method):
+            return asyncio.run(method(arg))
+        return method(arg)
+
+    @staticmethod
+    def _has_running_loop() -> bool:
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+
+
+def _timed_call(func: Callable, items):
+    t0 = time.perf_counter()
+    output = func(items)
+    return output, time.perf_counter() - t0
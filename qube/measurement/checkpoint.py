@@ -0,0 +1,77 @@
+import json
+import time
+from typing import Any, Callable, Dict
+
+import numpy as np
+from qcodes.dataset.data_set import DataSetProtocol
+
+CHECKPOINT_TAG = 'sweep_checkpoint'
+
+
+class Checkpoint(object):
+    def __init__(self, datasaver, config: Dict[str, Any], interval: float = 10,
+                 on_save: Callable[[int], None] = None):
+        """
+        Persist the progress of a sweep in the metadata of its qcodes dataset (tag 'sweep_checkpoint'), so an
+        interrupted sweep can be continued with Sweeper.resume.
+        datasaver: qcodes DataSaver of the sweep
+        config: json serializable dictionary describing the sweep (see Sweeper.get_checkpoint_config)
+        interval: minimum time in seconds between two checkpoints in .update
+        on_save: function f(steps) executed before saving a checkpoint, where steps is the number of saved steps.
+            It is used to write the pending results (ex: WriteBuffer.flush).
+        The saved checkpoint is the config with:
+            'completed_steps': number of steps saved in this dataset
+            'status': 'running', 'interrupted', 'aborted' (by a rule, see Sweeper.add_rule) or 'completed'
+        """
+        self.datasaver = datasaver
+        self.config = dict(config)
+        self.interval = interval
+        self.on_save = on_save
+        self._t_last = time.perf_counter()
+
+    def update(self, steps: int):
+        """
+        Save a checkpoint if the last one is older than .interval.
+        """
+        if time.perf_counter() - self._t_last >= self.interval:
+            self.save(steps, status='running')
+
+    def save(self, steps: int, status: str = 'running'):
+        if self.on_save is not None:
+            self.on_save(steps)
+        self.datasaver.flush_data_to_database()
+        checkpoint = dict(self.config)
+        checkpoint['completed_steps'] = int(steps)
+        checkpoint['status'] = status
+        self.datasaver.dataset.add_metadata(CHECKPOINT_TAG, json.dumps(checkpoint))
+        self._t_last = time.perf_counter()
+
+
+def load_checkpoint(ds: DataSetProtocol) -> Dict[str, Any]:
+    """
+    Checkpoint saved in the metadata of a qcodes dataset by a sweep (see Checkpoint).
+    """
+    if CHECKPOINT_TAG not in ds.metadata:
+        raise ValueError(f'Dataset {ds.run_id} does not contain a sweep checkpoint')
+    return json.loads(ds.metadata[CHECKPOINT_TAG])
+
+
+def get_completed_steps(ds: DataSetProtocol, checkpoint: Dict[str, Any]) -> int:
+    """
+    Number of sweep steps whose readouts are saved in a dataset. It is obtained from the saved data because the
+    last checkpoint can be older than the last saved step (ex: if the python kernel died).
+    If the sweep has no readouts, it uses the checkpoint.
+    """
+    names = checkpoint['readouts']
+    if len(names) == 0:
+        return int(checkpoint.get('completed_steps', 0))
+    data = ds.get_parameter_data(*names, 'sweep_readouts_full_names', 'sweep_readouts_dim0s')
+    if 'sweep_readouts_full_names' not in data:
+        return 0  # not even the first step has been saved
+    saved_names = list(data['sweep_readouts_full_names']['sweep_readouts_full_names'])
+    dim0s = np.array(data['sweep_readouts_dim0s']['sweep_readouts_dim0s'], dtype=int)
+    steps = []
+    for name in names:
+        rows = np.size(data[name][name]) if name in data else 0
+        steps.append(rows // dim0s[saved_names.index(name)] if name in saved_names else 0)
+    return int(min(steps))
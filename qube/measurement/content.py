@@ -1,12 +1,18 @@
+import json
+from functools import partial
 from abc import ABC, abstractmethod
 from typing import Dict, List, Any
 
 import numpy as np
 from qcodes import load_by_id
 from qcodes.dataset.data_set import DataSetProtocol
+from scipy.interpolate import griddata
+from scipy.ndimage import distance_transform_edt
 
+from qube.measurement.checkpoint import CHECKPOINT_TAG
+from qube.measurement.reduction import Reduction, RAW_FILE_TAG, load_raw
 from qube.postprocess.datafile import Datafile
-from qube.postprocess.dataset import Dataset, Axis, Static
+from qube.postprocess.dataset import Dataset, Axis, Static, LazyDataset
 
 
 def qcodes_to_datafile(ds: DataSetProtocol = None) -> Datafile:
@@ -229,7 +235,11 @@ class QcodesDatasetContent(ExpContent):
 
 
 class SweeperContent(ExpContent):
-    """ Class to extract from a qcodes.DataSet the information of an experiment performed with Sweeper class """
+    """
+    Class to extract from a qcodes.DataSet the information of an experiment performed with Sweeper class.
+    Only the sweep information (axes, readout names, static configs) is read when loading. The value of each readout
+    is read from the database the first time it is accessed (see LazyDataset) and kept in qc_data.
+    """
 
     def __init__(self, ds: DataSetProtocol = None):
         self.datasets = []
@@ -239,6 +249,8 @@ class SweeperContent(ExpContent):
         self.qc_ds = None
         self.qc_data = {}
         self.qc_params = []
+        self.linked_run_ids = []
+        self._linked = None
 
         if ds is not None:
             self.load(ds)
@@ -256,18 +268,21 @@ class SweeperContent(ExpContent):
         self.qc_ds = None
         self.qc_data = {}
         self.qc_params = []
+        self.linked_run_ids = []
+        self._linked = None
 
     def load(self, ds: DataSetProtocol):
         self._validate_qcodes_data(ds)
         self.clear()
         self.qc_ds = ds
-        self.qc_data = self.qc_ds.get_parameter_data()
         self.qc_params = self.qc_ds.get_parameters()
+        self.qc_data = self._load_info_data()
         self.sweep_info = self._extract_sweep_info()
         self.sweep_info.update(self._extract_static_info())
         self.datasets = self._extract_datasets()
         self.statics = self._extract_statics()
         self.axes = self.datasets[0].axes
+        self._load_linked_datasets()
 
     def load_by_id(self, run_id: int, *args, **kwargs):
         ds = load_by_id(run_id, *args, **kwargs)
@@ -294,6 +309,106 @@ class SweeperContent(ExpContent):
         # df.metadata = self.qc_ds.snapshot # Not implemented
         return df
 
+    def get_measured_mask(self) -> np.ndarray:
+        """
+        Boolean array with the sweep shape which is True for the measured points.
+        Only adaptive or interrupted sweeps have points which were not measured (nan in the datasets).
+        """
+        mask = self._get_saved_mask()
+        if self._linked is not None:
+            mask = mask | self._linked.get_measured_mask()
+        return mask
+
+    def regrid(self, method: str = 'nearest') -> List[Dataset]:
+        """
+        Copy of the datasets where the points which were not measured (see .get_measured_mask) are interpolated
+        from the measured ones.
+        method:
+            'nearest': value of the nearest measured point in the sweep grid
+            'linear': linear interpolation (nearest value outside the region of the measured points)
+        """
+        if method not in ['nearest', 'linear']:
+            raise ValueError(f"Unknown method ({method}). Valid methods are ['nearest', 'linear']")
+        mask = self.get_measured_mask()
+        datasets = []
+        for ds in self.datasets:
+            ds = ds.copy()
+            value = np.array(ds.value, dtype=float)
+            if value.ndim == mask.ndim:
+                value = self._fill_missing(value, mask, method)
+            else:  # array readout, first axis is dim0
+                value = np.array([self._fill_missing(v, mask, method) for v in value])
+            ds.value = value
+            datasets.append(ds)
+        return datasets
+
+    @staticmethod
+    def _fill_missing(value: np.ndarray, mask: np.ndarray, method: str) -> np.ndarray:
+        if np.all(mask) or not np.any(mask):
+            return value
+        nearest_idx = distance_transform_edt(~mask, return_distances=False, return_indices=True)
+        nearest = value[tuple(nearest_idx)]
+        if method == 'nearest' or np.sum(mask) <= mask.ndim:
+            return nearest
+        points = np.argwhere(mask)
+        missing = np.argwhere(~mask)
+        filled = value.copy()
+        if mask.ndim == 1:
+            linear = np.interp(missing[:, 0], points[:, 0], value[mask], left=np.nan, right=np.nan)
+        else:
+            try:
+                linear = griddata(points, value[mask], missing, method='linear')
+            except Exception:  # degenerate points (ex: all in a line)
+                return nearest
+        outside = np.isnan(linear)
+        linear[outside] = nearest[~mask][outside]
+        filled[~mask] = linear
+        return filled
+
+    def _get_saved_mask(self) -> np.ndarray:
+        """ Measured mask of the points saved in this dataset (without the linked datasets) """
+        sweep_shape = tuple(self.sweep_info['sweep_shape'])
+        mask = np.zeros(int(np.prod(sweep_shape)), dtype=bool)
+        mask[self._get_sweep_order()[:self._get_measured_steps()]] = True
+        return mask.reshape(sweep_shape, order='F')
+
+    def _get_sweep_order(self) -> np.ndarray:
+        """ Canonical index of the point measured at each step (raster if the order was not saved) """
+        if 'sweep_order' in self.sweep_info.keys():
+            return np.asarray(self.sweep_info['sweep_order'], dtype=int)
+        return np.arange(int(np.prod(self.sweep_info['sweep_shape'])))
+
+    def _get_measured_steps(self) -> int:
+        params_names = [p.name for p in self.qc_params]
+        readouts = [name for name in self.sweep_info['sweep_readouts_full_names'] if name in params_names]
+        if len(readouts) == 0:
+            return len(self._get_sweep_order())
+        loaded = [name for name in readouts if name in self.qc_data.keys()]
+        name = loaded[0] if len(loaded) > 0 else readouts[0]  # all the readouts have the same number of steps
+        dim0 = self.sweep_info['sweep_readouts_dim0s'][self.sweep_info['sweep_readouts_full_names'].index(name)]
+        return np.size(self._get_readout_data(name)) // dim0
+
+    def _load_info_data(self) -> Dict[str, Any]:
+        """
+        Data of the parameters which are not readouts (sweep info, axes and static configs), read in two queries:
+        the sweep info first to know the readouts, then the other parameters.
+        """
+        params_names = [p.name for p in self.qc_params]
+        info_names = [name for name in params_names if name.startswith('sweep_')]
+        qc_data = self.qc_ds.get_parameter_data(*info_names)
+        readouts = [str(name) for name in qc_data.get('sweep_readouts_full_names', {}).get(
+            'sweep_readouts_full_names', [])]
+        others = [name for name in params_names if name not in qc_data.keys() and name not in readouts]
+        if len(others) > 0:
+            qc_data.update(self.qc_ds.get_parameter_data(*others))
+        return qc_data
+
+    def _get_readout_data(self, full_name: str) -> np.ndarray:
+        """ Saved values of a readout, read from the database at the first call """
+        if full_name not in self.qc_data.keys():
+            self.qc_data.update(self.qc_ds.get_parameter_data(full_name))
+        return self.qc_data[full_name][full_name]
+
     def _extract_sweep_info(self) -> Dict[str, Any]:
         key_fmt = [
             ['sweep_shape', int],
@@ -310,6 +425,10 @@ class SweeperContent(ExpContent):
             ['static_units', str],
             ['static_isbools', int],
         ]
+        if len(self.qc_data.get('sweep_order', {}).get('sweep_order', [])) > 0:  # only saved for non-raster sweeps
+            key_fmt.append(['sweep_order', int])
+        if 'sweep_readouts_reductions' in self.qc_data.keys():  # not saved by older versions
+            key_fmt.append(['sweep_readouts_reductions', str])
         return self._fmt_qc_data(key_fmt)
 
     def _extract_static_info(self) -> Dict[str, Any]:
@@ -368,12 +487,13 @@ class SweeperContent(ExpContent):
         rd_fnames = sweep_info['sweep_readouts_full_names']
         rd_names = sweep_info['sweep_readouts_names']
         dim0s = sweep_info['sweep_readouts_dim0s']
+        reductions = sweep_info.get('sweep_readouts_reductions', [''] * len(rd_fnames))
         sweep_shape = sweep_info['sweep_shape']
         params_names = [p.name for p in params_specs]
 
         axes = self._extract_axes()
         datasets = []
-        for fname, name, dim0 in zip(rd_fnames, rd_names, dim0s):
+        for index, (fname, name, dim0, reduction) in enumerate(zip(rd_fnames, rd_names, dim0s, reductions)):
             if fname not in params_names:
                 continue
             param_spec = params_specs[params_names.index(fname)]
@@ -389,13 +509,15 @@ class SweeperContent(ExpContent):
             else:
                 shape = [dim0] + list(sweep_shape)
                 ds_axes = [ax.copy() for ax in axes]
+                if reduction != '':
+                    ds_axes.append(self._get_reduction_axis(name, unit, reduction))
 
             shape = tuple(shape)
-            value = np.array(qc_data[fname][fname]).reshape(shape, order='F')
-            ds = Dataset(
+            ds = LazyDataset(
                 name=name,
                 unit=unit,
-                value=value,
+                loader=partial(self._load_dataset_value, index, fname, dim0, shape),
+                shape=shape,
                 axes=ds_axes,
                 metadata={},
             )
@@ -403,6 +525,86 @@ class SweeperContent(ExpContent):
             datasets.append(ds)
         return datasets
 
+    def _load_dataset_value(self, index: int, full_name: str, dim0: int, shape: tuple) -> np.ndarray:
+        """ Value of the readout dataset at index, with the points measured in the linked datasets """
+        sweep_shape = self.sweep_info['sweep_shape']
+        value = np.array(self._get_readout_data(full_name)).ravel()  # array readouts are loaded as (steps, dim0)
+        if 'sweep_order' in self.sweep_info.keys() or value.size != dim0 * np.prod(sweep_shape):
+            value = self._reorder_to_canonical(value, self._get_sweep_order(), dim0, sweep_shape)
+        value = value.reshape(shape, order='F')
+        if self._linked is not None:
+            mask = self._get_saved_mask()
+            mask = mask if value.ndim == mask.ndim else mask[np.newaxis]
+            value = np.where(mask, value, self._linked.datasets[index].value)
+        return value
+
+    def get_reduction(self, name: str) -> Reduction:
+        """
+        Reduction applied to a readout before saving it (see Sweeper.set_reduction).
+        name: name of the readout
+        """
+        names = self.sweep_info['sweep_readouts_names']
+        reductions = self.sweep_info.get('sweep_readouts_reductions', [''] * len(names))
+        if name not in names or reductions[names.index(name)] == '':
+            raise ValueError(f'{name} is not a reduced readout')
+        return Reduction.from_dict(json.loads(reductions[names.index(name)]))
+
+    def load_raw(self, name: str) -> np.ndarray:
+        """
+        Raw values of a reduced readout saved in the side file of the sweep, as an array (steps, raw size) in
+        measurement order (see Sweeper.set_reduction).
+        name: name of the readout
+        """
+        if RAW_FILE_TAG not in self.qc_ds.metadata:
+            raise ValueError(f'Dataset {self.qc_ds.run_id} has no raw side file')
+        names = self.sweep_info['sweep_readouts_names']
+        if name not in names:
+            raise ValueError(f'{name} is not a readout of the sweep')
+        full_name = self.sweep_info['sweep_readouts_full_names'][names.index(name)]
+        return load_raw(self.qc_ds.metadata[RAW_FILE_TAG], full_name)
+
+    @staticmethod
+    def _get_reduction_axis(name: str, unit: str, recipe: str) -> Axis:
+        """ Axis of the dim 0 of a reduced readout """
+        reduction = Reduction.from_dict(json.loads(recipe))
+        return Axis(
+            name=f'{name}_{reduction.axis_name}',
+            unit=unit if reduction.name == 'histogram' else '',
+            value=np.asarray(reduction.get_axis_values()),
+            dim=0,
+            metadata={'reduction': reduction.to_dict()},
+        )
+
+    @staticmethod
+    def _reorder_to_canonical(value: np.ndarray, order: List[int], dim0: int, sweep_shape: List[int]) -> np.ndarray:
+        """
+        Sort the saved values (in measurement order) by canonical index, i.e. raster order with dim 1 first.
+        order: canonical index of the point measured at each step
+        Points which were not measured are filled with nan.
+        """
+        total_pts = int(np.prod(sweep_shape))
+        steps = value.size // dim0
+        value = value.reshape((dim0, steps), order='F')
+        order = np.asarray(order, dtype=int)[:steps]
+        if steps == total_pts:
+            canonical = np.empty((dim0, total_pts), dtype=value.dtype)
+        else:
+            canonical = np.full((dim0, total_pts), np.nan)
+        canonical[:, order] = value
+        return canonical.ravel(order='F')
+
+    def _load_linked_datasets(self):
+        """
+        A resumed sweep (see Sweeper.resume) is saved in a new dataset linked to the interrupted one. The points
+        measured in the linked datasets are added to the datasets of this one when they are loaded.
+        """
+        checkpoint = json.loads(self.qc_ds.metadata.get(CHECKPOINT_TAG, '{}'))
+        run_id = checkpoint.get('resumed_from', None)
+        if run_id is None:
+            return
+        self._linked = SweeperContent(load_by_id(run_id))
+        self.linked_run_ids = [run_id] + self._linked.linked_run_ids
+
     def _extract_statics(self) -> Dict[str, List[Static]]:
         sweep_info = self.sweep_info
         statics = {}
@@ -438,17 +640,16 @@ class SweeperContent(ExpContent):
         """
         if not isinstance(ds, DataSetProtocol):
             raise TypeError(f'Input has be a qcodes dataset')
-        data = ds.get_parameter_data()
-        valid = 'sweep_dims' in data.keys()
+        valid = 'sweep_dims' in [p.name for p in ds.get_parameters()]
         if not valid:
             raise ValueError(f'Invalid qcodes dataset. It does not contain sweep information.')
 
 
 def find_loader(ds: DataSetProtocol = None):
-    qc_data = ds.get_parameter_data()
-    if 'return2initial' in qc_data.keys():
+    params_names = [p.name for p in ds.get_parameters()]  # without reading the data
+    if 'return2initial' in params_names:
         return QcodesDatasetContent
-    elif 'sweep_readouts_names' in qc_data.keys():
+    elif 'sweep_readouts_names' in params_names:
         return SweeperContent
     else:
         raise ValueError('Not found a valid loading protocol')
@@ -10,6 +10,9 @@ from qcodes.dataset.measurements import Measurement
 from qcodes import validators as vals
 # from .sweep.Sweep import Sweep # CONSTRUCTION SITE
 from qube.measurement.sweep import Sweep
+from qube.measurement.parallel import GroupExecutor, snapshot_parameters
+from qube.measurement.ramp import RampPolicy, RAMP_TAG, to_ramp_policy, ramp_parameters
+from qube.measurement.tracer import LiveTracer
 
 from IPython.display import display, Markdown, clear_output
 # from tools.plot.layout import GDS_layout
@@ -20,7 +23,6 @@ import ipywidgets as ipyw
 
 import numpy as np
 import matplotlib
-import matplotlib.pyplot as plt
 import time
 import os
 
@@ -70,6 +72,10 @@ class Controls(InstrumentBase):
         super().__init__(name, **kwargs)
 
         self._move_commands = list()
+        self._group_executor = GroupExecutor()
+        self._index = None  # lookup tables of the delegate parameters (see _get_index)
+        self._move_cmd_groups = dict()  # {tuple of parameter names: list of move commands}
+        self.tracer = None  # LiveTracer of the last trace
 
         # Add submodule to perform sweeps of controls:
         self.add_submodule(
@@ -90,6 +96,7 @@ class Controls(InstrumentBase):
         """
         par = self._add_delegate_parameter(name, source, move_command, **kwargs)
         self.parameters[name].metadata['readout'] = False
+        self._invalidate_index()
         return par
 
     def add_readout(self,
@@ -103,6 +110,7 @@ class Controls(InstrumentBase):
         """
         par = self._add_delegate_parameter(name, source, move_command, **kwargs)
         self.parameters[name].metadata['readout'] = True
+        self._invalidate_index()
         return par
 
     # def _add_parameter(self, param, move_command: Function = None, **kwargs):
@@ -138,12 +146,12 @@ class Controls(InstrumentBase):
         return param
 
     def get_control(self, key, as_instance: bool = True):
-        self.validate_control(key)
-        return self._get_delegate_parameter(key, as_instance)
+        name = self._get_indexed_name(key, 'controls', 'Not a valid control')
+        return self.parameters[name] if as_instance else name
 
     def get_readout(self, key, as_instance: bool = True):
-        self.validate_readout(key)
-        return self._get_delegate_parameter(key, as_instance)
+        name = self._get_indexed_name(key, 'readouts', 'Not a valid readout')
+        return self.parameters[name] if as_instance else name
 
     def get_controls(self, as_instance: bool = False):
         """
@@ -162,16 +170,18 @@ class Controls(InstrumentBase):
     def get_control_values(self, controls: list = None, key_as_instance: bool = False):
         """
         This function returns a dictionary containing all controls with their corresponding values.
+        The controls of instruments with a bulk read (ex: NEEL_DAC) are read with a single
+        call per instrument (see parallel.snapshot_parameters).
         """
         if controls is None:
             controls = self.get_controls(as_instance=key_as_instance)
 
+        instances = [self.get_control(key, as_instance=True) for key in controls]
+        values = snapshot_parameters(instances)
         output = dict()
-        for key in controls:
-            control = self.get_control(key, as_instance=True)
-            value = control()
+        for control in instances:
             key = control if key_as_instance else control.name
-            output[key] = value
+            output[key] = values[control]
         return output
 
     def get_readout_values(self, readouts: list = None, key_as_instance: bool = False):
@@ -263,7 +273,7 @@ class Controls(InstrumentBase):
     #         output[control.name] = value
     #     return output
 
-    def apply(self, values):
+    def apply(self, values, parallel: bool = False, settle=False):
         """
         This function applies the values of some control parameters
         and physically moves the corresponding instruments.
@@ -277,6 +287,17 @@ class Controls(InstrumentBase):
                       [('name_of_control1',value1), ...]
                       or
                       [(instance_of_control1,value1), ...]
+        parallel ... If True, the controls are grouped by the instrument of their source
+                     and the groups are set in parallel threads. The controls of the same
+                     instrument are set in the order in which they were added to Controls.
+                     The move commands are applied after all the groups are set.
+        settle   ... Only for parallel = True:
+                     - False: each control waits for its own post_delay
+                     - True: wait once for the largest post_delay after setting all controls
+                     - number: wait this number of seconds after setting all controls
+        Controls with a ramp (see set_ramp) are ramped before setting their values. The controls
+        of the same instrument are ramped together in lock-step and the move commands are applied
+        after each step. With parallel = True, different instruments are ramped in parallel.
         """
 
         if type(values) == dict:
@@ -284,29 +305,92 @@ class Controls(InstrumentBase):
 
         # Collect move commands and set values
         controls = []
+        items = []
         for key, value in values:
             control = self.get_control(key, as_instance=True)
-            control(value)  # Set value
             controls.append(control)
+            items.append((control, value))
+
+        policies = self._get_ramp_policies(controls)
+        if policies:
+            executor = self._group_executor if parallel else None
+            ramp_parameters(items, policies, executor=executor, after_step=self._apply_move_cmds)
+
+        if parallel:
+            order = self._get_index()['order']
+            items = sorted(items, key=lambda item: order[item[0].name])
+            self._group_executor.set_parameters(items, settle=settle)
+        else:
+            for control, value in items:
+                control(value)  # Set value
 
         # Apply move commands
         self._apply_move_cmds(controls)
 
+    def set_ramp(self, key, max_step: float = None, step_delay: float = 0, max_rate: float = None):
+        """
+        This function sets the maximum slew of a control (see ramp.RampPolicy).
+        Changes larger than max_step are done by apply in steps of at most max_step,
+        waiting step_delay after each step. With max_rate, the step is limited to
+        max_rate * step_delay. The ramp is saved in the metadata of the control, so
+        it is also used by Sweeper when the control is swept (unless Sweeper.set_ramp
+        is used for the same control).
+        If max_step and max_rate are None, the ramp of the control is removed.
+
+        EXAMPLE:
+        controls.set_ramp('cp0', max_step=0.01, step_delay=0.005)
+        controls.set_ramp('cp1', max_rate=0.5)
+        """
+        control = self.get_control(key, as_instance=True)
+        if max_step is None and max_rate is None:
+            control.metadata.pop(RAMP_TAG, None)
+            return
+        policy = RampPolicy(max_step=max_step, step_delay=step_delay, max_rate=max_rate)
+        control.metadata[RAMP_TAG] = policy.to_dict()
+
+    def get_ramp(self, key):
+        """
+        This function returns the ramp of a control (RampPolicy) or None.
+        """
+        control = self.get_control(key, as_instance=True)
+        return to_ramp_policy(control.metadata.get(RAMP_TAG, None))
+
+    def _get_ramp_policies(self, controls: list):
+        policies = dict()
+        for control in controls:
+            policy = to_ramp_policy(control.metadata.get(RAMP_TAG, None))
+            if policy is not None:
+                policies[control] = policy
+        return policies
+
     def validate_control(self, key):
-        if not self._is_control(key):
-            raise KeyError(f'Not a valid control: {key}')
+        self._get_indexed_name(key, 'controls', 'Not a valid control')
 
     def validate_readout(self, key):
-        if not self._is_readout(key):
-            raise KeyError(f'Not a valid readout: {key}')
+        self._get_indexed_name(key, 'readouts', 'Not a valid readout')
 
     def _get_move_cmds(self, controls: list):
-        cs = [self._get_delegate_parameter(ci, as_instance=True) for ci in controls]
-        idxs = [ci.metadata[str_mv_cmd_id] for ci in cs]
-        idxs = set(idxs)
-        if None in idxs:
-            idxs.remove(None)
-        move_cmds = [self._move_commands[idx] for idx in idxs]
+        """
+        This function returns the move commands of a group of controls
+        or readouts (each command once). The result is cached for each
+        group, so applying the same group at each sweep point only costs
+        a dictionary lookup.
+        """
+        names = tuple(c if isinstance(c, str) else c.name for c in controls)
+        move_cmds = self._move_cmd_groups.get(names, None)
+        if move_cmds is None:
+            index = self._get_index()
+            idxs = list()
+            for name in names:
+                if name not in index['move_cmd_ids']:
+                    raise KeyError(f'Not a valid control or readout: {name}')
+                idx = index['move_cmd_ids'][name]
+                if idx is not None and idx not in idxs:
+                    idxs.append(idx)
+            move_cmds = [self._move_commands[idx] for idx in idxs]
+            if len(self._move_cmd_groups) >= 256:  # many different groups: start again
+                self._move_cmd_groups = dict()
+            self._move_cmd_groups[names] = move_cmds
         return move_cmds
 
     def _apply_move_cmds(self, controls: list):
@@ -355,6 +439,51 @@ class Controls(InstrumentBase):
     def _is_control(self, key):
         return not self._is_readout(key)
 
+    def _get_index(self):
+        """
+        This function returns the lookup tables of the delegate parameters:
+          'controls'     ... list of control names (in order of addition)
+          'readouts'     ... list of readout names
+          'all'          ... list of all names
+          'order'        ... {name: position in Controls}
+          'move_cmd_ids' ... {name: index of the move command or None}
+        They are built once and invalidated by add_control and add_readout.
+        """
+        if self._index is None:
+            index = {'controls': list(), 'readouts': list(), 'all': list(), 'order': dict(), 'move_cmd_ids': dict()}
+            for parameter in self.parameters.values():
+                name = parameter.name
+                index['all'].append(name)
+                index['order'][name] = len(index['order'])
+                index['readouts' if self._is_readout(parameter) else 'controls'].append(name)
+                index['move_cmd_ids'][name] = parameter.metadata.get(str_mv_cmd_id, None)
+            index['control_set'] = set(index['controls'])
+            index['readout_set'] = set(index['readouts'])
+            self._index = index
+        return self._index
+
+    def _invalidate_index(self):
+        self._index = None
+        self._move_cmd_groups = dict()
+
+    def _get_indexed_name(self, key, role: str, message: str):
+        """
+        This function returns the name of a control (role = 'controls') or
+        readout (role = 'readouts') given as name or instance, and raises a
+        KeyError if it is not a parameter of this role.
+        """
+        if isinstance(key, str):
+            name = key
+        elif isinstance(key, (DelegateParameter, Parameter)):
+            name = key.name
+        else:
+            raise KeyError('The provided key {:s} is neither of type String nor DelegateParameter.'.format(str(key)))
+        if name not in self._get_index()[role[:-1] + '_set']:
+            if name not in self.parameters:
+                raise KeyError(name)
+            raise KeyError(f'{message}: {key}')
+        return name
+
     def _get_delegate_parameter(self, key, as_instance: bool = True):
         """
         This function returns the name (string) or the instance
@@ -382,97 +511,75 @@ class Controls(InstrumentBase):
         (DelegateParameter; as_instance = True) for the controls (only_controls), 
         the readouts (only_readouts) or both (only_controls=only_readouts=False).
         """
-        list_of_delegates = list()
-        for parameter in self.parameters.values():
-            list_item = parameter if as_instance else parameter.name
-
-            if self._is_readout(parameter) and only_readouts:
-                list_of_delegates.append(list_item)
-            elif self._is_control(parameter) and only_controls:
-                list_of_delegates.append(list_item)
-            elif (not only_controls) and (not only_readouts):
-                list_of_delegates.append(list_item)
-
-        return list_of_delegates
+        index = self._get_index()
+        if only_controls and not only_readouts:
+            names = index['controls']
+        elif only_readouts and not only_controls:
+            names = index['readouts']
+        else:
+            names = index['all']
+        return [self.parameters[name] for name in names] if as_instance else list(names)
 
     def trace(self,
               controls: list = None,
               update_interval: float = 0.1,
               figwidth: float = 7.2,
               subplotheight: float = 2.75,
+              window: float = 60,
+              refresh_interval: float = 0.5,
+              capacity: int = None,
+              max_points: int = 1000,
               ):
         """
         This function traces the values of all (or certain) readouts
         as function of time and displays the values via a live plot.
-        
+
+        controls         ... readouts to trace (default: all readouts)
+        update_interval  ... acquisition interval in s
+        window           ... time window of the plot in s
+        refresh_interval ... time between refreshes of the figure in s
+        capacity         ... samples kept per readout (default: enough for the window)
+        max_points       ... maximum number of plotted points per readout
+
         Functionality:
-        A thread is used to update a hidden slider-object, which then
-        triggers the update of the figure.
+        The readouts are acquired in a separate thread and stored in a
+        fixed-size ring buffer per readout, so the memory does not grow
+        during long monitoring. The figure is refreshed by a timer of the
+        figure independently of the acquisition: the data of the time
+        window is decimated with min/max and only the lines are redrawn
+        (blitting). See tracer.LiveTracer.
+        The Stop button stops the acquisition. The tracer is available as
+        controls.tracer (ex: controls.tracer.get_data(0)).
         """
 
-        # If only one control is passed, transform to list:
-        if not type(controls) in (list, tuple):
+        # All readouts by default. If only one control is passed, transform to list:
+        if controls is None:
+            controls = self.get_readouts()
+        elif not type(controls) in (list, tuple):
             controls = (controls,)
+        readouts = [self.get_readout(key, as_instance=True) for key in controls]
 
-        # Initialise plots:
-        readout_tuples = self.readout(readouts=controls)
-        N_rows = len(readout_tuples)
-        fig, axs = plt.subplots(N_rows)
-        fig.set_figwidth(figwidth)
-        fig.set_figheight(subplotheight * N_rows)
-        lines = list()
-        initial_time = time.time()
-        if N_rows == 1:
-            axs = (axs,)
-        for idx, readout_tuple in enumerate(readout_tuples):
-            print(axs)
-            temp_line, = axs[idx].plot([0], [readout_tuple[1]])
-            lines.append(temp_line)
-            axs[idx].grid(True)
-            label = readout_tuple[0].label
-            unit = readout_tuple[0].unit
-            axs[idx].set_ylabel(r'{:s} ({:s})'.format(label, unit))
-            if idx == N_rows - 1:
-                axs[idx].set_xlabel(r'Time $t$ (sec)')
-        plt.tight_layout()
-
-        def update(change):
-            readout_tuples = self.readout(readouts=controls)
-            for idx, readout_tuple in enumerate(readout_tuples):
-                xdata, ydata = lines[idx].get_data()
-                xdata = np.append(xdata, time.time() - initial_time)
-                ydata = np.append(ydata, readout_tuple[1])
-                lines[idx].set_data(xdata, ydata)
-                axs[idx].set_xlim([xdata[0], xdata[-1]])
-                axs[idx].set_ylim([np.min(ydata) - 1e-12, np.max(ydata) + 1e-12])
-            fig.canvas.draw()
-
-        counter = ipyw.Label(value='None', continuous_update=True)
-        counter.observe(update, 'value')
+        if self.tracer is not None:
+            self.tracer.stop()
 
-        button = ipyw.Button(description="Stop")
-        output = ipyw.Output()
-
-        thread_stopped = False
+        def read():
+            values = self.get_readout_values(readouts, key_as_instance=True)
+            return [values[readout] for readout in readouts]
 
-        import threading
-        def work():
-            i = 0
-            while True:
-                i += 1
-                time.sleep(update_interval)
-                counter.value = str(i)
-                if button.disabled:
-                    break
+        tracer = LiveTracer(readouts, read, window=window, interval=update_interval, capacity=capacity,
+                            refresh_interval=refresh_interval, max_points=max_points)
+        fig = tracer.create_figure(figwidth=figwidth, subplotheight=subplotheight)
+        self.tracer = tracer
 
-        thread = threading.Thread(target=work)
+        button = ipyw.Button(description="Stop")
 
         def on_button_clicked(b):
             b.disabled = True
+            tracer.stop()
 
         button.on_click(on_button_clicked)
         display(button)
-        thread.start()
+        tracer.start()
 
         return fig
 
@@ -0,0 +1,91 @@
+from typing import Any, Iterable, List
+
+import numpy as np
+
+
+class HardwareFastAxis(object):
+    slots_per_point = 3  # trigger on, wait and trigger off (+1 move per fast parameter)
+
+    def __init__(self, sequencer, daqs: Iterable[Any], point_time: float = 1, trigger: Iterable[int] = (1, 0, 0, 0, 0)):
+        """
+        Hardware-timed sweep of the dim 1 of a Sweeper. At each step of the outer dims, the fast sequence of a
+        NEEL_DAC moves the parameters of dim 1 through all their values and sends a trigger at each point, which is
+        used by NI DAQs (NI6343, NI6216) in 'ramp' trigger mode to acquire one value per point. The readouts of the
+        sweep are the traces of the DAQ channels (ex: daq.ai0.trace), so each outer step saves one array row.
+        sequencer: NEEL_DAC_Sequencer (ex: dac.sequencer). The parameters of dim 1 must be channels of its NEEL_DAC.
+        daqs: list of NI DAQ instruments with prepare_array_measurement and run_array_measurement
+        point_time: time in ms of each point, used as waiting time of the sequence and average time of the DAQs
+        trigger: state of the 5 trigger ports of the NEEL_DAC at each point (see NEEL_DAC_Sequencer.add_slot_trigger)
+        Sequence for each point: move the fast parameters, trigger on, wait point_time, trigger off.
+        Note: sequence moves are relative to the DC value of the channels when the sequence is programmed, i.e. at
+        the start of the sweep after start_at and pre_process.
+        """
+        self.sequencer = sequencer
+        self.daqs = list(daqs)
+        self.point_time = float(point_time)
+        self.trigger = [int(ti) for ti in trigger]
+        self.points = 0
+        if self.point_time <= 0:
+            raise ValueError('point_time must be > 0')
+        if len(self.daqs) == 0:
+            raise ValueError('At least one DAQ is needed for the hardware fast axis')
+
+    def get_max_points(self, n_params: int) -> int:
+        """ Maximum number of points of the fast axis limited by the slots of the sequencer """
+        free_slots = self.sequencer.max_slots - 2  # init and end slots
+        return free_slots // (self.slots_per_point + n_params)
+
+    def program(self, points: int, parameters: List[Any], values: List[Iterable[Any]]):
+        """
+        Write the fast sequence and configure the DAQs.
+        points: number of points of the dim 1
+        parameters: qcodes parameters of the dim 1 which are applied (it can be empty to repeat the acquisition)
+        values: list of sweep values for each parameter
+        """
+        points = int(points)
+        values = [np.asarray(v) for v in values]
+        if any(len(v) != points for v in values):
+            raise ValueError(f'The sweep values of the hardware fast axis must have {points} points')
+        if points < 2:
+            raise ValueError('The hardware fast axis needs at least 2 points in dim 1')
+        max_points = self.get_max_points(len(parameters))
+        if points > max_points:
+            raise ValueError(f'Too many points in dim 1 ({points}) for the sequencer (max: {max_points})')
+        seq = self.sequencer
+        seq.reset()
+        seq.ramp_mode(False)
+        off = [0] * len(self.trigger)
+        for i in range(points):
+            for param, v in zip(parameters, values):
+                seq.add_slot_move(param, float(v[i]), relative=False)
+            seq.add_slot_trigger(self.trigger)
+            seq.add_slot_wait(self.point_time)
+            seq.add_slot_trigger(off)
+        seq.correct_sequence()
+        for daq in self.daqs:
+            daq.trigger_mode('ramp')
+            daq.acquire_points(points)
+            daq.average_time(self.point_time)
+        self.points = points
+
+    def acquire(self):
+        """
+        Run the fast sequence and acquire one array per DAQ channel. The values are read with the trace parameters
+        of the DAQ channels.
+        """
+        for daq in self.daqs:
+            daq.prepare_array_measurement()
+        try:
+            self.sequencer.start()
+            for daq in self.daqs:
+                daq.run_array_measurement()
+        finally:
+            self.sequencer.stop()
+
+    def estimate_line_time(self) -> float:
+        """ Estimated duration in ms of the sequence of one line """
+        return self.sequencer.estimate_execution_time()
+
+    def __repr__(self):
+        names = [getattr(daq, 'name', str(daq)) for daq in self.daqs]
+        return f'HardwareFastAxis - points: {self.points} - point_time: {self.point_time}ms - daqs: {names}'
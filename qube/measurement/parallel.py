@@ -0,0 +1,186 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
+
+BULK_GET_METHOD = 'get_bulk_values'  # method of the instruments which can read several parameters at once
+
+
+def get_root_instrument(param: Any):
+    """
+    Root instrument of a qcodes parameter. For DelegateParameters, it follows the chain of sources until the
+    parameter which is really bound to an instrument.
+    Returns None if the parameter is not bound to any instrument.
+    """
+    root_param = get_parameter_chain(param)[-1]
+    return getattr(root_param, 'root_instrument', None)
+
+
+def get_parameter_chain(param: Any) -> List:
+    """
+    List with the parameter and its chain of sources (for DelegateParameters).
+    """
+    chain = [param]
+    while getattr(param, 'source', None) is not None:
+        param = param.source
+        chain.append(param)
+    return chain
+
+
+def set_parameters(items: Iterable[Tuple[Any, Any]], skip_post_delay: bool = False) -> float:
+    """
+    Set qcodes parameters one after another.
+    items: list of (qcodes parameter, value)
+    skip_post_delay: if it is True, the post_delay of the parameters (and of their sources) is not waited.
+    Returns:
+        maximum post_delay (including the sources) of the parameters that have been set.
+    """
+    max_delay = 0
+    for param, value in items:
+        chain = get_parameter_chain(param)
+        delays = [getattr(p, 'post_delay', 0) for p in chain]
+        max_delay = max(max_delay, sum(delays))
+        if not skip_post_delay:
+            param(value)
+            continue
+        try:
+            for p, delay in zip(chain, delays):
+                if delay: p.post_delay = 0
+            param(value)
+        finally:
+            for p, delay in zip(chain, delays):
+                if delay: p.post_delay = delay
+    return max_delay
+
+
+def get_group_name(instrument: Any) -> str:
+    """
+    Name used for the groups returned by group_by_instrument. Parameters without instrument have 'None' as name.
+    """
+    return str(getattr(instrument, 'name', instrument))
+
+
+def group_by_instrument(items: Iterable, key: Callable[[Any], Any] = None) -> Dict[Any, List]:
+    """
+    Group qcodes parameters by root instrument (see get_root_instrument), keeping the order in which they are given.
+    items: list of qcodes parameters, or list of any item if key is given.
+    key: function returning the qcodes parameter of an item. Ex: key=lambda kv: kv[0] for (param, value) tuples.
+    Parameters without instrument are grouped together with None as key.
+    Returns:
+        dictionary {root instrument: list of items}
+    """
+    key = key if key is not None else lambda item: item
+    groups = {}
+    for item in items:
+        instrument = get_root_instrument(key(item))
+        groups.setdefault(instrument, []).append(item)
+    return groups
+
+
+def snapshot_parameters(params: Iterable) -> Dict[Any, Any]:
+    """
+    Values of qcodes parameters, equivalent to {param: param() for param in params}, but the parameters of an
+    instrument which implements the bulk snapshot protocol are read with a single call.
+    Protocol: the root instrument (see get_root_instrument) has a method get_bulk_values(params) which takes a list
+    of its own parameters and returns a dictionary {param: value} with the same values as param().
+    Ex: NEEL_DAC.get_bulk_values reads all the channel values with a single call (see NEEL_DAC.read_channel_values).
+    DelegateParameters are read through their root source parameter: the cache of the source is updated with the
+    bulk value and the delegate value is obtained from it (with its scale, offset, etc).
+    Returns:
+        dictionary {param: value} in the given order
+    """
+    params = list(params)
+    values = {}
+    for instrument, group in group_by_instrument(params).items():
+        bulk_get = getattr(instrument, BULK_GET_METHOD, None)
+        if not callable(bulk_get):
+            values.update({param: param() for param in group})
+            continue
+        roots = []
+        for param in group:
+            root = get_parameter_chain(param)[-1]
+            if root not in roots:
+                roots.append(root)
+        root_values = bulk_get(roots)
+        for root, value in root_values.items():
+            root.cache.set(value)
+        for param in group:
+            values[param] = root_values[param] if param in root_values else param.cache.get(get_if_invalid=False)
+    return {param: values[param] for param in params}
+
+
+class GroupExecutor(object):
+    def __init__(self, max_workers: int = None):
+        """
+        Execute a function for several groups of items in parallel threads, while the items of each group are
+        handled by a single call (i.e. serialized). Typically, a group contains the parameters of one instrument.
+        max_workers: maximum number of threads. If it is None, it uses the default of ThreadPoolExecutor.
+        The threads are created the first time that more than one group is executed.
+        """
+        self.max_workers = max_workers
+        self._executor = None
+
+    def map(self, func: Callable[[List], Any], groups: Dict[Any, List]) -> Tuple[Dict[Any, Any], Dict[Any, float]]:
+        """
+        Execute func(items) for each group in parallel and wait for all of them (barrier).
+        If only one group is given, it is executed in the calling thread.
+        Returns:
+            outputs: dictionary {group key: func(items)}
+            durations: dictionary {group key: execution time in seconds}
+        An exception raised by any group is raised again after all the groups have finished.
+        """
+        if len(groups) <= 1:
+            outputs, durations = {}, {}
+            for key, items in groups.items():
+                outputs[key], durations[key] = self._timed_call(func, items)
+            return outputs, durations
+
+        executor = self._get_executor()
+        futures = {key: executor.submit(self._timed_call, func, items) for key, items in groups.items()}
+        outputs, durations = {}, {}
+        error = None
+        for key, future in futures.items():
+            try:
+                outputs[key], durations[key] = future.result()
+            except BaseException as e:
+                error = e if error is None else error
+        if error is not None:
+            raise error
+        return outputs, durations
+
+    def set_parameters(self, items: Iterable[Tuple[Any, Any]], settle: Union[bool, float] = False) -> Dict[Any, float]:
+        """
+        Set qcodes parameters grouped by root instrument. The groups are set in parallel threads, and the parameters
+        of each group are set one after another in the given order.
+        items: list of (qcodes parameter, value)
+        settle:
+            False: each parameter waits for its own post_delay inside its group.
+            True: the post_delays are not waited individually. After all the groups have finished (barrier), it waits
+                once for the largest post_delay.
+            number: same as True, but it waits this number of seconds after the barrier.
+        Returns:
+            dictionary {root instrument: time in seconds to set its group} (without the settling time)
+        """
+        groups = group_by_instrument(items, key=lambda item: item[0])
+        skip = settle is not False
+        delays, durations = self.map(lambda group: set_parameters(group, skip_post_delay=skip), groups)
+        if settle is True:
+            time.sleep(max(delays.values(), default=0))
+        elif skip:
+            time.sleep(float(settle))
+        return durations
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='GroupExecutor')
+        return self._executor
+
+    @staticmethod
+    def _timed_call(func, items):
+        t0 = time.perf_counter()
+        output = func(items)
+        return output, time.perf_counter() - t0
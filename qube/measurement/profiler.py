@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+from qcodes.dataset.data_set import DataSetProtocol
+
+from qube.measurement.stats import StreamingStats
+
+LATENCY_TAG = 'sweep_latency'
+TRACE_TAG = 'sweep_trace'
+
+
+class LatencyStats(StreamingStats):
+    def __init__(self, reservoir_size: int = 1000):
+        """
+        Streaming statistics of the latencies of one kind of call (set or get) of a parameter (see
+        stats.StreamingStats). The percentiles and histograms use a fixed-size reservoir of sampled latencies.
+        """
+        super().__init__(reservoir_size=reservoir_size)
+
+    def histogram(self, bins: int = 20):
+        """ Histogram (counts, bin edges in s) of the sampled latencies """
+        return np.histogram(self.values, bins=bins)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'total': float(self.total),
+            'mean': float(self.mean),
+            'std': float(self.std),
+            'min': float(self.min),
+            'max': float(self.max),
+            'p50': float(self.percentile(50)),
+            'p95': float(self.percentile(95)),
+            'p99': float(self.percentile(99)),
+        }
+
+
+class ParameterProfiler(object):
+    def __init__(self, parameters: Iterable[Any], max_events: int = 100000, reservoir_size: int = 1000):
+        """
+        Record the latency of every set and get of a list of qcodes parameters.
+        While the profiler is active (with statement or .start/.stop), the set and get methods of each parameter are
+        wrapped to time the calls, so it works for any apply/readout method and for parallel calls in threads.
+        parameters: list of qcodes parameters
+        max_events: maximum number of calls kept for the timeline (the last ones). Statistics use all the calls.
+        reservoir_size: number of sampled latencies per parameter and kind for the percentiles and histograms.
+        Example:
+            with ParameterProfiler([V1, ADC]) as profiler:
+                ...
+            profiler.get_report()  # {'V1': {'set': {'count': ..., 'mean': ..., 'p95': ...}}, ...}
+            profiler.export_chrome_trace('sweep.json')  # open in chrome://tracing or https://ui.perfetto.dev
+        """
+        self.parameters = list(dict.fromkeys(parameters))
+        self.max_events = int(max_events)
+        self.reservoir_size = int(reservoir_size)
+        self.stats = {}  # {(name, kind): LatencyStats}
+        self.events = deque(maxlen=self.max_events)  # (name, kind, start, duration, thread id)
+        self._originals = {}  # {param: {kind: original method}}
+        self._lock = threading.Lock()
+        self._t0 = None
+
+    @property
+    def active(self) -> bool:
+        return len(self._originals) > 0
+
+    def start(self):
+        if self.active:
+            return
+        self._t0 = time.perf_counter()
+        for param in self.parameters:
+            originals = {}
+            for kind in ['set', 'get']:
+                if kind in param.__dict__:  # instance methods created by qcodes for settable/gettable parameters
+                    originals[kind] = param.__dict__[kind]
+                    setattr(param, kind, self._wrap(param, kind, originals[kind]))
+            self._originals[param] = originals
+
+    def stop(self):
+        for param, originals in self._originals.items():
+            for kind, method in originals.items():
+                setattr(param, kind, method)
+        self._originals = {}
+
+    def reset(self):
+        self.stats = {}
+        self.events = deque(maxlen=self.max_events)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def get_stats(self, param: Any, kind: str = 'set') -> LatencyStats:
+        key = (self._get_name(param), kind)
+        if key not in self.stats:
+            raise KeyError(f'No {kind} calls recorded for {key[0]}')
+        return self.stats[key]
+
+    def get_report(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Statistics of the latencies in seconds: {parameter full name: {'set'/'get': {count, total, mean, std, min,
+        max, p50, p95, p99}}}.
+        """
+        report = {}
+        for (name, kind), stats in self.stats.items():
+            report.setdefault(name, {})[kind] = stats.to_dict()
+        return report
+
+    def get_slowest(self, n: int = 5, key: str = 'total') -> List[List[Any]]:
+        """ List of [parameter name, kind, value] of the n calls with the largest statistic (total, mean, p95...) """
+        rows = [[name, kind, stats.to_dict()[key]] for (name, kind), stats in self.stats.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)[:n]
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        Timeline of the recorded calls in the Chrome trace event format (complete events with times in us).
+        Each thread (ex: instrument groups of Sweeper.concurrent_readout) is shown in its own row.
+        """
+        pid = os.getpid()
+        events = []
+        for name, kind, start, duration, tid in list(self.events):
+            events.append({
+                'name': name,
+                'cat': kind,
+                'ph': 'X',
+                'ts': start * 1e6,
+                'dur': duration * 1e6,
+                'pid': pid,
+                'tid': tid,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
+
+    def save(self, ds: DataSetProtocol, trace_path: str = None):
+        """
+        Save the report in the metadata of a qcodes dataset (tag 'sweep_latency'). If trace_path is given, the
+        timeline is exported to this json side file, which can be large, and only its path is saved in the metadata
+        (tag 'sweep_trace'). See load_latency_report and load_chrome_trace.
+        """
+        ds.add_metadata(LATENCY_TAG, json.dumps(self.get_report()))
+        if trace_path is not None:
+            folder = os.path.dirname(trace_path)
+            if folder != '':
+                os.makedirs(folder, exist_ok=True)
+            self.export_chrome_trace(trace_path)
+            ds.add_metadata(TRACE_TAG, trace_path)
+
+    def show(self):
+        fmt = lambda s: f'{s * 1e3:.2f}ms'
+        t = 'Parameter latencies:\n'
+        for name, kinds in self.get_report().items():
+            for kind, st in kinds.items():
+                t += f"{name} [{kind}]: {fmt(st['mean'])} (mean) | {fmt(st['total'])} (total) | " \
+                     f"{fmt(st['p50'])} / {fmt(st['p95'])} / {fmt(st['p99'])} (p50 / p95 / p99) | {st['count']} calls\n"
+        print(t)
+
+    def _wrap(self, param: Any, kind: str, method):
+        name = self._get_name(param)
+        key = (name, kind)
+
+        def wrapped(*args, **kwargs):
+            t_start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - t_start
+                self._add(key, t_start - self._t0, duration)
+
+        return wrapped
+
+    def _add(self, key, start: float, duration: float):
+        with self._lock:
+            if key not in self.stats:
+                self.stats[key] = LatencyStats(self.reservoir_size)
+            self.stats[key].add(duration)
+            self.events.append((key[0], key[1], start, duration, threading.get_ident()))
+
+    @staticmethod
+    def _get_name(param: Any) -> str:
+        return getattr(param, 'full_name', str(param))
+
+
+def load_latency_report(ds: DataSetProtocol) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Latency report saved in the metadata of a qcodes dataset (see ParameterProfiler.get_report).
+    """
+    if LATENCY_TAG not in ds.metadata:
+        raise ValueError(f'Dataset {ds.run_id} does not contain a latency report')
+    return json.loads(ds.metadata[LATENCY_TAG])
+
+
+def load_chrome_trace(ds: DataSetProtocol) -> Dict[str, Any]:
+    """
+    Timeline saved in the side file of a qcodes dataset (see ParameterProfiler.to_chrome_trace and .save).
+    """
+    if TRACE_TAG not in ds.metadata:
+        raise ValueError(f'Dataset {ds.run_id} does not contain a latency trace')
+    with open(ds.metadata[TRACE_TAG], 'r') as f:
+        return json.load(f)
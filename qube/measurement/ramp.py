@@ -0,0 +1,158 @@
+import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+from qube.measurement.parallel import GroupExecutor, group_by_instrument
+
+RAMP_TAG = 'ramp'  # key of the ramp policy in the metadata of a parameter (see Controls.set_ramp)
+
+DEFAULT_STEP_DELAY = 0.01  # s, for policies defined only by max_rate
+
+
+class RampPolicy(object):
+    def __init__(self, max_step: float = None, step_delay: float = 0, max_rate: float = None):
+        """
+        Maximum slew of a parameter. A change larger than max_step is done in steps of at most max_step, waiting
+        step_delay after each step.
+        max_step: maximum change per step (in the units of the parameter)
+        step_delay: waiting time after each intermediate step in seconds
+        max_rate: maximum rate of change in units per second. If max_step is None, the step is
+            max_rate * step_delay (with step_delay = 10ms if it is 0). Otherwise, step_delay is increased if needed
+            so that max_step / step_delay <= max_rate.
+        Example:
+            RampPolicy(max_step=0.01, step_delay=0.005)  # 10 mV steps every 5 ms
+            RampPolicy(max_rate=0.5)  # 0.5 V/s in steps of 5 mV every 10 ms
+        """
+        if max_step is None and max_rate is None:
+            raise ValueError('A ramp needs max_step or max_rate')
+        if max_step is not None and max_step <= 0:
+            raise ValueError('max_step must be > 0')
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError('max_rate must be > 0')
+        if step_delay < 0:
+            raise ValueError('step_delay must be >= 0')
+        step_delay = float(step_delay)
+        if max_rate is not None:
+            if max_step is None:
+                step_delay = step_delay if step_delay > 0 else DEFAULT_STEP_DELAY
+                max_step = max_rate * step_delay
+            else:
+                step_delay = max(step_delay, max_step / max_rate)
+        self.max_step = float(max_step)
+        self.step_delay = step_delay
+        self.max_rate = None if max_rate is None else float(max_rate)
+
+    def get_steps(self, start: float, target: float) -> int:
+        """ Number of steps to go from start to target (1 if no intermediate step is needed) """
+        return max(1, int(np.ceil(abs(target - start) / self.max_step - 1e-9)))
+
+    def get_ramp(self, start: float, target: float) -> np.ndarray:
+        """ Intermediate values to go from start to target (the target is not included) """
+        steps = self.get_steps(start, target)
+        return start + (target - start) * np.arange(1, steps) / steps
+
+    def get_duration(self, start: float, target: float) -> float:
+        """ Waiting time of the ramp from start to target in seconds """
+        return (self.get_steps(start, target) - 1) * self.step_delay
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'max_step': self.max_step, 'step_delay': self.step_delay, 'max_rate': self.max_rate}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> 'RampPolicy':
+        return cls(max_step=d.get('max_step', None), step_delay=d.get('step_delay', 0),
+                   max_rate=d.get('max_rate', None))
+
+    def __repr__(self):
+        rate = f', max_rate={self.max_rate}' if self.max_rate is not None else ''
+        return f'RampPolicy(max_step={self.max_step}, step_delay={self.step_delay}{rate})'
+
+
+def to_ramp_policy(policy: Union[RampPolicy, Dict[str, Any], None]) -> Union[RampPolicy, None]:
+    """ RampPolicy from an instance, a dictionary (see RampPolicy.to_dict) or None """
+    if policy is None or isinstance(policy, RampPolicy):
+        return policy
+    if isinstance(policy, dict):
+        return RampPolicy.from_dict(policy)
+    raise TypeError('A ramp policy must be a RampPolicy, a dictionary or None')
+
+
+def get_ramp_groups(items: Iterable[Tuple[Any, Any]], policies: Dict[Any, RampPolicy]) \
+        -> Dict[Any, Tuple[List, np.ndarray, float]]:
+    """
+    Lock-step ramps of the parameters which have a policy, grouped by root instrument.
+    All the parameters of an instrument are ramped together in the same number of steps, which is the largest one
+    needed in the group. Then, no parameter exceeds its max_step and the waiting time of the group is the one of its
+    longest ramp (with the largest step_delay of the group).
+    The start value of each parameter is its cached value (or it is read if the cache is invalid). Non-numeric
+    values are not ramped.
+    items: list of (qcodes parameter, target value)
+    policies: dictionary {qcodes parameter: RampPolicy}
+    Returns:
+        dictionary {root instrument: (parameters, values, step_delay)} with only the groups that need intermediate
+        steps. values has shape (steps - 1, parameters) and does not include the targets.
+    """
+    ramps = []
+    for param, target in items:
+        policy = policies.get(param, None)
+        if policy is None:
+            continue
+        try:
+            start, target = float(param.cache.get()), float(target)
+        except (TypeError, ValueError):
+            continue
+        if not (np.isfinite(start) and np.isfinite(target)):
+            continue
+        ramps.append((param, start, target, policy))
+
+    groups = {}
+    for instrument, group in group_by_instrument(ramps, key=lambda ramp: ramp[0]).items():
+        steps = max(policy.get_steps(start, target) for _, start, target, policy in group)
+        if steps <= 1:
+            continue
+        fractions = np.arange(1, steps)[:, None] / steps
+        starts = np.array([start for _, start, _, _ in group])
+        targets = np.array([target for _, _, target, _ in group])
+        values = starts + (targets - starts) * fractions
+        delay = max(policy.step_delay for _, _, _, policy in group)
+        groups[instrument] = ([ramp[0] for ramp in group], values, delay)
+    return groups
+
+
+def ramp_group(group: Tuple[List, np.ndarray, float], after_step: Callable[[List], Any] = None):
+    """
+    Set the intermediate values of a group of get_ramp_groups, waiting step_delay after each step.
+    after_step: function f(parameters) called after setting each step (ex: move command of the instrument)
+    """
+    params, values, delay = group
+    for row in values:
+        for param, value in zip(params, row):
+            param(value)
+        if after_step is not None:
+            after_step(params)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def ramp_parameters(items: Iterable[Tuple[Any, Any]], policies: Dict[Any, RampPolicy],
+                    executor: GroupExecutor = None, after_step: Callable[[List], Any] = None) -> Dict[Any, float]:
+    """
+    Ramp the parameters which have a policy to the last intermediate value before their target (see
+    get_ramp_groups). The targets are not set, so the usual apply method sets them afterwards.
+    items: list of (qcodes parameter, target value)
+    policies: dictionary {qcodes parameter: RampPolicy}
+    executor: if it is given, the instruments are ramped in parallel threads. Otherwise, one after another.
+    after_step: function f(parameters) called after each step of a group (see ramp_group)
+    Returns:
+        dictionary {root instrument: time in seconds to ramp its group}
+    """
+    groups = get_ramp_groups(items, policies)
+    if executor is not None:
+        return executor.map(lambda group: ramp_group(group, after_step), groups)[1]
+    durations = {}
+    for instrument, group in groups.items():
+        t0 = time.perf_counter()
+        ramp_group(group, after_step)
+        durations[instrument] = time.perf_counter() - t0
+    return durations
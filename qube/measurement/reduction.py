@@ -0,0 +1,271 @@
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, Union
+
+import numpy as np
+
+RAW_FILE_TAG = 'sweep_raw_file'
+
+
+class Reduction(object):
+    name = 'custom'
+    axis_name = 'index'  # name of the dim 0 of the reduced readout
+
+    def __init__(self, func: Callable[[np.ndarray], Any] = None, axis: Iterable[Any] = None):
+        """
+        Reduction of an array readout before saving it (see Sweeper.set_reduction).
+        The raw value is flattened and reduced to a 1D array (or a number) at each step. The size of the raw and
+        reduced values are fixed by the first step.
+        func: function f(raw array) -> reduced array for custom reductions
+        axis: values of the dim 0 of the reduced readout for custom reductions (default: index)
+        """
+        self.func = func
+        self.axis = None if axis is None else np.asarray(axis)
+        self.raw_size = None
+        self.size = None
+
+    def __call__(self, value) -> np.ndarray:
+        value = np.asarray(value).ravel()
+        if self.raw_size is None:
+            self.raw_size = value.size
+        elif value.size != self.raw_size:
+            raise ValueError(f'The readout size changed during the sweep ({self.raw_size} -> {value.size})')
+        if self.size is not None and value.dtype.kind == 'f' and np.all(np.isnan(value)):
+            output = np.full(self.size, np.nan)  # steps skipped by a rule
+        else:
+            output = np.asarray(self.reduce(value)).ravel()
+        if self.size is None:
+            self.size = output.size
+        return output
+
+    def reduce(self, value: np.ndarray) -> np.ndarray:
+        if self.func is None:
+            raise ValueError('Custom reductions need a function')
+        return self.func(value)
+
+    def reset(self):
+        """ Forget the sizes of the previous sweep """
+        self.raw_size = None
+        self.size = None
+
+    def get_axis_values(self) -> np.ndarray:
+        """ Values of the dim 0 of the reduced readout """
+        if self.axis is not None:
+            return self.axis
+        return np.arange(self.size)
+
+    def get_params(self) -> Dict[str, Any]:
+        """ Json serializable arguments to create the reduction again (see .from_dict) """
+        params = {'function': getattr(self.func, '__name__', repr(self.func))}
+        if self.axis is not None:
+            params['axis'] = self.axis.tolist()
+        return params
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ Recipe of the reduction saved in the sweep info """
+        return {'name': self.name, 'raw_size': self.raw_size, 'size': self.size, 'params': self.get_params()}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> 'Reduction':
+        """ Reduction created from a recipe (see .to_dict). Custom functions are not restored. """
+        red_cls = REDUCTIONS.get(d['name'], Reduction)
+        params = dict(d.get('params', {}))
+        if red_cls is Reduction:
+            red = Reduction(axis=params.get('axis', None))
+        else:
+            red = red_cls(**params)
+        red.raw_size = d.get('raw_size', None)
+        red.size = d.get('size', None)
+        return red
+
+    def __repr__(self):
+        params = ', '.join(f'{k}={v}' for k, v in self.get_params().items() if k != 'axis')
+        return f'{self.__class__.__name__}({params})'
+
+
+class Mean(Reduction):
+    name = 'mean'
+
+    def __init__(self):
+        """ Mean value of the readout """
+        super().__init__()
+
+    def reduce(self, value: np.ndarray) -> np.ndarray:
+        return np.mean(value)
+
+    def get_params(self) -> Dict[str, Any]:
+        return {}
+
+
+class Decimate(Reduction):
+    name = 'decimate'
+    axis_name = 'sample'
+
+    def __init__(self, factor: int):
+        """ Keep one sample every factor samples. The axis is the index of the kept samples. """
+        super().__init__()
+        self.factor = _validate_factor(factor, 'factor')
+
+    def reduce(self, value: np.ndarray) -> np.ndarray:
+        return value[::self.factor]
+
+    def get_axis_values(self) -> np.ndarray:
+        return np.arange(0, self.raw_size, self.factor)
+
+    def get_params(self) -> Dict[str, Any]:
+        return {'factor': self.factor}
+
+
+class Boxcar(Reduction):
+    name = 'boxcar'
+    axis_name = 'sample'
+
+    def __init__(self, width: int):
+        """
+        Mean of consecutive blocks of width samples. The last samples which do not fill a block are discarded.
+        The axis is the center of each block in samples.
+        """
+        super().__init__()
+        self.width = _validate_factor(width, 'width')
+
+    def reduce(self, value: np.ndarray) -> np.ndarray:
+        return _blocks(value, self.width).mean(axis=1)
+
+    def get_axis_values(self) -> np.ndarray:
+        return _block_centers(self.raw_size, self.width)
+
+    def get_params(self) -> Dict[str, Any]:
+        return {'width': self.width}
+
+
+class Envelope(Reduction):
+    name = 'envelope'
+    axis_name = 'sample'
+
+    def __init__(self, width: int):
+        """
+        Minimum and maximum of consecutive blocks of width samples, saved as [min0, max0, min1, max1, ...].
+        The axis is the center of each block repeated twice, so plotting the reduced readout against it draws the
+        envelope of the raw trace.
+        """
+        super().__init__()
+        self.width = _validate_factor(width, 'width')
+
+    def reduce(self, value: np.ndarray) -> np.ndarray:
+        blocks = _blocks(value, self.width)
+        return np.stack([blocks.min(axis=1), blocks.max(axis=1)], axis=1).ravel()
+
+    def get_axis_values(self) -> np.ndarray:
+        return np.repeat(_block_centers(self.raw_size, self.width), 2)
+
+    def get_params(self) -> Dict[str, Any]:
+        return {'width': self.width}
+
+
+class Histogram(Reduction):
+    name = 'histogram'
+    axis_name = 'bin'
+
+    def __init__(self, bins: int = 100, range: Iterable[float] = None):
+        """
+        Counts of the raw values in bins. If range is None, the range of the first step is used for the whole
+        sweep, so all the steps have the same bins. The axis is the center of the bins (in the readout unit).
+        """
+        super().__init__()
+        self.bins = _validate_factor(bins, 'bins')
+        self.range = None if range is None else [float(v) for v in range]
+        self._fixed_range = self.range is not None
+
+    def reduce(self, value: np.ndarray) -> np.ndarray:
+        if self.range is None:
+            vmin, vmax = float(np.nanmin(value)), float(np.nanmax(value))
+            self.range = [vmin, vmax] if vmax > vmin else [vmin - 0.5, vmin + 0.5]
+        return np.histogram(value, bins=self.bins, range=self.range)[0]
+
+    def reset(self):
+        super().reset()
+        if not self._fixed_range:
+            self.range = None
+
+    def get_axis_values(self) -> np.ndarray:
+        edges = np.linspace(self.range[0], self.range[1], self.bins + 1)
+        return (edges[1:] + edges[:-1]) / 2
+
+    def get_params(self) -> Dict[str, Any]:
+        return {'bins': self.bins, 'range': self.range}
+
+
+REDUCTIONS = {cls.name: cls for cls in [Mean, Decimate, Boxcar, Envelope, Histogram]}
+
+
+def to_reduction(reduction: Union[str, Reduction, Callable[[np.ndarray], Any]], **kwargs) -> Reduction:
+    """
+    Reduction from its name ('mean', 'decimate', 'boxcar', 'envelope', 'histogram') and arguments, a function or
+    a Reduction instance.
+    Ex: to_reduction('boxcar', width=10)
+    """
+    if isinstance(reduction, Reduction):
+        return reduction
+    if isinstance(reduction, str):
+        if reduction not in REDUCTIONS:
+            raise ValueError(f'Unknown reduction ({reduction}). Valid reductions: {list(REDUCTIONS.keys())}')
+        return REDUCTIONS[reduction](**kwargs)
+    if callable(reduction):
+        return Reduction(reduction, **kwargs)
+    raise TypeError('Reduction must be a name, a function or a Reduction instance')
+
+
+class RawWriter(object):
+    def __init__(self, path: str):
+        """
+        Side file (hdf5) with the raw values of the reduced readouts of a sweep. Each readout is saved in a dataset
+        named by its full name with one row per step.
+        """
+        import h5py  # only needed to save raw data
+        folder = os.path.dirname(path)
+        if folder != '':
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self._file = h5py.File(path, 'a')
+
+    def write(self, name: str, step: int, value):
+        value = np.asarray(value).ravel()
+        if name not in self._file:
+            self._file.create_dataset(name, shape=(0, value.size), maxshape=(None, value.size), dtype=value.dtype,
+                                      chunks=(max(1, min(1024, 2 ** 20 // max(value.nbytes, 1))), value.size))
+        dataset = self._file[name]
+        if dataset.shape[0] <= step:
+            dataset.resize(step + 1, axis=0)
+        dataset[step] = value
+
+    def close(self):
+        self._file.close()
+
+
+def load_raw(path: str, name: str) -> np.ndarray:
+    """ Raw values (steps, raw size) of a readout saved by RawWriter """
+    import h5py
+    with h5py.File(path, 'r') as f:
+        if name not in f:
+            raise ValueError(f'{path} does not contain raw data of {name}')
+        return f[name][()]
+
+
+def _validate_factor(value: int, name: str) -> int:
+    if not isinstance(value, (int, np.integer)) or value < 1:
+        raise ValueError(f'{name} must be an integer >= 1')
+    return int(value)
+
+
+def _blocks(value: np.ndarray, width: int) -> np.ndarray:
+    n = value.size // width
+    if n == 0:
+        raise ValueError(f'The readout has less samples ({value.size}) than the block width ({width})')
+    return value[:n * width].reshape(n, width)
+
+
+def _block_centers(raw_size: int, width: int) -> np.ndarray:
+    return np.arange(raw_size // width) * width + (width - 1) / 2
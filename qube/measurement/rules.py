@@ -0,0 +1,150 @@
+import operator
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple, Union
+
+import numpy as np
+
+RULES_TAG = 'sweep_rules'
+
+ACTIONS = ['abort', 'skip']
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+
+class SweepRule(object):
+    def __init__(self, condition: Union[Callable[[Dict], bool], Tuple[Any, str, Any]], action: str = 'abort',
+                 dim: int = 1, consecutive: int = 1):
+        """
+        Rule evaluated on the results of each step of a sweep (see Sweeper.add_rule).
+        condition: function f(results) -> bool, where results is the dictionary {readout: value} of the step,
+            or tuple (readout, operator, threshold) with operator in '>', '>=', '<', '<=', '==', '!='.
+            For array readouts, the tuple condition is True if it is True for any element.
+        action:
+            'abort': stop the sweep (post_process and return_to are executed as usual)
+            'skip': skip the remaining points of the current sweep of dims 1 to dim. With dim=1, the rest of the
+                line of dim 1 is skipped; with dim=2, all the points until the next step of dim 3, etc.
+        dim: dimension of the skip action
+        consecutive: number of consecutive steps fulfilling the condition to trigger the action
+        Example:
+            SweepRule((I_dc, '>', 10e-9), 'abort')  # current limit
+            SweepRule(lambda r: abs(r[I_dc]) < 1e-12, 'skip', dim=1, consecutive=5)  # pinched off
+        """
+        if action not in ACTIONS:
+            raise ValueError(f'Unknown rule action ({action}). Valid actions: {ACTIONS}')
+        if int(dim) < 1:
+            raise ValueError('The dim of a rule must be >= 1')
+        if int(consecutive) < 1:
+            raise ValueError('consecutive must be >= 1')
+        if not callable(condition):
+            if len(condition) != 3 or condition[1] not in OPERATORS:
+                raise ValueError(f'Rule condition must be a function or (readout, operator, threshold) with '
+                                 f'operator in {list(OPERATORS.keys())}')
+        self.condition = condition
+        self.action = action
+        self.dim = int(dim)
+        self.consecutive = int(consecutive)
+        self.count = 0
+
+    def evaluate(self, results: Dict[Any, Any]) -> bool:
+        if callable(self.condition):
+            return bool(self.condition(results))
+        readout, op, threshold = self.condition
+        return bool(np.any(OPERATORS[op](np.asarray(results[readout]), threshold)))
+
+    def check(self, results: Dict[Any, Any]) -> bool:
+        """ Evaluate the condition and return True when it has been fulfilled in the last .consecutive steps """
+        self.count = self.count + 1 if self.evaluate(results) else 0
+        if self.count >= self.consecutive:
+            self.count = 0
+            return True
+        return False
+
+    def reset(self):
+        self.count = 0
+
+    def __repr__(self):
+        if callable(self.condition):
+            condition = getattr(self.condition, '__name__', repr(self.condition))
+        else:
+            readout, op, threshold = self.condition
+            condition = f'{getattr(readout, "full_name", readout)} {op} {threshold}'
+        dim = f' dim {self.dim}' if self.action == 'skip' else ''
+        return f'SweepRule - {condition} -> {self.action}{dim}'
+
+
+class RuleMonitor(object):
+    def __init__(self, rules: Iterable[SweepRule], order: np.ndarray = None, sweep_shape: Iterable[int] = None,
+                 dim_offset: int = 0):
+        """
+        Evaluate the rules of a running sweep and decide which steps are measured.
+        order: canonical index of the point measured at each step (see SweepPlan.get_order). It is only needed for
+            skip rules.
+        sweep_shape: shape of the stepped sweep
+        dim_offset: number of dims measured in a single step (1 for a hardware fast axis)
+        """
+        self.rules = list(rules)
+        self.order = None if order is None else np.asarray(order, dtype=np.intp)
+        self.sweep_shape = None if sweep_shape is None else [int(pts) for pts in sweep_shape]
+        self.dim_offset = int(dim_offset)
+        self.aborted = False
+        self.events = []  # list of {'step', 'rule', 'action'}
+        self._skipped = {}  # {points per skipped block: set of block indices}
+        self._template = None  # nan results of the skipped steps
+        [rule.reset() for rule in self.rules]
+        if self.order is None and any(rule.action == 'skip' for rule in self.rules):
+            raise ValueError('Skip rules need the order of the sweep steps')
+
+    def iterate(self, instrs: Iterable[Dict[Any, Any]]) -> Iterator[Tuple[int, Union[Dict[Any, Any], None]]]:
+        """
+        Yield (step index, instruction) until a rule aborts the sweep. The instruction of a skipped step is None and
+        the parameters changed during the skipped steps are applied with the next measured step.
+        """
+        pending = {}
+        for i, instr in enumerate(instrs):
+            if self.aborted:
+                return
+            if self.is_skipped(i):
+                pending.update(instr)
+                yield i, None
+                continue
+            if len(pending) > 0:
+                instr = {**pending, **instr}
+                pending = {}
+            yield i, instr
+
+    def is_skipped(self, step: int) -> bool:
+        if len(self._skipped) == 0:
+            return False
+        canonical = self.order[step]
+        return any(canonical // size in blocks for size, blocks in self._skipped.items())
+
+    def check(self, step: int, results: Dict[Any, Any]):
+        """ Evaluate the rules on the results of a measured step """
+        if self._template is None:
+            self._template = {param: _nan_like(value) for param, value in results.items()}
+        for rule in self.rules:
+            if not rule.check(results):
+                continue
+            self.events.append({'step': int(step), 'rule': repr(rule), 'action': rule.action})
+            if rule.action == 'abort':
+                self.aborted = True
+                return
+            level = rule.dim - self.dim_offset  # dims already measured in a single step are not skipped
+            if level > 0:
+                size = int(np.prod(self.sweep_shape[:level]))
+                self._skipped.setdefault(size, set()).add(int(self.order[step]) // size)
+
+    def get_skipped_results(self) -> Dict[Any, Any]:
+        """ Results saved for a skipped step: nan with the shape of the measured readouts """
+        return dict(self._template) if self._template is not None else {}
+
+
+def _nan_like(value) -> Union[float, np.ndarray]:
+    shape = np.shape(value)
+    return np.full(shape, np.nan) if len(shape) > 0 else np.nan
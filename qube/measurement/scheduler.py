@@ -0,0 +1,274 @@
+import time
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+from qube.measurement.sweeper import Sweeper, QcParamType
+
+
+class SweepQueue(object):
+    def __init__(self, sweepers: Iterable[Sweeper] = None, optimize_order: bool = True, skip_transitions: bool = True,
+                 stop_on_error: bool = True, tolerance: float = 1e-9):
+        """
+        Execute several configured Sweepers back-to-back.
+        sweepers: list of configured Sweepers (see .add)
+        optimize_order: if it is True, the sweeps are executed in the order that minimizes the travel of the
+            control parameters between the end of a sweep and the start of the next one (greedy nearest neighbour,
+            see .get_order). Otherwise, in the given order.
+        skip_transitions: if it is True,
+            - start_at values which are already set at the end of the previous sweep are not applied again
+            - return_to values of parameters which are applied again at the start of the next sweep (by its start_at
+              or its first step) are not applied.
+            The configuration of the sweepers is not modified.
+        stop_on_error: if it is False, the next sweeps are executed when a sweep raises an error (except for
+            KeyboardInterrupt), which is saved in the report.
+        tolerance: maximum difference between two numeric values to consider them equal
+
+        The parameter values at the start of the queue are taken from the qcodes cache (nothing is read from the
+        instruments). The report (see .get_report) contains the throughput in points per hour of the whole batch.
+        Example:
+            queue = SweepQueue([sw1, sw2, sw3])
+            run_ids = queue.run()
+            queue.show_report()
+        """
+        self.sweepers = []
+        self.optimize_order = bool(optimize_order)
+        self.skip_transitions = bool(skip_transitions)
+        self.stop_on_error = bool(stop_on_error)
+        self.tolerance = float(tolerance)
+        self.run_ids = []
+        self._runs = []  # report of each executed sweep
+        self._elapsed = 0.
+        for sw in sweepers if sweepers is not None else []:
+            self.add(sw)
+
+    def add(self, sweeper: Sweeper):
+        if not isinstance(sweeper, Sweeper):
+            raise TypeError('SweepQueue only accepts Sweeper instances')
+        self.sweepers.append(sweeper)
+
+    def clear(self):
+        self.sweepers = []
+        self.run_ids = []
+        self._runs = []
+        self._elapsed = 0.
+
+    def __len__(self):
+        return len(self.sweepers)
+
+    """ Planning """
+
+    def get_start_config(self, sweeper: Sweeper) -> Dict[QcParamType, Any]:
+        """
+        Parameter values applied at the start of a sweep: start_at and then the first step.
+        """
+        config = dict(sweeper.start_at)
+        plan = sweeper.get_sweep_plan()
+        if len(plan) > 0:
+            config.update(plan[0])
+        return config
+
+    def get_end_config(self, sweeper: Sweeper, skipped_return_to: Iterable[QcParamType] = ()) \
+            -> Dict[QcParamType, Any]:
+        """
+        Parameter values at the end of a sweep: start_at, values of the last step and then return_to.
+        skipped_return_to: return_to parameters which are not applied (they keep the values of the sweep)
+        """
+        config = dict(sweeper.start_at)
+        plan = sweeper.get_sweep_plan()
+        if len(plan) > 0:
+            for k, param in enumerate(plan.parameters):
+                if np.any(plan.changes[k]):
+                    last_applied = np.flatnonzero(plan.changes[k])[-1]
+                    config[param] = plan.values[k][plan.indices[k, last_applied]]
+        skipped_return_to = set(skipped_return_to)
+        config.update({p: v for p, v in sweeper.return_to.items() if p not in skipped_return_to})
+        return config
+
+    def get_order(self) -> List[int]:
+        """
+        Indices of the sweepers in execution order. With optimize_order, it starts from the current cached values
+        and always chooses the sweep whose start is the closest to the end of the previous one.
+        """
+        if not self.optimize_order:
+            return list(range(len(self.sweepers)))
+        starts = [self.get_start_config(sw) for sw in self.sweepers]
+        ends = [self.get_end_config(sw) for sw in self.sweepers]
+        spans = self._get_spans(starts + ends)
+        state = self._get_cached_state(starts)
+        order, remaining = [], list(range(len(self.sweepers)))
+        while remaining:
+            distances = [self._get_distance(state, starts[i], spans) for i in remaining]
+            best = remaining.pop(int(np.argmin(distances)))  # first one in case of a tie
+            order.append(best)
+            state.update(ends[best])
+        return order
+
+    def get_transition_travel(self, order: List[int] = None) -> float:
+        """
+        Travel of the control parameters between the sweeps of a given order (default: .get_order), in units of the
+        span of each parameter in the queue.
+        """
+        order = self.get_order() if order is None else order
+        starts = [self.get_start_config(sw) for sw in self.sweepers]
+        ends = [self.get_end_config(sw) for sw in self.sweepers]
+        spans = self._get_spans(starts + ends)
+        state = self._get_cached_state(starts)
+        travel = 0.
+        for i in order:
+            travel += self._get_distance(state, starts[i], spans)
+            state.update(ends[i])
+        return travel
+
+    """ Execution """
+
+    def run(self, **kwargs) -> List[int]:
+        """
+        Execute the sweeps.
+        kwargs: passed to Sweeper.execute of all the sweeps (ex: test_run=True)
+        Returns:
+            list of run ids in execution order (None for the sweeps which failed)
+        """
+        self.run_ids = []
+        self._runs = []
+        order = self.get_order()
+        starts = [self.get_start_config(sw) for sw in self.sweepers]
+        state = self._get_cached_state(starts)
+        t_start = time.perf_counter()
+        try:
+            for position, i in enumerate(order):
+                sw = self.sweepers[i]
+                next_sw = self.sweepers[order[position + 1]] if position + 1 < len(order) else None
+                skipped_return = self._run_sweep(i, sw, next_sw, state, kwargs)
+                end = self.get_end_config(sw, skipped_return_to=skipped_return)
+                if self._runs[-1]['error'] is not None:  # the sweep stopped before its end: unknown values
+                    end = {param: None for param in end.keys()}
+                state.update(end)
+        finally:
+            self._elapsed = time.perf_counter() - t_start
+        return self.run_ids
+
+    def _run_sweep(self, index: int, sw: Sweeper, next_sw: Sweeper, state: Dict[QcParamType, Any],
+                   kwargs) -> List[QcParamType]:
+        """ Execute a sweep without the skipped transitions. Returns the return_to parameters which were skipped. """
+        start_at, return_to = sw.start_at, sw.return_to
+        skipped_start, skipped_return = [], []
+        if self.skip_transitions:
+            skipped_start = [p for p, v in start_at.items() if p in state and self._is_equal(state[p], v)]
+            if next_sw is not None:
+                next_params = set(self.get_start_config(next_sw).keys())
+                skipped_return = [p for p in return_to.keys() if p in next_params]
+        run = {
+            'index': index,
+            'name': sw.name,
+            'run_id': None,
+            'points': 0,
+            'elapsed': 0.,
+            'skipped_start_at': [p.full_name for p in skipped_start],
+            'skipped_return_to': [p.full_name for p in skipped_return],
+            'error': None,
+        }
+        self._runs.append(run)
+        t0 = time.perf_counter()
+        try:
+            sw.start_at = {p: v for p, v in start_at.items() if p not in skipped_start}
+            sw.return_to = {p: v for p, v in return_to.items() if p not in skipped_return}
+            run['run_id'] = sw.execute(**kwargs)
+        except Exception as e:
+            run['error'] = repr(e)
+            if self.stop_on_error:
+                raise
+        finally:
+            sw.start_at, sw.return_to = start_at, return_to
+            run['elapsed'] = time.perf_counter() - t0
+            run['points'] = sw.get_saved_points()
+            self.run_ids.append(run['run_id'])
+        return skipped_return
+
+    """ Report """
+
+    def get_report(self) -> Dict[str, Any]:
+        """
+        Returns:
+            dictionary with:
+                'runs': list of dictionaries with the index, name, run_id, measured points, elapsed time, skipped
+                    start_at/return_to parameters and error of each sweep (in execution order)
+                'points': total measured points
+                'elapsed': total time in seconds
+                'points_per_hour': throughput of the batch
+        """
+        points = int(sum(run['points'] for run in self._runs))
+        return {
+            'runs': [dict(run) for run in self._runs],
+            'points': points,
+            'elapsed': self._elapsed,
+            'points_per_hour': points / self._elapsed * 3600 if self._elapsed > 0 else np.nan,
+        }
+
+    def show_report(self):
+        report = self.get_report()
+        fmt = Sweeper._fmt_time
+        t = f"Sweep queue: {len(report['runs'])} runs | {report['points']} points | {fmt(report['elapsed'])} | " \
+            f"{report['points_per_hour']:.0f} points/hour\n"
+        for run in report['runs']:
+            pph = run['points'] / run['elapsed'] * 3600 if run['elapsed'] > 0 else np.nan
+            t += f"[{run['index']}] {run['name']} (run_id: {run['run_id']}): {run['points']} points | " \
+                 f"{fmt(run['elapsed'])} | {pph:.0f} points/hour"
+            skipped = len(run['skipped_start_at']) + len(run['skipped_return_to'])
+            if skipped > 0:
+                t += f" | skipped transitions: {skipped}"
+            if run['error'] is not None:
+                t += f" | error: {run['error']}"
+            t += '\n'
+        print(t)
+
+    """ Private methods """
+
+    def _is_equal(self, v1, v2) -> bool:
+        try:
+            return bool(abs(float(v1) - float(v2)) <= self.tolerance)
+        except (TypeError, ValueError):
+            return v1 == v2
+
+    def _get_distance(self, state: Dict[QcParamType, Any], config: Dict[QcParamType, Any],
+                      spans: Dict[QcParamType, float]) -> float:
+        """ Normalized travel to go from state to config (parameters with unknown state are not counted) """
+        distance = 0.
+        for param, value in config.items():
+            if param not in state or state[param] is None:
+                continue
+            try:
+                distance += abs(float(value) - float(state[param])) / spans[param]
+            except (TypeError, ValueError):
+                distance += 0. if state[param] == value else 1.
+        return distance
+
+    @staticmethod
+    def _get_spans(configs: List[Dict[QcParamType, Any]]) -> Dict[QcParamType, float]:
+        """ Range of the values of each parameter in the queue (1 for non-numeric or constant parameters) """
+        values = {}
+        for config in configs:
+            for param, value in config.items():
+                values.setdefault(param, []).append(value)
+        spans = {}
+        for param, vals in values.items():
+            try:
+                span = float(np.ptp(np.array(vals, dtype=float)))
+            except (TypeError, ValueError):
+                span = 0.
+            spans[param] = span if span > 0 else 1.
+        return spans
+
+    @staticmethod
+    def _get_cached_state(configs: List[Dict[QcParamType, Any]]) -> Dict[QcParamType, Any]:
+        """ Cached value of the parameters of the queue (without reading the instruments) """
+        state = {}
+        for config in configs:
+            for param in config.keys():
+                if param in state:
+                    continue
+                try:
+                    state[param] = param.cache.get(get_if_invalid=False)
+                except Exception:
+                    state[param] = None
+        return state
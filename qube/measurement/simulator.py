@@ -0,0 +1,336 @@
+from typing import Any, Dict, Iterable, List, Union
+
+import numpy as np
+
+from qube.measurement.parallel import get_parameter_chain, get_root_instrument
+from qube.measurement.sweeper import Sweeper, SweepPlan, Timer
+from qube.measurement.traversal import TRAVERSAL_ORDERS, get_traversal_order
+
+
+class LatencyModel(object):
+    def __init__(self, mean: float = 0., std: float = 0., samples: Iterable[float] = None, per_unit: float = 0.):
+        """
+        Model of the time in seconds of a qcodes set or get.
+        mean, std: normal distribution (constant latency if std is 0). Negative samples are clipped to 0.
+        samples: measured latencies (ex: laps of a Timer). If they are given, the latency is drawn from them and
+            mean/std are ignored.
+        per_unit: extra time per unit of change of the value (ex: 0.1 s/V for a ramped gate), so the latency of a
+            set also depends on the size of the step.
+        Example:
+            LatencyModel(0.01)  # 10 ms
+            LatencyModel.from_timer(sw._timers['readout'])  # latencies measured in the last sweep
+        """
+        self.mean = float(mean)
+        self.std = float(std)
+        self.samples = None if samples is None else np.asarray(samples, dtype=float)
+        self.per_unit = float(per_unit)
+        if self.samples is not None and self.samples.size > 0:
+            self.mean = float(np.mean(self.samples))
+            self.std = float(np.std(self.samples))
+        elif self.samples is not None:
+            self.samples = None
+
+    @classmethod
+    def from_timer(cls, timer: Timer, per_unit: float = 0.) -> 'LatencyModel':
+        """ Model with the laps saved in the reservoir of a Timer """
+        return cls(samples=timer.values, per_unit=per_unit)
+
+    @classmethod
+    def from_time_report(cls, report: Dict[str, Any], key: str, per_unit: float = 0.) -> 'LatencyModel':
+        """
+        Model with the laps of a time report (see Sweeper.get_time_report).
+        key: 'apply', 'readout', 'save' or a group key (ex: 'readout[dmm]')
+        """
+        return cls(samples=report[f'{key}_laps'], per_unit=per_unit)
+
+    def sample(self, n: int, rng: np.random.Generator, steps: np.ndarray = None) -> np.ndarray:
+        """
+        Draw n latencies.
+        steps: absolute change of the value for each latency (only used with per_unit)
+        """
+        if self.samples is not None:
+            latency = rng.choice(self.samples, size=n)
+        elif self.std > 0:
+            latency = np.clip(rng.normal(self.mean, self.std, size=n), 0, None)
+        else:
+            latency = np.full(n, self.mean)
+        if self.per_unit != 0 and steps is not None:
+            latency = latency + self.per_unit * steps
+        return latency
+
+    def __repr__(self):
+        kind = 'samples' if self.samples is not None else 'normal'
+        return f'LatencyModel - {kind} - mean: {self.mean}s - std: {self.std}s - per_unit: {self.per_unit}s'
+
+
+LatencyType = Union[LatencyModel, Timer, float, int, Iterable[float]]
+
+
+def to_latency_model(latency: LatencyType) -> LatencyModel:
+    """
+    Convert a constant (in s), a list of measured latencies or a Timer to a LatencyModel.
+    """
+    if isinstance(latency, LatencyModel):
+        return latency
+    elif isinstance(latency, Timer):
+        return LatencyModel.from_timer(latency)
+    elif np.isscalar(latency):
+        return LatencyModel(float(latency))
+    else:
+        return LatencyModel(samples=latency)
+
+
+class SweepSimulator(object):
+    report_keys = ['apply', 'readout', 'save', 'settle']
+
+    def __init__(self, sweeper: Sweeper,
+                 set_latency: Union[LatencyType, Dict[Any, LatencyType]] = 0.,
+                 get_latency: Union[LatencyType, Dict[Any, LatencyType]] = 0.,
+                 save_latency: LatencyType = 0., seed: int = None):
+        """
+        Dry run of a configured Sweeper to estimate its duration without touching the instruments.
+        It uses the same compiled plan as Sweeper.execute, so the number of applied values is the same as in the
+        real sweep for any traversal order (see Sweeper.set_sweep_order).
+        sweeper: configured Sweeper
+        set_latency: latency of a set for all the parameters, or dictionary {qcodes parameter: latency}
+            (parameters which are not in the dictionary have 0 latency). The latency can be a constant in seconds,
+            a list of measured latencies, a Timer or a LatencyModel.
+        get_latency: latency of a get (readout), same format as set_latency
+        save_latency: latency of saving the results of a step
+        seed: seed of the random generator for the latency distributions
+
+        Taken into account:
+            - start_at and return_to, pre/post process waits and pre/post readout waits
+            - post_delay of the parameters (and their sources), or the apply_settle policy of .concurrent_apply
+            - parallel groups of .concurrent_apply and .concurrent_readout (the slowest instrument per step)
+            - line time of the hardware fast axis (see Sweeper.set_fast_axis)
+            - waiting time of the ramps between steps (see Sweeper.set_ramp and Controls.set_ramp), added to the
+              apply time. The parameters of an instrument are ramped in lock-step (see get_ramp_groups), and the
+              instruments in parallel with .concurrent_apply. The first ramp starts at the start_at value (or the
+              cached value).
+        Not taken into account: pre/post processes and readouts functions, and callbacks.
+        Adaptive sweeps are estimated with the first max_points steps of the grid.
+
+        Example:
+            sim = SweepSimulator(sw, set_latency={V1: 0.005, V2: 0.02}, get_latency=0.05)
+            sim.show()  # breakdown for the current order
+            sim.compare_orders()  # {order: total time}
+        """
+        self.sweeper = sweeper
+        self.set_latency = self._get_models(set_latency)
+        self.get_latency = self._get_models(get_latency)
+        self.save_latency = to_latency_model(save_latency)
+        self.seed = seed
+
+    def simulate(self, order: Union[str, Iterable[int]] = None, dims: Iterable[int] = None) -> Dict[str, float]:
+        """
+        Estimate the duration of the sweep.
+        order: traversal order (see Sweeper.set_sweep_order). If it is None, the order of the sweeper.
+        dims: dims for 'snake' order. If order is None, the dims of the sweeper.
+        Returns:
+            dictionary with the estimated times in seconds:
+                'total', 'apply', 'readout', 'save', 'settle' (post_delays and waits), 'loop_mean' (time per step)
+            and 'steps', the number of sweep steps
+        """
+        sw = self.sweeper
+        rng = np.random.default_rng(self.seed)
+        plan = self.get_plan(order, dims)
+        steps = len(plan)
+        apply_step, settle_step = self._apply_times(plan, rng)
+        readout_step = self._readout_times(steps, rng)
+        save_step = self.save_latency.sample(steps, rng)
+        settle_step = settle_step + sw.pre_readout_wait + sw.post_readout_wait
+
+        apply_once, settle_once = 0., sw.pre_process_wait + sw.post_process_wait
+        for instr in [sw.start_at, sw.return_to]:
+            apply_time, settle_time = self._apply_dict(instr, rng)
+            apply_once += apply_time
+            settle_once += settle_time
+
+        report = {
+            'apply': float(np.sum(apply_step) + apply_once),
+            'readout': float(np.sum(readout_step)),
+            'save': float(np.sum(save_step)),
+            'settle': float(np.sum(settle_step) + settle_once),
+        }
+        report['total'] = sum(report.values())
+        loop = apply_step + readout_step + save_step + settle_step
+        report['loop_mean'] = float(np.mean(loop)) if steps > 0 else 0.
+        report['steps'] = steps
+        return report
+
+    def compare_orders(self, orders: Iterable[Union[str, Iterable[int]]] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Simulate the sweep for several traversal orders.
+        orders: list of orders. If it is None, all the predefined orders (raster, snake, hilbert, zorder).
+        Orders which are not valid for the sweep (ex: hilbert for 1 dim) are skipped.
+        Returns:
+            dictionary {order: report} (see .simulate). Custom orders are named 'custom_{i}'.
+        """
+        orders = TRAVERSAL_ORDERS if orders is None else orders
+        reports = {}
+        for i, order in enumerate(orders):
+            name = order if isinstance(order, str) else f'custom_{i}'
+            try:
+                reports[name] = self.simulate(order)
+            except ValueError:
+                continue
+        return reports
+
+    def get_plan(self, order: Union[str, Iterable[int]] = None, dims: Iterable[int] = None) -> SweepPlan:
+        """ Plan of the steps applied by the sweeper for a given traversal order """
+        sw = self.sweeper
+        if order is None:
+            plan = sw.get_sweep_plan()
+        else:
+            sweep_parameters, sweep_shape = sw.get_stepped_sweep()
+            order = get_traversal_order(sweep_shape, order, dims)
+            plan = SweepPlan.compile(sweep_parameters, sweep_shape, order=order)
+        if sw.adaptive is not None and sw.adaptive['max_points'] is not None:
+            plan = plan[:int(sw.adaptive['max_points'])]
+        return plan
+
+    def show(self, order: Union[str, Iterable[int]] = None):
+        report = self.simulate(order)
+        fmt = Sweeper._fmt_time
+        t = f"Simulated sweep ({report['steps']} steps):\n"
+        t += f"Total time: {fmt(report['total'])}\n"
+        t += f"loop: {fmt(report['loop_mean'])} (mean)\n"
+        for key in self.report_keys:
+            share = 100 * report[key] / report['total'] if report['total'] > 0 else 0.
+            t += f"{key}: {fmt(report[key])} ({share:.1f}%)\n"
+        print(t)
+
+    def _apply_times(self, plan: SweepPlan, rng: np.random.Generator):
+        """ Apply and settle time at each step """
+        sw = self.sweeper
+        steps = len(plan)
+        concurrent = self._is_concurrent(sw.apply_method, 'concurrent_apply')
+        latencies = np.zeros((len(plan.parameters), steps))
+        delays = np.zeros((len(plan.parameters), steps))
+        for k, param in enumerate(plan.parameters):
+            changes = plan.changes[k]
+            n = int(np.sum(changes))
+            if n == 0:
+                continue
+            model = self.set_latency.get(param, self.set_latency.get(None))
+            if model is not None:
+                latencies[k, changes] = model.sample(n, rng, self._get_value_steps(plan, k))
+            delays[k, changes] = self._get_post_delay(param)
+        ramps = self._ramp_times(plan, concurrent)
+        if not concurrent:
+            return latencies.sum(axis=0) + ramps, delays.sum(axis=0)
+
+        # Instruments in parallel: the step lasts as long as the slowest instrument
+        groups = self._group_rows(plan.parameters)
+        settle = sw.apply_settle
+        if settle is False:
+            apply = np.max([latencies[rows].sum(axis=0) + delays[rows].sum(axis=0) for rows in groups], axis=0)
+            return apply + ramps, np.zeros(steps)
+        apply = np.max([latencies[rows].sum(axis=0) for rows in groups], axis=0) + ramps
+        applied = np.any(plan.changes, axis=0)
+        if settle is True:
+            return apply, delays.max(axis=0)
+        return apply, np.where(applied, float(settle), 0.)
+
+    def _ramp_times(self, plan: SweepPlan, concurrent: bool) -> np.ndarray:
+        """
+        Waiting time of the ramps at each step. Each instrument ramps its changed parameters in lock-step: the number
+        of steps of its longest ramp times the largest step_delay (see get_ramp_groups).
+        """
+        sw = self.sweeper
+        policies = sw._get_ramp_policies()
+        steps = len(plan)
+        groups = {}  # {instrument: (number of ramp steps, step delay)} at each step
+        for k, param in enumerate(plan.parameters):
+            policy = policies.get(param, None)
+            changes = plan.changes[k]
+            if policy is None or not np.any(changes):
+                continue
+            try:
+                targets = np.asarray(plan.values[k])[plan.indices[k, changes]].astype(float)
+            except (TypeError, ValueError):
+                continue  # non-numeric values are not ramped
+            starts = np.concatenate([[self._get_start_value(param)], targets[:-1]])
+            n_steps = np.ones(steps)
+            with np.errstate(invalid='ignore'):
+                n_steps[changes] = np.maximum(1, np.ceil(np.abs(targets - starts) / policy.max_step - 1e-9))
+            n_steps[~np.isfinite(n_steps)] = 1
+            delay = np.where(changes, policy.step_delay, 0.)
+            group = groups.setdefault(get_root_instrument(param), (np.ones(steps), np.zeros(steps)))
+            np.maximum(group[0], n_steps, out=group[0])
+            np.maximum(group[1], delay, out=group[1])
+        if len(groups) == 0:
+            return np.zeros(steps)
+        durations = np.array([(n_steps - 1) * delay for n_steps, delay in groups.values()])
+        return durations.max(axis=0) if concurrent else durations.sum(axis=0)
+
+    def _apply_dict(self, instr: Dict[Any, Any], rng: np.random.Generator):
+        """ Apply and settle time of a dictionary {param: value} (start_at, return_to) """
+        apply, settle = 0., 0.
+        for param in instr.keys():
+            model = self.set_latency.get(param, self.set_latency.get(None))
+            apply += float(model.sample(1, rng)[0]) if model is not None else 0.
+            settle += self._get_post_delay(param)
+        return apply, settle
+
+    def _readout_times(self, steps: int, rng: np.random.Generator) -> np.ndarray:
+        sw = self.sweeper
+        readouts = list(sw.readouts)
+        latencies = np.zeros((len(readouts), steps))
+        for k, param in enumerate(readouts):
+            model = self.get_latency.get(param, self.get_latency.get(None))
+            if model is not None:
+                latencies[k] = model.sample(steps, rng)
+        if len(readouts) == 0:
+            readout = np.zeros(steps)
+        elif self._is_concurrent(sw.readout_method, 'concurrent_readout'):
+            readout = np.max([latencies[rows].sum(axis=0) for rows in self._group_rows(readouts)], axis=0)
+        else:
+            readout = latencies.sum(axis=0)
+        if sw.fast_axis is not None:
+            readout = readout + sw.fast_axis.point_time * sw.sweep_shape[0] / 1e3  # ms to s
+        return readout
+
+    def _get_start_value(self, param) -> float:
+        """ Value of a parameter before the first step: start_at or the cached value (nan if it is unknown) """
+        start_at = self.sweeper.start_at
+        value = start_at[param] if param in start_at else param.cache.get(get_if_invalid=False)
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    def _is_concurrent(self, method, name: str) -> bool:
+        return getattr(method, '__func__', None) is getattr(Sweeper, name) and \
+            getattr(method, '__self__', None) is self.sweeper
+
+    @staticmethod
+    def _group_rows(params: List[Any]) -> List[List[int]]:
+        groups = {}
+        for k, param in enumerate(params):
+            groups.setdefault(get_root_instrument(param), []).append(k)
+        return list(groups.values())
+
+    @staticmethod
+    def _get_value_steps(plan: SweepPlan, k: int) -> Union[np.ndarray, None]:
+        """ Absolute change of the applied values of a parameter (the first one is 0) """
+        values = np.asarray(plan.values[k])[plan.indices[k, plan.changes[k]]]
+        try:
+            values = values.astype(float)
+        except (TypeError, ValueError):
+            return None
+        steps = np.zeros(len(values))
+        steps[1:] = np.abs(np.diff(values))
+        return steps
+
+    @staticmethod
+    def _get_post_delay(param) -> float:
+        return float(sum(getattr(p, 'post_delay', 0) for p in get_parameter_chain(param)))
+
+    @staticmethod
+    def _get_models(latency: Union[LatencyType, Dict[Any, LatencyType]]) -> Dict[Any, LatencyModel]:
+        """ Dictionary {param: LatencyModel} where the key None is the model for all the parameters """
+        if isinstance(latency, dict):
+            return {param: to_latency_model(value) for param, value in latency.items()}
+        return {None: to_latency_model(latency)}
@@ -0,0 +1,112 @@
+import random
+
+import numpy as np
+
+
+class StreamingStats(object):
+    def __init__(self, reservoir_size: int = 1000, ewma_alpha: float = 0.1):
+        """
+        Streaming statistics of a series of values (ex: laps of a Timer, latencies of a ParameterProfiler).
+        The statistics are updated in O(1) for each value and the values are not kept in memory:
+            - count, sum, mean, variance and std (Welford's algorithm), min and max
+            - exponentially weighted moving average (ewma) where ewma_alpha is the weight of the last value
+            - fixed-size reservoir of randomly sampled values to estimate percentiles (see .percentile).
+              reservoir_size = 0 disables it.
+        """
+        self.reservoir_size = int(reservoir_size)
+        self.ewma_alpha = float(ewma_alpha)
+        self._random = random.Random()
+        self.reset()
+
+    @property
+    def last_value(self):
+        return self._last
+
+    @property
+    def values(self):
+        """ Reservoir of sampled values (all the values if count <= reservoir_size) """
+        return self._reservoir
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def mean(self):
+        return self._mean if self._count > 0 else np.nan
+
+    @property
+    def var(self):
+        return self._m2 / self._count if self._count > 0 else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    @property
+    def min(self):
+        return self._min if self._count > 0 else np.nan
+
+    @property
+    def max(self):
+        return self._max if self._count > 0 else np.nan
+
+    @property
+    def ewma(self):
+        return self._ewma if self._count > 0 else np.nan
+
+    @property
+    def sum(self):
+        return self._sum
+
+    @property
+    def total(self):
+        return self._sum
+
+    def percentile(self, q):
+        """
+        Estimation of the q-th percentile (0 <= q <= 100) of the values from the reservoir.
+        """
+        if len(self._reservoir) == 0:
+            return np.nan
+        return np.percentile(self._reservoir, q)
+
+    def add(self, value: float):
+        """
+        Add a value to the statistics.
+        """
+        self._count += 1
+        self._last = value
+        self._sum += value
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+        if self._count == 1:
+            self._min = self._max = self._ewma = value
+        else:
+            self._min = min(self._min, value)
+            self._max = max(self._max, value)
+            self._ewma += self.ewma_alpha * (value - self._ewma)
+        self._add_to_reservoir(value)
+
+    def reset(self):
+        self._count = 0
+        self._last = np.nan
+        self._sum = 0
+        self._mean = 0
+        self._m2 = 0
+        self._min = np.nan
+        self._max = np.nan
+        self._ewma = np.nan
+        self._reservoir = []
+
+    def _add_to_reservoir(self, value):
+        size = self.reservoir_size
+        if len(self._reservoir) < size:
+            self._reservoir.append(value)
+        elif size > 0:
+            idx = self._random.randrange(self._count)
+            if idx < size:
+                self._reservoir[idx] = value
+
+    clear = reset
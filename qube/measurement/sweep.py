@@ -101,7 +101,102 @@ def register_pre_and_post_process(
         else:
             meas.add_after_run(post_process[0], args=post_process[1])
 
-import time
+class TargetTable(object):
+    """
+    Precompiled target values of the sweep parameters of a Sweep (see Sweep.get_target_values).
+
+    For each dimension, a table with one row per sweep index and one column per
+    numeric target parameter is built once. It contains the sweep values of the
+    parameters swept in this dimension and the offsets of the vector sweeps
+    (offset_<name>_dim<d>). The targets of a point are the sum of the rows
+    selected by its indices in each dimension. Counters (repetitions) are skipped.
+    Non-numeric parameters without offsets are read from their value arrays.
+
+    Arguments:
+     dimensions ... list of dimensions (Sweep parameter 'dimensions')
+     sweeps     ... dictionary {dimension: list of parameters} (Sweep parameter 'sweeps')
+     values     ... dictionary {dimension: list of value-arrays} (Sweep parameter 'values')
+    """
+
+    def __init__(self, dimensions: List, sweeps: dict, values: dict):
+        self.sources = (dimensions, sweeps, values)
+
+        targets = list()  # (parameter, dimension, values) in the order of the instructions
+        offsets = list()  # (name of the swept parameter, dimension, values)
+        for dimension in dimensions:
+            for sweep, sweep_values in zip(sweeps[dimension], values[dimension]):
+                sweep_values = np.asarray(sweep_values)
+                if sweep.name.startswith(str_offset):
+                    offsets.append(('_'.join(sweep.name.split('_')[1:-1]), dimension, sweep_values))
+                elif not sweep.name.startswith(str_counter):
+                    targets.append((sweep, dimension, sweep_values))
+
+        self.parameters = [target[0] for target in targets]
+        numeric = [k for k, (sweep, _, sweep_values) in enumerate(targets)
+                   if sweep_values.dtype.kind in 'iuf']
+        self._numeric = numeric
+        self._direct = [(k, dimension - 1, sweep_values) for k, (_, dimension, sweep_values) in enumerate(targets)
+                        if k not in numeric]
+
+        # Contributions (column, dimension, values) of the sweep values and offsets to the numeric targets:
+        contributions = [(j, targets[k][1], targets[k][2]) for j, k in enumerate(numeric)]
+        for name, dimension, offset_values in offsets:
+            for k, (sweep, _, _) in enumerate(targets):
+                if sweep.name != name:
+                    continue
+                if k not in numeric or offset_values.dtype.kind not in 'iuf':
+                    raise TypeError('Offsets of {:s} must be numeric!'.format(name))
+                contributions.append((numeric.index(k), dimension, offset_values))
+
+        dtypes = [np.result_type(*[v for j, _, v in contributions if j == column]) for column in range(len(numeric))]
+        table_dtype = np.result_type(*dtypes) if len(dtypes) > 0 else np.float64
+        self._dtypes = [(column, dtype.type) for column, dtype in enumerate(dtypes) if dtype != table_dtype]
+
+        self._tables = list()  # (position in index_list, table of shape (points, numeric targets))
+        for dimension in dimensions:
+            dim_contributions = [(j, v) for j, d, v in contributions if d == dimension]
+            if len(dim_contributions) == 0:
+                continue
+            table = np.zeros((len(dim_contributions[0][1]), len(numeric)), dtype=table_dtype)
+            for column, column_values in dim_contributions:
+                table[:, column] += column_values
+            self._tables.append((dimension - 1, table))
+
+    def is_compiled_from(self, dimensions: List, sweeps: dict, values: dict):
+        """
+        This function returns True if the table was built from these instructions.
+        """
+        return all(a is b for a, b in zip(self.sources, (dimensions, sweeps, values)))
+
+    def get(self, index_list):
+        """
+        This function returns the target values at the given indices as a list
+        of tuples [(parameter, value), ...] in the order of the instructions.
+        """
+        if len(self._direct) == 0:
+            return list(zip(self.parameters, self._get_row(index_list)))
+        output = [None] * len(self.parameters)
+        for k, value in zip(self._numeric, self._get_row(index_list)):
+            output[k] = (self.parameters[k], value)
+        for k, position, sweep_values in self._direct:
+            output[k] = (self.parameters[k], sweep_values[int(index_list[position]) % len(sweep_values)])
+        return output
+
+    def _get_row(self, index_list):
+        """
+        Sum of the rows of the tables at the given indices (numeric targets only).
+        """
+        row = None
+        for position, table in self._tables:
+            temp_row = table[int(index_list[position]) % len(table)]
+            row = temp_row if row is None else row + temp_row
+        if row is None:
+            return []
+        row = row.tolist()
+        for column, cast in self._dtypes:
+            row[column] = cast(row[column])
+        return row
+
 
 class Sweep(InstrumentBase):
     """
@@ -160,6 +255,7 @@ class Sweep(InstrumentBase):
         self.add_parameter(name='sweep_info', set_cmd=None, get_cmd=None, vals=vals.Dict(), initial_value=sweep_info)
         self.apply_pre_readout = lambda: 0
         self.apply_post_readout = lambda: 0
+        self._target_table = None
 
     def execute_sweep(self,
                       instructions: List,
@@ -241,14 +337,13 @@ class Sweep(InstrumentBase):
 
             self.write_sweep_info(datasaver, note, return2initial, fast_sweep)
 
-            index_matrix = self.get_indices_for_sweep()
-            # print(index_matrix.shape)
-            for i, index_list in enumerate(index_matrix):
+            n_points = self.get_number_of_sweep_points()
+            for i, index_list in enumerate(self.iter_indices_for_sweep()):
                 # >> index_list << contains index pointers to each sweep-parameter value for each step.
 
                 # Show progress of measurement:
                 if show_progress_bar:
-                    self.progress_update(i, index_matrix.shape[0], show_time_estimation, show_progress_bar)
+                    self.progress_update(i, n_points, show_time_estimation, show_progress_bar)
 
                 # Set sweep values:
                 start = time.time()
@@ -436,19 +531,68 @@ class Sweep(InstrumentBase):
                    [0, 0, 1],
                    [... , 1],
                    [3, 2, 1]])
-            
+
+        The whole matrix is kept in memory (N_points x N_dimensions).
+        Use iter_indices_for_sweep or iter_index_chunks for large sweeps.
         """
+        chunks = list(self.iter_index_chunks(chunk_size=max(1, self.get_number_of_sweep_points())))
+        if len(chunks) == 0:
+            return np.zeros((0, len(self.parameters['shape_of_sweep'].get())), dtype=int)
+        return chunks[0]
 
-        shape_of_sweep = self.parameters['shape_of_sweep'].get()
+    def get_number_of_sweep_points(self):
+        """
+        This function returns the number of steps of the sweep (product of shape_of_sweep).
+        """
+        return int(np.prod(self.parameters['shape_of_sweep'].get(), dtype=np.int64))
 
-        list_of_index_vectors = [np.arange(i) for i in np.flipud(shape_of_sweep)]
+    def iter_indices_for_sweep(self):
+        """
+        This function yields the rows of get_indices_for_sweep one by one
+        (same order: the first dimension is the fastest) without building
+        the index matrix. Only the current index vector is kept in memory.
 
-        indices = np.meshgrid(*list_of_index_vectors, indexing='ij')
+        Example:
+            self.shape_of_sweep = (4,3,2)
+          Yields:
+            array([0, 0, 0]), array([1, 0, 0]), ..., array([3, 2, 1])
+        """
+        shape_of_sweep = list(self.parameters['shape_of_sweep'].get())
+        if len(shape_of_sweep) == 0 or min(shape_of_sweep) < 1:
+            return
+        index_list = np.zeros(len(shape_of_sweep), dtype=int)
+        while True:
+            yield index_list.copy()
+            # Increase the index like an odometer (first dimension is the fastest):
+            for k, pts in enumerate(shape_of_sweep):
+                index_list[k] += 1
+                if index_list[k] < pts:
+                    break
+                index_list[k] = 0
+            else:
+                return
 
-        for k, _ in enumerate(indices):
-            indices[k] = _.flatten()
+    def iter_index_chunks(self, chunk_size: int = 1024):
+        """
+        This function yields consecutive blocks of rows of get_indices_for_sweep
+        as 2D-NumpyArrays of shape (chunk_size, N_dimensions) -- the last block
+        can be smaller -- for batched processing of the sweep steps.
 
-        return np.fliplr(np.array(indices).T)
+        Example:
+            self.shape_of_sweep = (4,3,2)
+            for chunk in self.iter_index_chunks(chunk_size=10):
+                ...  # chunk.shape: (10, 3), (10, 3), (4, 3)
+        """
+        chunk_size = int(chunk_size)
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be >= 1')
+        shape_of_sweep = list(self.parameters['shape_of_sweep'].get())
+        if len(shape_of_sweep) == 0:
+            return
+        n_points = self.get_number_of_sweep_points()
+        for start in range(0, n_points, chunk_size):
+            flat_indices = np.arange(start, min(start + chunk_size, n_points))
+            yield np.stack(np.unravel_index(flat_indices, shape_of_sweep, order='F'), axis=1)
 
     def make_info_tuples(self, note, return2initial, fast_sweep):
 
@@ -508,46 +652,22 @@ class Sweep(InstrumentBase):
     def get_target_values(self,
                           index_list,
                           ):
-
-        # Some definitions for better readability:
-        dimensions = self.parameters['dimensions'].get()
-        sweeps = self.parameters['sweeps'].get()
-        values = self.parameters['values'].get()
-        sweep_offsets = self.parameters['sweep_offsets'].get()
-
-        # For vector sweep -- initialise sweep offset values to zero:
-        sweep_offset_values = dict()
-        for sweep_name in sweep_offsets.keys():
-            sweep_offset_values[sweep_name] = 0
-
-        # Get sweep values for each dimension at current sweep index:               
-        targets = dict()
-
-        for dimension in dimensions:
-            for sweep_id, sweep in enumerate(sweeps[dimension]):
-                temp_name = sweep.name
-                temp_values = values[dimension][sweep_id]
-                temp_index = index_list[dimension - 1] % len(temp_values)
-                temp_value = temp_values[temp_index]
-                is_offset = temp_name.startswith(str_offset)
-                is_counter = temp_name.startswith(str_counter)
-                if is_offset:
-                    #                     real_name = temp_name.split(str_offs_link)[0]
-                    real_name = '_'.join(temp_name.split('_')[1:-1])
-                    sweep_offset_values[real_name] += temp_value
-                elif is_counter:
-                    pass
-                else:  # Set value
-                    targets[sweep] = temp_value
-
-        # For vector sweep -- add offsets to target values:
-        for offset_name, offset_value in sweep_offset_values.items():
-            for dimension in dimensions:
-                for sweep_id, sweep in enumerate(sweeps[dimension]):
-                    if offset_name == sweep.name:
-                        targets[sweep] += offset_value
-
-        return list(targets.items())
+        """
+        This function returns the target values of the sweep parameters at the
+        given indices (one per dimension) as a list of tuples:
+          [(instance_of_control1,value1), ...]
+        The offsets of vector sweeps are added to the values of the swept
+        parameters. The instructions are compiled once into a TargetTable,
+        which is built again when the sweep is registered again.
+        """
+        # Cached values (without the overhead of get) to check that the table is up to date:
+        dimensions, sweeps, values = [self.parameters[name].cache.get(get_if_invalid=False)
+                                      for name in ['dimensions', 'sweeps', 'values']]
+        table = self._target_table
+        if table is None or not table.is_compiled_from(dimensions, sweeps, values):
+            table = TargetTable(dimensions, sweeps, values)
+            self._target_table = table
+        return table.get(index_list)
 
     def progress_update(self, i, N, show_time_estimation, show_progress_bar):
 
@@ -1,12 +1,28 @@
+import contextlib
 import datetime
+import hashlib
+import json
+import os
+import queue
+import threading
 import time
-from typing import List, Union, Callable, Dict, Any, Set, Iterable, Iterator
+from typing import List, Tuple, Union, Callable, Dict, Any, Set, Iterable, Iterator
 
 import numpy
 import numpy as np
-from qcodes import Parameter, DelegateParameter, Measurement
+from qcodes import Parameter, DelegateParameter, Measurement, load_by_id
 from qcodes import validators as vals
 
+from qube.measurement.parallel import GroupExecutor, group_by_instrument, get_group_name, snapshot_parameters
+from qube.measurement.traversal import get_traversal_order, get_normalized_travel
+from qube.measurement.adaptive import AdaptivePlan
+from qube.measurement.checkpoint import Checkpoint, load_checkpoint, get_completed_steps
+from qube.measurement.hardware import HardwareFastAxis
+from qube.measurement.profiler import ParameterProfiler
+from qube.measurement.rules import SweepRule, RuleMonitor, RULES_TAG
+from qube.measurement.reduction import Reduction, RawWriter, to_reduction, RAW_FILE_TAG
+from qube.measurement.ramp import RampPolicy, RAMP_TAG, to_ramp_policy, ramp_parameters
+from qube.measurement.stats import StreamingStats
 from qube.postprocess.dataset import Axis
 
 QcParamType = Union[Parameter, DelegateParameter]
@@ -72,9 +88,55 @@ def get_param_sources(param):
 
 
 def validate_qc_param_values(param, values):
+    """
+    Validate the sweep values with the validators of the parameter and its sources (DelegateParameter).
+    Numeric validators (Numbers, Ints, PermissiveInts, Multiples) check the whole numpy array at once. Other
+    validators and non-numeric arrays are validated value by value.
+    """
     sources = get_param_sources(param)
     all_params = [param] + sources
-    [pi.validate(vi) for vi in values for pi in all_params]
+    values = np.asarray(values)
+    for pi in all_params:
+        validate_param_values(pi, values)
+
+
+def validate_param_values(param, values):
+    """
+    Validate an array of values with the validator of a parameter. It raises the same error as param.validate for the
+    first invalid value.
+    """
+    validator = getattr(param, 'vals', None)
+    if validator is None:
+        return
+    values = np.asarray(values)
+    valid = _get_valid_mask(validator, values)
+    if valid is None:  # not vectorized
+        [param.validate(vi) for vi in values.ravel()]
+    elif not np.all(valid):
+        first = values.ravel()[np.argmin(valid.ravel())]
+        param.validate(first)  # raise the error of qcodes
+        raise ValueError(f'{first!r} is invalid; Parameter: {param.full_name}')
+
+
+def _get_valid_mask(validator, values: np.ndarray) -> Union[np.ndarray, None]:
+    """
+    Boolean array which is True for the values accepted by a numeric validator, or None if the validator cannot be
+    vectorized for this array.
+    """
+    kind = values.dtype.kind
+    vtype = type(validator)
+    if vtype is vals.Numbers and kind in 'iuf':
+        return (values >= validator.min_value) & (values <= validator.max_value)
+    if vtype in (vals.Ints, vals.Multiples) and kind in 'iu':
+        valid = (values >= validator.min_value) & (values <= validator.max_value)
+        if vtype is vals.Multiples:
+            valid &= values % validator.divisor == 0
+        return valid
+    if vtype is vals.PermissiveInts and kind in 'iuf':
+        rounded = np.round(values)
+        close = np.abs(values - rounded) < 1e-05
+        return close & (rounded >= validator.min_value) & (rounded <= validator.max_value)
+    return None
 
 
 class SweepParameter(object):
@@ -164,11 +226,66 @@ class SweepParameter(object):
         These instructions take into account the flags of "apply" and "refresh".
         """
         self._update_values()
-        total_pts = np.prod(self.sweep_shape)
-        for idx in range(total_pts):
-            value = self._get_ordered_instruction_value(idx)
-            change = self._get_ordered_instruction_change_bool(idx)
-            yield [self.parameter, value, change]
+        values = self._values
+        indices = self.get_ordered_indices()
+        changes = self.get_ordered_changes()
+        for idx, change in zip(indices.tolist(), changes.tolist()):
+            yield [self.parameter, values[idx], change]
+
+    def get_ordered_indices(self) -> np.ndarray:
+        """
+        Returns an array with the index of the value (in .values) to apply at each step of the sweep.
+        It is the vectorized equivalent of the value order of .get_ordered_instructions.
+        """
+        self._update_values()
+        n_left, n_mid, n_right = self._n_from_split
+        indices = np.repeat(np.arange(n_mid, dtype=np.intp), n_left)
+        return np.tile(indices, n_right)
+
+    def get_indices_from_order(self, order: np.ndarray) -> np.ndarray:
+        """
+        Returns an integer array with the index of the value to apply at each step for a custom traversal order.
+        order: canonical index of the point measured at each step (see traversal.get_traversal_order)
+        """
+        self._update_values()
+        return self.get_value_index(np.asarray(order, dtype=np.intp))
+
+    def get_value_index(self, index: Union[int, np.ndarray]) -> Union[int, np.ndarray]:
+        """
+        Index of the value (in .values) of the point with a given canonical index, i.e. its coordinate in the dim of
+        the parameter. It works with integers and integer arrays.
+        """
+        n_left, n_mid, n_right = self._n_from_split
+        return (index % (n_left * n_mid)) // n_left
+
+    def get_changes_from_indices(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Returns a boolean array with the "change" flag at each step for a custom traversal order.
+        If refresh is False, the value is applied only when it is different from the previous step.
+        """
+        if self.apply is False:
+            return np.zeros(len(indices), dtype=bool)
+        if self.refresh is True:
+            return np.ones(len(indices), dtype=bool)
+        changes = np.ones(len(indices), dtype=bool)
+        changes[1:] = indices[1:] != indices[:-1]
+        return changes
+
+    def get_ordered_changes(self) -> np.ndarray:
+        """
+        Returns a boolean array with the "change" flag at each step of the sweep.
+        It is the vectorized equivalent of the change flags of .get_ordered_instructions.
+        """
+        self._update_values()
+        n_left, n_mid, n_right = self._n_from_split
+        total_pts = int(n_left * n_mid * n_right)
+        if self.apply is False:
+            return np.zeros(total_pts, dtype=bool)
+        if self.refresh is True:
+            return np.ones(total_pts, dtype=bool)
+        changes = np.zeros(n_left, dtype=bool)
+        changes[0] = True
+        return np.tile(changes, n_mid * n_right)
 
     def get_axis(self) -> Axis:
         qc_param = self.parameter
@@ -180,25 +297,6 @@ class SweepParameter(object):
         )
         return ax
 
-    def _get_ordered_instruction_value_index(self, idx):
-        n_left, n_mid, n_right = self._n_from_split
-        return (idx % (n_left * n_mid)) // n_left
-
-    def _get_ordered_instruction_value(self, idx) -> Any:
-        n_left, n_mid, n_right = self._n_from_split
-        values = self._values
-        _idx = (idx % (n_left * n_mid)) // n_left
-        return values[_idx]
-
-    def _get_ordered_instruction_change_bool(self, idx) -> bool:
-        if self.apply is False:
-            return False
-        if self.refresh is True:
-            return True
-        else:
-            n_left, n_mid, n_right = self._n_from_split
-            return idx % (n_left) == 0
-
     def _validate_sweep_shape(self, sweep_shape: Iterable[int]):
         """
         sweep_shape: list of points to sweep for each dim.
@@ -211,7 +309,141 @@ class SweepParameter(object):
             raise ValueError(f'Swept dim ({self.dim}) has no points assigned')
 
     def validate_values(self, values):
-        [self.parameter.validate(vi) for vi in values]
+        validate_param_values(self.parameter, values)
+
+
+class SweepPlan(object):
+    chunk_size = 4096  # steps converted at once to python lists during the iteration
+
+    def __init__(self, parameters: List[QcParamType], values: List[np.ndarray], indices: np.ndarray,
+                 changes: np.ndarray, order: np.ndarray = None):
+        """
+        Compiled ordered instructions of a sweep.
+        All the arithmetic to know which value has to be applied at each step is done once with numpy, so iterating
+        over the plan has no per-step computation. Use SweepPlan.compile or Sweeper.get_sweep_plan to create it.
+        parameters: list of qcodes parameters
+        values: list of sweep values for each parameter
+        indices: integer array (n_params, n_steps) with the index of the value to apply at each step
+        changes: boolean array (n_params, n_steps) with the "change" flag at each step
+        order: canonical index of the point measured at each step (see traversal.get_traversal_order).
+            If it is None, the steps are in raster order (the canonical index is the step).
+
+        Iterating over the plan yields the same dictionaries as Sweeper.get_ordered_instructions.
+        Example:
+            plan = sw.get_sweep_plan()
+            len(plan)  # total number of steps
+            plan[4]  # {V1: 0.5} (instruction for the step 4)
+            plan[100:200]  # SweepPlan with only the steps from 100 to 199
+            plan.get_values(V1)  # array with the value of V1 at each step
+        """
+        self.parameters = list(parameters)
+        self.values = list(values)
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.changes = np.asarray(changes, dtype=bool)
+        self.order = None if order is None else np.asarray(order, dtype=np.intp)
+        if self.indices.ndim != 2 or self.indices.shape[0] != len(self.parameters):
+            raise ValueError('indices must be an array of shape (n_params, n_steps)')
+        if self.indices.shape != self.changes.shape:
+            raise ValueError('Inconsistent shape between indices and changes')
+        if self.order is not None and self.order.shape != (self.indices.shape[1],):
+            raise ValueError('order must have one element per step')
+
+    @classmethod
+    def compile(cls, sweep_parameters: Iterable[SweepParameter], sweep_shape: Iterable[int],
+                order: np.ndarray = None) -> 'SweepPlan':
+        """
+        Generate the plan from a list of SweepParameter and a sweep shape.
+        order: canonical index of the point measured at each step (see traversal.get_traversal_order).
+            If it is None, raster order.
+        """
+        sweep_shape = np.array(tuple(sweep_shape), dtype=int)
+        total_pts = int(np.prod(sweep_shape)) if order is None else len(order)
+        parameters, values, indices, changes = [], [], [], []
+        for sparam in sweep_parameters:
+            sparam.set_sweep_shape(sweep_shape)
+            parameters.append(sparam.parameter)
+            values.append(sparam.values)
+            if order is None:
+                indices.append(sparam.get_ordered_indices())
+                changes.append(sparam.get_ordered_changes())
+            else:
+                idx = sparam.get_indices_from_order(order)
+                indices.append(idx)
+                changes.append(sparam.get_changes_from_indices(idx))
+        indices = np.array(indices, dtype=np.intp).reshape(len(parameters), total_pts)
+        changes = np.array(changes, dtype=bool).reshape(len(parameters), total_pts)
+        return cls(parameters, values, indices, changes, order=order)
+
+    @property
+    def nbytes(self) -> int:
+        """ Memory used by the index and change arrays """
+        return self.indices.nbytes + self.changes.nbytes
+
+    def get_instruction(self, step: int) -> Dict[QcParamType, Any]:
+        """
+        Dictionary {qcodes parameter: value} to apply at a given step.
+        """
+        step = range(len(self))[step]  # support negative steps and raise IndexError
+        d = {}
+        for k, param in enumerate(self.parameters):
+            if self.changes[k, step]:
+                d[param] = self.values[k][self.indices[k, step]]
+        return d
+
+    def get_indices(self, param: QcParamType) -> np.ndarray:
+        return self.indices[self.parameters.index(param)]
+
+    def get_changes(self, param: QcParamType) -> np.ndarray:
+        return self.changes[self.parameters.index(param)]
+
+    def get_values(self, param: QcParamType) -> np.ndarray:
+        """
+        Array with the value of a swept parameter at each step (applied or not).
+        """
+        k = self.parameters.index(param)
+        return np.asarray(self.values[k])[self.indices[k]]
+
+    def get_order(self) -> np.ndarray:
+        """
+        Canonical index of the point measured at each step (see traversal.get_traversal_order).
+        """
+        return np.arange(len(self), dtype=np.intp) if self.order is None else self.order
+
+    def get_travel(self) -> float:
+        """
+        Total applied travel of the plan: sum over the parameters of the absolute differences between consecutive
+        applied values, normalized by the range of values of each parameter (see traversal.get_normalized_travel).
+        """
+        values = [self.get_values(p) for p in self.parameters]
+        changes = list(self.changes)
+        return get_normalized_travel(values, changes, self.values)
+
+    def __len__(self):
+        return self.indices.shape[1]
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            order = self.get_order()[item]
+            return SweepPlan(self.parameters, self.values, self.indices[:, item], self.changes[:, item], order=order)
+        return self.get_instruction(item)
+
+    def __iter__(self) -> Iterator[Dict[QcParamType, Any]]:
+        for start in range(0, len(self), self.chunk_size):
+            stop = min(start + self.chunk_size, len(self))
+            columns = [
+                [param, self.values[k], self.indices[k, start:stop].tolist(), self.changes[k, start:stop].tolist()]
+                for k, param in enumerate(self.parameters)
+            ]
+            for i in range(stop - start):
+                d = {}
+                for param, values, indices, changes in columns:
+                    if changes[i]:
+                        d[param] = values[indices[i]]
+                yield d
+
+    def __repr__(self):
+        names = [p.name for p in self.parameters]
+        return f'SweepPlan - steps: {len(self)} - parameters: {names}'
 
 
 class SequentialCallable(object):
@@ -242,49 +474,222 @@ class SequentialCallable(object):
         self.funcs = []
 
 
-class Timer(object):
-    def __init__(self):
-        self.t_start = 0
-        self.t_elapsed = 0
-        self._values = []
-
-    @property
-    def last_value(self):
-        return self.values[-1]
-
-    @property
-    def values(self):
-        return self._values
-
-    @property
-    def mean(self):
-        return np.mean(self.values)
-
-    @property
-    def sum(self):
-        return np.sum(self.values)
+class Timer(StreamingStats):
+    def __init__(self, reservoir_size: int = 1000, ewma_alpha: float = 0.1):
+        """
+        Stopwatch with streaming statistics of the elapsed laps (see stats.StreamingStats): count, sum, mean, std,
+        min, max, ewma and percentiles from a fixed-size reservoir of sampled laps. The laps are not kept in memory.
+        """
+        super().__init__(reservoir_size=reservoir_size, ewma_alpha=ewma_alpha)
 
     def start(self):
         self.t_start = time.time()
 
     def elapse(self):
         self.t_elapsed = time.time()
-        self._values.append(self.t_elapsed - self.t_start)
+        self.add(self.t_elapsed - self.t_start)
 
     def reset(self):
+        super().reset()
         self.t_start = 0
         self.t_elapsed = 0
-        self._values = []
 
     # Few aliases
     stop = elapse
     lap = elapse
     clear = reset
-    total = sum
+
+
+class WriteBuffer(object):
+    def __init__(self, datasaver, size: int = 1, interval: float = None, paramtypes: Dict[str, str] = None):
+        """
+        Buffer of results between the sweep loop and a qcodes datasaver.
+        Rows added with .add_result are kept in memory and written with .flush when the buffer contains `size` rows
+        or when `interval` seconds have passed since the last flush (if it is not None).
+        Parameters with 'numeric' paramtype are written with a single datasaver.add_result call where the buffered
+        values are concatenated (qcodes unrolls them into rows in the same order). Other parameters are written
+        row by row.
+        size: number of rows to buffer. If size <= 1 and interval is None, the rows are written directly.
+        interval: maximum time in seconds between flushes.
+        paramtypes: dictionary {parameter full name: qcodes paramtype}. Ex: {k: v.type for k, v in meas.parameters}
+        """
+        self.datasaver = datasaver
+        self.size = max(int(size), 1)
+        self.interval = interval
+        self.paramtypes = paramtypes if paramtypes is not None else {}
+        self._rows = []
+        self._t_last_flush = time.time()
+
+    @property
+    def buffered(self) -> bool:
+        return self.size > 1 or self.interval is not None
+
+    def add_result(self, *res_tuple):
+        """
+        Same arguments as datasaver.add_result: (param, value), (param, value), ...
+        """
+        if not self.buffered:
+            self.datasaver.add_result(*res_tuple)
+            return
+        self._rows.append(res_tuple)
+        full = len(self._rows) >= self.size
+        expired = self.interval is not None and time.time() - self._t_last_flush >= self.interval
+        if full or expired:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all the buffered rows to the datasaver.
+        """
+        rows, self._rows = self._rows, []
+        self._t_last_flush = time.time()
+        if len(rows) == 0:
+            return
+        columns = {}
+        for row in rows:
+            for param, value in row:
+                columns.setdefault(param, []).append(value)
+        bulk = []
+        for param, values in columns.items():
+            if len(values) == len(rows) and self._get_paramtype(param) == 'numeric':
+                bulk.append((param, np.concatenate([np.ravel(v) for v in values])))
+        bulk_params = [p for p, _ in bulk]
+        if len(bulk) > 0:
+            self.datasaver.add_result(*bulk)
+        if len(bulk) < len(columns):
+            for row in rows:
+                row = [(p, v) for p, v in row if p not in bulk_params]
+                if len(row) > 0:
+                    self.datasaver.add_result(*row)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _get_paramtype(self, param):
+        name = param.full_name if hasattr(param, 'full_name') else str(param)
+        return self.paramtypes.get(name, None)
+
+
+class PipelineWorker(object):
+    def __init__(self, func: Callable, iterable: Iterable, maxsize: int = 100, name: str = 'PipelineWorker'):
+        """
+        Thread executing func(*args) for each args of iterable and putting the outputs in a bounded queue.
+        The outputs are consumed in the same order by iterating over the worker in another thread.
+        maxsize: maximum number of outputs waiting to be consumed. The thread waits while the queue is full
+            (back-pressure).
+        If func raises an exception, the thread stops and the exception is raised again when the consumer reaches
+        that point of the iteration.
+
+        Example:
+            worker = PipelineWorker(lambda i: i ** 2, [[1], [2], [3]], maxsize=2)
+            worker.start()
+            for output in worker:
+                print(output)  # 1, 4, 9
+        """
+        self.func = func
+        self.iterable = iterable
+        self.name = name
+        self.error = None
+        self._queue = queue.Queue(maxsize=max(int(maxsize), 1))
+        self._stop_event = threading.Event()
+        self._end_item = object()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> List:
+        """
+        Stop the thread after the current func call and return the outputs that were not consumed yet.
+        """
+        self._stop_event.set()
+        self._thread.join()
+        outputs = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not self._end_item:
+                outputs.append(item)
+        return outputs
+
+    def __iter__(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is self._end_item:
+                break
+            yield item
+        self._thread.join()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _run(self):
+        try:
+            for args in self.iterable:
+                if self._stop_event.is_set():
+                    break
+                self._put(self.func(*args))
+        except BaseException as e:
+            self.error = e
+        finally:
+            self._put(self._end_item)
+
+    def _put(self, item):
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+
+class CallbackThrottle(object):
+    def __init__(self, every: int = 1, interval: float = None, total_pts: int = None):
+        """
+        Rate limit of the callbacks of a sweep.
+        every: execute the callbacks every `every` steps. If it is None, only interval is used.
+        interval: execute the callbacks if `interval` seconds have passed since the last execution.
+        total_pts: number of steps of the sweep. The last step is always executed.
+        The step which was not executed is kept (.hold) and executed at the end of the sweep (.flush).
+        """
+        self.every = every
+        self.interval = interval
+        self.total_pts = total_pts
+        self._last_index = -1
+        self._t_last = time.perf_counter()
+        self._pending = None
+
+    def ready(self, index: int) -> bool:
+        """ Check if the callbacks have to be executed at a given step """
+        ready = index == self.total_pts - 1 if self.total_pts is not None else False
+        ready = ready or (self.every is not None and index - self._last_index >= self.every)
+        ready = ready or (self.interval is not None and time.perf_counter() - self._t_last >= self.interval)
+        if ready:
+            self._last_index = index
+            self._t_last = time.perf_counter()
+            self._pending = None
+        return ready
+
+    def hold(self, *step):
+        self._pending = step
+
+    def flush(self) -> Union[Tuple, None]:
+        """ Step which was not executed yet (or None) """
+        step, self._pending = self._pending, None
+        return step
 
 
 class Sweeper(object):
-    _timers = {key: Timer() for key in ['total', 'loop', 'apply', 'readout', 'save']}
+    _timers = {key: Timer() for key in ['total', 'loop', 'apply', 'readout', 'save', 'ramp']}
 
     def __init__(self, name='Sweep'):
         """
@@ -295,12 +700,21 @@ class Sweeper(object):
                 Ex: .sweep_linear(V1, 0, 1, dim=1)
             - sweep shape: points for each dimension.
                 Ex: .set_sweep_shape([2,3,4])  # 2, 3 and 4 pts for dim 1, 2 and 3 (respectively)
+            - order in which the points are measured (default: raster).
+                Ex: .set_sweep_order('snake')  # see docstring of .set_sweep_order
+            - adaptive refinement of the sweep grid.
+                Ex: .set_adaptive(I_dot, max_points=1000)  # see docstring of .set_adaptive
             - custom method to apply a swept value (default: param(value).
                 Ex: .set_apply_method(f) where f takes a dictionary as argument.
                 See docstring of .set_apply_method
             - custom method to readout (default: param())
                 Ex: .set_readout_method(f) where f takes a list of qcodes parameters.
                 See docstring of .set_readout_method
+                Ex: .set_readout_method(sw.concurrent_readout) to readout different instruments in parallel
+            - apply different instruments in parallel
+                Ex: .set_apply_method(sw.concurrent_apply)
+            - hardware-timed dim 1 with the fast sequence of a NEEL_DAC and NI DAQs
+                Ex: .set_fast_axis(dac.sequencer, [daq], point_time=1)  # see docstring of .set_fast_axis
             - pre-/post- processes which are executed before/after the sweep.
                 Ex: .set_pre_process(*f) or .add_pre_process(f, args, kwargs)
             - pre-/post- readout which are executed before/after the readout at each sweep loop.
@@ -319,6 +733,18 @@ class Sweeper(object):
                 Ex: .set_tracked_parameters(*qcodes_param)
             - add a note that will be saved in the database
                 Ex: .set_note('Loading map for 1e-')
+            - buffer the results of several sweep steps before writing them to the database
+                Ex: .set_write_buffer(size=100, interval=1)
+            - record the latency of every set/get of the swept and readout parameters
+                Ex: .set_profiling(True)  # see docstring of .set_profiling
+            - rules evaluated on the results of each step to abort the sweep or skip points
+                Ex: .add_rule((I_dc, '>', 10e-9), 'abort')  # see docstring of .add_rule
+            - reduction of array readouts before saving them (mean, decimate, boxcar, envelope, histogram)
+                Ex: .set_reduction(daq.ai0.trace, 'boxcar', width=10, raw=True)  # see docstring of .set_reduction
+            - rate of the callbacks and progress bar, or no progress bar for batch runs
+                Ex: .set_callback_rate(every=100, interval=0.5) and .set_progress_bar(None)
+            - maximum slew of a parameter, ramped in steps for large changes (start_at, restart of outer dims, ...)
+                Ex: .set_ramp(V1, max_step=0.01, step_delay=0.005)  # see docstring of .set_ramp
             - custom callback function at each step (TODO)
 
         This class will handle:
@@ -407,7 +833,42 @@ class Sweeper(object):
         self.measurement = Measurement(name=self.name)
         self.last_sweep_info = {}
         self.show_progress_bar = True
+        self.progress_bar_mode = 'notebook'
+        self.callback_every = 1
+        self.callback_interval = None  # s
+        self._callback_payload = None
         self.test_run = False
+        self.write_buffer_size = 1
+        self.write_buffer_time = None  # s
+        self.pipeline = False
+        self.pipeline_queue_size = 100
+        self._group_executor = GroupExecutor()
+        self._group_timers = {}  # {'readout[instrument]': Timer}
+        self._readout_groups = ((), {})  # cache of (readouts, groups) for .concurrent_readout
+        self.apply_settle = False
+        self.sweep_order = 'raster'
+        self.sweep_order_dims = None
+        self._travel = {}  # travel of the last sweep for the time report
+        self._saved_steps = 0
+        self._saved_order_steps = 0
+        self._checkpoint = None
+        self.checkpoint_interval = 10  # s
+        self.adaptive = None  # kwargs for AdaptivePlan (see .set_adaptive)
+        self.fast_axis = None  # HardwareFastAxis (see .set_fast_axis)
+        self.profile = False
+        self.profile_trace = True
+        self.profile_max_events = 100000
+        self.profiler = None  # ParameterProfiler of the last sweep
+        self.rules = []  # list of SweepRule (see .add_rule)
+        self._monitor = None  # RuleMonitor of the last sweep
+        self.reductions = {}  # {readout: Reduction} (see .set_reduction)
+        self.raw_readouts = []  # reduced readouts whose raw values are saved in a side file
+        self.raw_folder = None  # folder of the raw side files (default: 'raw' next to the database)
+        self.raw_file = None  # raw side file of the last sweep
+        self._raw_writer = None
+        self.ramps = {}  # {param: RampPolicy} (see .set_ramp)
+        self._ramp_policies = {}  # ramp policies of the running sweep
+        self._armed_fast_axis = None  # fast axis programmed for the running sweep
 
     """ Execution """
 
@@ -430,7 +891,14 @@ class Sweeper(object):
                    pre_readout_wait: Union[int, float] = None,
                    post_readout_wait: Union[int, float] = None,
                    note: str = '',
-                   show_progress_bar: bool = True,
+                   show_progress_bar: bool = None,
+                   write_buffer_size: int = None,
+                   write_buffer_time: Union[int, float] = None,
+                   pipeline: bool = None,
+                   pipeline_queue_size: int = None,
+                   apply_settle: Union[bool, int, float] = None,
+                   sweep_order: Union[str, Iterable[int]] = None,
+                   checkpoint_interval: Union[int, float] = None,
                    ):
         """
         Save the configuration for .execute
@@ -499,7 +967,38 @@ class Sweeper(object):
             note:
                 Custom notes to add for the sweep.
             show_progress_bar:
-                Show a simple jupyter notebook progress bar. Default is True.
+                Show a simple jupyter notebook progress bar (see .set_progress_bar). It is True for a new sweeper
+                and after .reset.
+                If it is None (default), the previous value is kept, like the other options of set_config, so
+                .execute(**kwargs) doesn't enable again a progress bar disabled by .set_progress_bar(None).
+                Note: set_config used to reset it to True when show_progress_bar was not given. Pass
+                show_progress_bar=True explicitly to get that behaviour.
+            write_buffer_size:
+                Number of sweep steps whose results are kept in memory before being written together to the
+                datasaver. Default is 1 (each step is written directly).
+                The buffer is always written before leaving the sweep, even after an error or a KeyboardInterrupt.
+            write_buffer_time:
+                Maximum time in seconds between writes of the buffer. If it is None, only write_buffer_size is used.
+            pipeline:
+                If it is True, apply and readout are executed in an acquisition thread while saving and callbacks
+                are executed in the calling thread (which owns the qcodes database connection). The next sweep step
+                starts while the results of the previous one are being saved. Results are saved in order, errors
+                in the acquisition thread stop the sweep and the steps already measured are saved if it is
+                interrupted. Default is False.
+                Note: the values returned by the readout method must not be modified afterwards.
+            pipeline_queue_size:
+                Maximum number of steps waiting to be saved in pipeline mode. The sweep waits if it is full.
+                Default is 100.
+            apply_settle:
+                Waiting time after applying the parameters with .concurrent_apply.
+                - False: each parameter waits for its own post_delay (default)
+                - True: wait once for the largest post_delay after all the parameters have been applied
+                - number: wait this number of seconds after all the parameters have been applied
+            sweep_order:
+                Order in which the points of the sweep are measured (see .set_sweep_order). Default is 'raster'.
+            checkpoint_interval:
+                Minimum time in seconds between checkpoints of the sweep progress, which are saved in the metadata of
+                the dataset to continue an interrupted sweep with .resume. Default is 10.
 
         """
         if sweep_shape is not None: self.set_sweep_shape(sweep_shape)
@@ -521,7 +1020,17 @@ class Sweeper(object):
         if pre_readout_wait is not None: self.pre_readout_wait = pre_readout_wait
         if post_readout_wait is not None: self.post_readout_wait = post_readout_wait
         if note is not None: self.set_note(note)
-        self.show_progress_bar = show_progress_bar
+        if show_progress_bar is not None: self.show_progress_bar = show_progress_bar
+        if write_buffer_size is not None: self.set_write_buffer(write_buffer_size, self.write_buffer_time)
+        if write_buffer_time is not None: self.set_write_buffer(self.write_buffer_size, write_buffer_time)
+        if pipeline is not None: self.set_pipeline(pipeline, self.pipeline_queue_size)
+        if pipeline_queue_size is not None: self.set_pipeline(self.pipeline, pipeline_queue_size)
+        if apply_settle is not None: self.apply_settle = apply_settle
+        if sweep_order is not None: self.set_sweep_order(sweep_order, self.sweep_order_dims)
+        if checkpoint_interval is not None:
+            if checkpoint_interval < 0:
+                raise ValueError('checkpoint_interval must be >= 0')
+            self.checkpoint_interval = checkpoint_interval
 
     def execute(self, test_run=False, **kwargs) -> int:
         """
@@ -539,6 +1048,8 @@ class Sweeper(object):
         5. Apply post_process + wait
         7. Go to return_to
         8. Save final static {param: value}
+        In pipeline mode (see .set_pipeline), save (4.3) and callback (4.5) are executed in the calling thread
+        while the next steps are applied and readout in an acquisition thread.
 
         kwargs:
             test_run: if it is True, it will execute the sweep without changing any parameter nor readout.
@@ -548,6 +1059,61 @@ class Sweeper(object):
             datasaver.run_id
         """
         self.set_config(**kwargs)
+        if self.adaptive is not None and not test_run:
+            if self.fast_axis is not None:
+                raise ValueError('Adaptive sweeps cannot be executed with a hardware fast axis')
+            if self.pipeline:
+                raise ValueError('Adaptive sweeps cannot be executed in pipeline mode')
+            if any(rule.action == 'skip' for rule in self.rules):
+                raise ValueError('Adaptive sweeps cannot be executed with skip rules')
+            plan = self.get_adaptive_plan()
+        else:
+            plan = self.get_sweep_plan()
+        return self._execute(plan, test_run=test_run)
+
+    def resume(self, run_id: int, replay_start_at: bool = True, replay_pre_process: bool = True, **kwargs) -> int:
+        """
+        Continue an interrupted sweep (ex: instrument timeout, KeyboardInterrupt or dead python kernel) from the
+        first step which was not saved.
+        The sweeper must have the same sweep instructions, shape, order and readouts as the interrupted sweep,
+        which are verified with the checkpoint saved in the metadata of its dataset (see .get_checkpoint_config).
+        The rest of steps are saved in a new dataset linked to the interrupted one (qcodes datasets cannot be
+        extended once completed). SweeperContent of the new dataset loads the data of all the linked datasets.
+        The first step applies all the swept parameters, regardless of the last applied values.
+
+        run_id: run id of the interrupted sweep (or of a previous resume)
+        replay_start_at: go to start_at before continuing
+        replay_pre_process: execute the pre_process before continuing
+        kwargs: same as .set_config
+
+        Returns:
+            run_id of the new dataset
+        """
+        self.set_config(**kwargs)
+        ds = load_by_id(run_id)
+        checkpoint = load_checkpoint(ds)
+        if checkpoint.get('adaptive', False):
+            raise ValueError('Adaptive sweeps cannot be resumed')
+        self._validate_checkpoint_config(checkpoint)
+        start_index = int(checkpoint.get('start_index', 0)) + get_completed_steps(ds, checkpoint)
+        plan = self.get_sweep_plan()
+        if start_index >= len(plan):
+            raise ValueError(f'The sweep of run {run_id} is already completed')
+        plan = plan[start_index:]
+        plan.changes = plan.changes.copy()
+        sweep_parameters, _ = self.get_stepped_sweep()
+        plan.changes[:, 0] = [sparam.apply for sparam in sweep_parameters]
+        return self._execute(plan, replay_start_at=replay_start_at, replay_pre_process=replay_pre_process,
+                             start_index=start_index, resumed_from=run_id)
+
+    def _execute(self, plan: Union[SweepPlan, AdaptivePlan], **kwargs) -> int:
+        self.profiler = self._create_profiler() if self.profile else None
+        with self.profiler if self.profiler is not None else contextlib.nullcontext():
+            return self._execute_sweep(plan, **kwargs)
+
+    def _execute_sweep(self, plan: Union[SweepPlan, AdaptivePlan], test_run: bool = False,
+                       replay_start_at: bool = True, replay_pre_process: bool = True, start_index: int = 0,
+                       resumed_from: int = None) -> int:
         self._validate_sweep_values()
         self._register_sweep_params_in_meas()
         self._register_readout_params_in_meas()
@@ -555,13 +1121,16 @@ class Sweeper(object):
         self._register_static_config_params('init')
         self._register_static_config_params('final')
 
-        total_pts = self.get_total_sweep_points()
+        total_pts = len(plan)
         if test_run:
             start_at, return_to, readouts = {}, {}, []
             ordered_instrs = [{}] * total_pts
         else:
             start_at, return_to, readouts = self.start_at, self.return_to, self.readouts
-            ordered_instrs = self.get_ordered_instructions()
+            ordered_instrs = plan
+        start_at = start_at if replay_start_at else {}
+        config = self.get_checkpoint_config()
+        config.update({'start_index': int(start_index), 'resumed_from': resumed_from})
 
         # Reset timers
         timers = self._timers
@@ -570,63 +1139,63 @@ class Sweeper(object):
         # Start timer for total execution time
         timers['total'].start()
 
-        # Go to start_at config and apply pre_process
-        self.apply_method(start_at)
-        self.apply_pre_process()
-
-        bar = ProgressBar(self.get_total_sweep_points())
-
-        with self.measurement.run() as datasaver:
-            # save sweep information
-            self._save_sweep_info(datasaver)
-            self._save_static_info(datasaver)
-
-            # save static config before looping
-            self._save_current_static_config(datasaver, label='init')
-
-            for i, instr in enumerate(ordered_instrs):
-                timers['loop'].start()
-
-                # Apply parameter values in order
-                timers['apply'].start()
-                self.apply_method(instr)
-                timers['apply'].elapse()
-
-                # Perform readout
-                self.apply_pre_readout()
-                timers['readout'].start()
-                results = self.readout_method(readouts)
-                timers['readout'].elapse()
-
-                # Save readout info (only for the first time)
-                if i == 0:
-                    [self._save_readout_info(datasaver, p, dim0_pts=np.array(v).size) for p, v in results.items()]
-                data = [tuple([p, v]) for p, v in results.items()]
-
-                # Save data to qcodes database
-                timers['save'].start()
-                datasaver.add_result(*data)
-                timers['save'].elapse()
-
-                self.apply_post_readout()
-                timers['loop'].elapse()
-                timers['total'].elapse()
-
-                timings = {
-                    'loop_mean': timers['loop'].mean,
-                    'loop_i': timers['loop'].last_value,
-                    'execution': timers['total'].last_value,
-                    'expected_end': timers['loop'].mean * total_pts,
-                }
-                info = self._generate_callback_dict(i, results, timings)
-                if self.show_progress_bar: bar(info)
-                self.callback(info)
-
-            # End of loop. Post process and go to return_to
-            self.apply_post_process()
-            self.apply_method(return_to)
-            self._save_current_static_config(datasaver, label='final')
-        timers['total'].elapse()
+        try:
+            # Go to start_at config and apply pre_process
+            self._ramp_policies = self._get_ramp_policies() if not test_run else {}
+            self._ramp(start_at)
+            self.apply_method(start_at)
+            if replay_pre_process:
+                self.apply_pre_process()
+
+            # Program the hardware fast axis once the DC values are set
+            if self.fast_axis is not None and not test_run:
+                self._program_fast_axis()
+
+            self._monitor = self._create_monitor(plan) if len(self.rules) > 0 and not test_run else None
+            [reduction.reset() for reduction in self.reductions.values()]
+            bar = ProgressBar(total_pts, mode=self.progress_bar_mode) if self.show_progress_bar else None
+            self._callback_payload = self.get_callback_dict_template()
+
+            with self.measurement.run() as datasaver:
+                # save sweep information
+                self._save_sweep_info(datasaver)
+                self._save_static_info(datasaver)
+
+                # save static config before looping
+                self._save_current_static_config(datasaver, label='init')
+
+                writer = self._create_write_buffer(datasaver)
+                self._open_raw_file(datasaver, test_run)
+                self._saved_steps = 0
+                self._saved_order_steps = 0
+                self._save_sweep_order(datasaver, plan)
+                self._checkpoint = Checkpoint(datasaver, config, interval=self.checkpoint_interval,
+                                              on_save=lambda steps: self._write_pending(datasaver, writer, plan))
+                self._checkpoint.save(0)
+                finished = False
+                try:
+                    self._run_loop(datasaver, writer, bar, ordered_instrs, readouts, total_pts)
+                    finished = True
+                finally:
+                    # Write buffered results even if the loop is interrupted
+                    self._checkpoint.save(self._saved_steps, status=self._get_end_status(finished))
+                    self._checkpoint = None
+                    self._armed_fast_axis = None
+                    self._travel = self._get_travel(plan)
+                    self._save_rule_events(datasaver)
+                    self._close_raw_file()
+                    if not finished: self._save_profile(datasaver)
+
+                # End of loop. Post process and go to return_to
+                self.apply_post_process()
+                self._ramp(return_to)
+                self.apply_method(return_to)
+                self._save_current_static_config(datasaver, label='final')
+                self._save_profile(datasaver)
+            timers['total'].elapse()
+        finally:
+            # Stop the threads of the parallel apply/readout even if the sweep is interrupted
+            self._group_executor.shutdown()
 
         return datasaver.run_id
 
@@ -648,6 +1217,27 @@ class Sweeper(object):
         self.measurement = Measurement(name=self.name)
         self.last_sweep_info = {}
         self.show_progress_bar = True
+        self.progress_bar_mode = 'notebook'
+        self.callback_every = 1
+        self.callback_interval = None
+        self.write_buffer_size = 1
+        self.write_buffer_time = None
+        self.pipeline = False
+        self.pipeline_queue_size = 100
+        self.apply_settle = False
+        self.sweep_order = 'raster'
+        self.sweep_order_dims = None
+        self.adaptive = None
+        self.fast_axis = None
+        self.profile = False
+        self.profile_trace = True
+        self.profile_max_events = 100000
+        self.rules = []
+        self.reductions = {}
+        self.raw_readouts = []
+        self.raw_folder = None
+        self.ramps = {}
+        self.checkpoint_interval = 10
 
     clear_all = reset  # alias for reset
 
@@ -676,6 +1266,7 @@ class Sweeper(object):
         """
         Clear only callback methods
         """
+        self._callback_methods = []
 
     """ Config methods """
 
@@ -698,6 +1289,40 @@ class Sweeper(object):
         d = {param: param() for param in qc_params}
         return d
 
+    def concurrent_apply(self, instr: Dict[QcParamType, Any]):
+        """
+        Apply method where the parameters are grouped by root instrument and the groups are applied in parallel
+        threads. The parameters of the same instrument are applied one after another, in the order of the
+        instructions (i.e. the order in which they were added to the sweep).
+        The waiting time after applying depends on .apply_settle (see .set_config).
+        The time of each group is saved in the time report as 'apply[instrument name]'.
+        Usage:
+            sw.set_apply_method(sw.concurrent_apply)
+        """
+        durations = self._group_executor.set_parameters(instr.items(), settle=self.apply_settle)
+        for instrument, duration in durations.items():
+            self._get_group_timer('apply', instrument).add(duration)
+
+    def concurrent_readout(self, qc_params: List[QcParamType]) -> Dict[QcParamType, Any]:
+        """
+        Readout method where the parameters are grouped by root instrument and the groups are readout in parallel
+        threads. The parameters of the same instrument are readout one after another, in the given order.
+        The time of each group is saved in the time report as 'readout[instrument name]'.
+        Parameters without instrument are readout together in the same group.
+        Usage:
+            sw.set_readout_method(sw.concurrent_readout)
+        """
+        cached_params, groups = self._readout_groups
+        if cached_params != tuple(qc_params):
+            groups = group_by_instrument(qc_params)
+            self._readout_groups = (tuple(qc_params), groups)
+        outputs, durations = self._group_executor.map(self.default_readout, groups)
+        for instrument, duration in durations.items():
+            self._get_group_timer('readout', instrument).add(duration)
+        values = {}
+        [values.update(output) for output in outputs.values()]
+        return {param: values[param] for param in qc_params}
+
     def set_apply_method(self, f: Callable[[Dict[QcParamType, Any]], None]):
         """
         Custom apply method to set qcodes parameter values.
@@ -914,15 +1539,271 @@ class Sweeper(object):
 
     def get_tracked_config(self) -> Dict[QcParamType, Any]:
         """
-        Get all tracked parameters' value.
+        Get all tracked parameters' value. The parameters of instruments with a bulk read (ex: NEEL_DAC) are read
+        with a single call per instrument (see parallel.snapshot_parameters).
         Returns:
             dictionary {qcodes_param: value}
         """
-        tparams = self.get_tracked_parameters()
-        config = {}
-        for param in tparams:
-            config[param] = param()
-        return config
+        return snapshot_parameters(self.get_tracked_parameters())
+
+    def set_write_buffer(self, size: int = 1, interval: Union[int, float] = None):
+        """
+        Set the number of sweep steps (size) and/or the time in seconds (interval) that the results are kept in memory
+        before writing them together to the datasaver. size=1 and interval=None writes each step directly.
+        """
+        size = int(size)
+        if size < 1:
+            raise ValueError('Write buffer size must be >= 1')
+        if interval is not None and interval < 0:
+            raise ValueError('Write buffer interval should be >= 0')
+        self.write_buffer_size = size
+        self.write_buffer_time = interval
+
+    def set_pipeline(self, enable: bool = True, queue_size: int = 100):
+        """
+        Enable/disable the execution of apply and readout in an acquisition thread, separated from saving and
+        callbacks (see .set_config).
+        queue_size: maximum number of steps waiting to be saved.
+        """
+        queue_size = int(queue_size)
+        if queue_size < 1:
+            raise ValueError('Pipeline queue size must be >= 1')
+        self.pipeline = bool(enable)
+        self.pipeline_queue_size = queue_size
+
+    def set_callback_rate(self, every: int = 1, interval: Union[int, float] = None):
+        """
+        Rate limit of the callbacks and the progress bar.
+        every: execute them every `every` steps. If it is None, only interval is used.
+        interval: execute them if `interval` seconds have passed since the last execution.
+        The callbacks receive the payload of the last step (the intermediate results are not passed). They are
+        always executed for the last measured step, even if the sweep is aborted by a rule.
+        The payload (see .get_callback_dict_template) is the same dictionary at each step: copy it to keep it.
+        Example:
+            sw.set_callback_rate(every=100, interval=0.5)  # live plot at most every 100 steps or 0.5 s
+        """
+        if every is not None and int(every) < 1:
+            raise ValueError('every must be >= 1')
+        if interval is not None and interval < 0:
+            raise ValueError('interval must be >= 0')
+        if every is None and interval is None:
+            raise ValueError('every or interval must be defined')
+        self.callback_every = None if every is None else int(every)
+        self.callback_interval = interval
+
+    def set_progress_bar(self, mode: Union[str, None] = 'notebook'):
+        """
+        mode:
+            'notebook': jupyter progress bar (tqdm.notebook)
+            'console': text progress bar (tqdm)
+            None: no progress bar. Without callbacks, the sweep loop doesn't prepare any callback payload.
+        """
+        if mode not in ['notebook', 'console', None]:
+            raise ValueError(f"Unknown progress bar mode ({mode}). Valid modes: ['notebook', 'console', None]")
+        self.show_progress_bar = mode is not None
+        if mode is not None:
+            self.progress_bar_mode = mode
+
+    def set_sweep_order(self, order: Union[str, Iterable[int]] = 'raster', dims: Iterable[int] = None):
+        """
+        Set the order in which the points of the sweep are measured. The data is always saved together with the
+        order, so SweeperContent rebuilds the canonical grid (dim 1 first) for any order.
+        order:
+            'raster': dim 1 always goes from the first to the last value (default)
+            'snake': the swept direction of dim 1 (or of the given dims) is reversed each time that a higher dim
+                changes, which avoids the jump back to the first value of the inner dims.
+            'hilbert', 'zorder': space-filling curves over the dims 1 and 2 (higher dims are raster)
+            array: custom permutation of the canonical indices, i.e. the linear indices of the points in the sweep
+                grid with dim 1 changing first.
+        dims: only for 'snake'. List of dims to reverse. If it is None, all the dims except the last one.
+        Example:
+            sw.set_sweep_shape([3, 2])
+            sw.set_sweep_order('snake')  # points measured in the order (0,0), (1,0), (2,0), (2,1), (1,1), (0,1)
+        The reduction of the applied travel is shown in .show_time_report.
+        """
+        if not isinstance(order, str):
+            order = np.asarray(order, dtype=np.intp)
+        if len(self.sweep_shape) > 0:
+            get_traversal_order(self.sweep_shape, order, dims)  # validation
+        self.sweep_order = order
+        self.sweep_order_dims = None if dims is None else [int(dim) for dim in dims]
+
+    def set_adaptive(self, readout: Union[QcParamType, Callable[[Dict], Any]] = None,
+                     loss: Union[str, Callable[[np.ndarray, np.ndarray], float]] = 'gradient',
+                     initial_step: Union[int, Iterable[int]] = 4, max_points: int = None, max_time: float = None,
+                     enable: bool = True):
+        """
+        Adaptive refinement: the sweep grid (defined by the sweep instructions and the sweep shape) is the finest
+        grid that can be measured. It starts with a coarse grid and then measures new points where the loss is the
+        largest, until all the grid is measured, max_points are measured or max_time has passed.
+        readout: qcodes parameter to evaluate the loss or function f(results) of the readout results of a step
+            ({readout: value}). If it is None, the first readout.
+        loss: 'gradient' (variation x size of a cell), 'curvature' (deviation from a plane) or custom function
+            f(values, points) where values are the readout values at the corners of a cell and points their grid
+            indices (see adaptive.gradient_loss).
+        initial_step: step (in points) of the initial coarse grid for all the dims or for each dim.
+        max_points: maximum number of measured points (including the coarse grid).
+        max_time: maximum time in seconds.
+        enable: set it to False to disable the adaptive mode.
+        The measured points are saved with their grid index, so SweeperContent places them in the sweep grid with
+        nan for the points which were not measured (see SweeperContent.regrid to fill them).
+        Example:
+            sw.sweep_linear(V1, 0, 1, dim=1)
+            sw.sweep_linear(V2, 0, 1, dim=2)
+            sw.set_sweep_shape([201, 201])
+            sw.set_adaptive(I_dot, loss='gradient', initial_step=10, max_points=5000)
+            run_id = sw.execute()
+        """
+        if not enable:
+            self.adaptive = None
+            return
+        if max_points is not None and int(max_points) < 1:
+            raise ValueError('max_points must be >= 1')
+        if max_time is not None and max_time <= 0:
+            raise ValueError('max_time must be > 0')
+        AdaptivePlan._get_loss_function(loss)  # validation
+        self.adaptive = {
+            'readout': readout,
+            'loss': loss,
+            'initial_step': initial_step,
+            'max_points': max_points,
+            'max_time': max_time,
+        }
+
+    def set_fast_axis(self, sequencer=None, daqs: Iterable[Any] = None, point_time: float = 1,
+                      trigger: Iterable[int] = (1, 0, 0, 0, 0), enable: bool = True):
+        """
+        Hardware-timed dim 1: the parameters of dim 1 are not applied by the sweeper, but compiled once into the fast
+        sequence of a NEEL_DAC, which moves them through all their values and sends a trigger at each point. At each
+        step of the outer dims (dim >= 2), the sequence is executed and the NI DAQs acquire one value per trigger.
+        sequencer: NEEL_DAC_Sequencer (ex: dac.sequencer). The parameters of dim 1 must be channels of its NEEL_DAC.
+        daqs: list of NI DAQ instruments (NI6343, NI6216), which are set to 'ramp' trigger mode.
+        point_time: time in ms of each point of dim 1
+        trigger: state of the trigger ports of the NEEL_DAC at each point
+        enable: set it to False to go back to the software sweep of dim 1.
+        The readouts must be the traces of the DAQ channels (ex: daq.ai0.trace). Each outer step saves one array row
+        of dim 1 points (see sweep_readouts_dim0s), so SweeperContent returns datasets with the same shape as a
+        software sweep, with dim 1 as the first axis.
+        Example:
+            sw.sweep_linear(V1, 0, 1, dim=1)
+            sw.sweep_linear(V2, 0, 1, dim=2)
+            sw.set_sweep_shape([500, 100])
+            sw.set_readouts(daq.ai0.trace, daq.ai1.trace)
+            sw.set_fast_axis(dac.sequencer, [daq], point_time=0.5)
+            run_id = sw.execute()  # 100 steps of 500 points
+        """
+        if not enable:
+            self.fast_axis = None
+            return
+        if sequencer is None or daqs is None:
+            raise ValueError('A sequencer and a list of DAQs are needed for the hardware fast axis')
+        self.fast_axis = HardwareFastAxis(sequencer, daqs, point_time=point_time, trigger=trigger)
+
+    def set_profiling(self, enable: bool = True, trace: bool = True, max_events: int = 100000):
+        """
+        Record the latency of every set and get of the swept, readout, start_at and return_to parameters during the
+        sweep (see profiler.ParameterProfiler). It works with any apply/readout method, including parallel ones.
+        The latency statistics of each parameter are saved in the metadata of the dataset (tag 'sweep_latency') and,
+        if trace is True, the timeline of the last max_events calls in the Chrome trace format is saved in a json
+        side file in the raw folder (see .set_raw_folder) with its path in the metadata (tag 'sweep_trace').
+        After the sweep, the profiler is available in .profiler.
+        Example:
+            sw.set_profiling(True)
+            run_id = sw.execute()
+            sw.show_latency_report()
+            sw.profiler.export_chrome_trace('sweep.json')  # open in chrome://tracing or https://ui.perfetto.dev
+            load_latency_report(load_by_id(run_id))  # from qube.measurement.profiler
+        """
+        max_events = int(max_events)
+        if max_events < 0:
+            raise ValueError('max_events must be >= 0')
+        self.profile = bool(enable)
+        self.profile_trace = bool(trace)
+        self.profile_max_events = max_events
+
+    def add_rule(self, condition: Union[Callable[[Dict], bool], Tuple[Any, str, Any]], action: str = 'abort',
+                 dim: int = 1, consecutive: int = 1) -> SweepRule:
+        """
+        Add a rule evaluated on the results of each step (see rules.SweepRule).
+        condition: function f(results) -> bool with results = {readout: value}, or (readout, operator, threshold)
+        action:
+            'abort': stop the sweep. post_process, return_to and the final static config are executed as usual.
+            'skip': skip the remaining points of the current sweep of dims 1 to dim (dim=1: rest of the line).
+        consecutive: number of consecutive steps fulfilling the condition to trigger the action
+        Skipped points are not applied nor readout, and nan is saved instead of their readouts so the dataset keeps
+        the shape of the sweep. The triggered rules are saved in the metadata of the dataset (tag 'sweep_rules').
+        Skip rules cannot be used with adaptive sweeps.
+        Example:
+            sw.add_rule((I_dc, '>', 10e-9), 'abort')  # current limit
+            sw.add_rule((I_dc, '<', 1e-12), 'skip', dim=1, consecutive=5)  # pinched off: go to the next line
+        """
+        rule = SweepRule(condition, action=action, dim=dim, consecutive=consecutive)
+        self.rules.append(rule)
+        return rule
+
+    def clear_rules(self):
+        self.rules = []
+
+    def set_reduction(self, param: QcParamType, reduction: Union[str, Reduction, Callable[[np.ndarray], Any]],
+                      raw: bool = False, **kwargs):
+        """
+        Reduce an array readout at each step before saving it (see reduction.py).
+        reduction: name and kwargs, function f(raw array) -> reduced array, or Reduction instance
+            'mean': mean value
+            'decimate': one sample every factor samples (kwargs: factor)
+            'boxcar': mean of blocks of width samples (kwargs: width)
+            'envelope': [min, max] of blocks of width samples (kwargs: width)
+            'histogram': counts in bins (kwargs: bins, range). The range of the first step is used if it is None.
+        raw: if it is True, the raw values are also saved in a hdf5 side file (see .set_raw_folder). Its path is
+            saved in the metadata of the dataset (tag 'sweep_raw_file').
+        Callbacks and rules receive the raw values. The recipe of the reduction is saved in the sweep info, so
+        SweeperContent adds the axis of the reduced dim 0 (ex: sample index, histogram bins) to the dataset.
+        Example:
+            sw.set_reduction(daq.ai0.trace, 'boxcar', width=100)
+            sw.set_reduction(zi.scope, 'histogram', bins=50, range=(-1, 1), raw=True)
+            sw.set_reduction(zi.scope, lambda v: np.abs(np.fft.rfft(v)))
+        """
+        validate_qc_param(param)
+        self.reductions[param] = to_reduction(reduction, **kwargs)
+        if raw and param not in self.raw_readouts:
+            self.raw_readouts.append(param)
+        elif not raw and param in self.raw_readouts:
+            self.raw_readouts.remove(param)
+
+    def clear_reductions(self):
+        self.reductions = {}
+        self.raw_readouts = []
+
+    def set_raw_folder(self, folder: str = None):
+        """
+        Folder of the side files (raw data and profiling traces, named by the guid of the dataset). If it is None, a
+        'raw' folder next to the qcodes database is used.
+        """
+        self.raw_folder = folder
+
+    def set_ramp(self, param: QcParamType, max_step: float = None, step_delay: float = 0, max_rate: float = None):
+        """
+        Maximum slew of a parameter during the sweep (see ramp.RampPolicy). Before applying start_at, each step and
+        return_to, the parameters whose change is larger than max_step are ramped in steps of at most max_step,
+        waiting step_delay after each step, and then the apply method sets the target value.
+        The parameters of the same instrument are ramped together in lock-step, so the waiting time is the one of
+        the longest ramp and not the sum of them. With .concurrent_apply (or AsyncSweeper), different instruments
+        are ramped in parallel.
+        The time of each ramp is saved in the time report as 'ramp' and 'ramp[instrument name]'.
+        The ramp policy of a control (see Controls.set_ramp) is used if the parameter has no ramp in the sweeper.
+        If max_step and max_rate are None, the ramp of the parameter is removed.
+        Example:
+            sw.set_ramp(V1, max_step=0.01, step_delay=0.005)  # 10 mV steps every 5 ms
+            sw.set_ramp(V2, max_rate=0.5)  # 0.5 V/s
+        """
+        validate_qc_param(param)
+        if max_step is None and max_rate is None:
+            self.ramps.pop(param, None)
+            return
+        self.ramps[param] = RampPolicy(max_step=max_step, step_delay=step_delay, max_rate=max_rate)
+
+    def clear_ramps(self):
+        self.ramps = {}
 
     def set_note(self, s: str):
         """
@@ -1008,27 +1889,113 @@ class Sweeper(object):
             {}  # empty dictionary
             ...
             {}  # length of the generator is total number of points (3*3=9)
+        With a traversal order different from raster (see .set_sweep_order), the steps follow that order and the
+        values are applied when they differ from the previous step.
+        """
+        yield from self.get_sweep_plan()
+
+    def get_sweep_plan(self) -> SweepPlan:
+        """
+        Compile the ordered instructions into a SweepPlan (see .get_ordered_instructions).
+        The plan can be iterated, sliced and inspected without applying anything.
+        """
+        sweep_parameters, sweep_shape = self.get_stepped_sweep()
+        return SweepPlan.compile(sweep_parameters, sweep_shape, order=self.get_sweep_order())
+
+    def get_adaptive_plan(self) -> AdaptivePlan:
+        """
+        Generate the AdaptivePlan with the configuration of .set_adaptive.
         """
+        if self.adaptive is None:
+            raise ValueError('Adaptive mode is not enabled. Use .set_adaptive')
+        if self.fast_axis is not None:
+            raise ValueError('Adaptive sweeps cannot be executed with a hardware fast axis')
         self._update_sweep_params_shape()
-        only_reps = len(self.sweep_parameters) == 0
-        if only_reps:
-            for i in range(self.get_total_sweep_points()):
-                yield {}
-        else:
-            instrs = []
-            for sparam in self.sweep_parameters.values():
-                instrs.append(sparam.get_ordered_instructions())
-            for instr_i in zip(*instrs):
-                d = {}
-                for instr_i_pi in instr_i:
-                    param, value, apply = instr_i_pi
-                    if apply:
-                        d[param] = value
-                yield d
+        kwargs = dict(self.adaptive)
+        if kwargs['readout'] is None:
+            if len(self.readouts) == 0:
+                raise ValueError('Adaptive sweeps need at least one readout')
+            kwargs['readout'] = self.readouts[0]
+        return AdaptivePlan(self.sweep_parameters.values(), self.sweep_shape, **kwargs)
+
+    def get_checkpoint_config(self) -> Dict[str, Any]:
+        """
+        Json serializable description of the sweep, which is saved in the checkpoints of the dataset.
+        .resume verifies that it is the same for the interrupted sweep and the current configuration.
+        """
+        self._update_sweep_params_shape()
+        order = self.sweep_order
+        if not isinstance(order, str):
+            order = 'custom:' + hashlib.sha1(np.asarray(order, dtype=np.int64).tobytes()).hexdigest()
+        axes = []
+        for qc_param, sw_param in self.sweep_parameters.items():
+            axes.append({
+                'name': qc_param.full_name,
+                'dim': int(sw_param.dim),
+                'values': np.asarray(sw_param.values).tolist(),
+                'apply': bool(sw_param.apply),
+                'refresh': bool(sw_param.refresh),
+            })
+        return {
+            'sweep_shape': [int(pts) for pts in self.sweep_shape],
+            'sweep_axes': axes,
+            'sweep_order': order,
+            'sweep_order_dims': self.sweep_order_dims,
+            'readouts': [param.full_name for param in self.readouts],
+            'adaptive': self.adaptive is not None,
+            'fast_axis': self.fast_axis is not None,
+        }
+
+    def get_sweep_order(self) -> Union[np.ndarray, None]:
+        """
+        Canonical index of the point measured at each step (see .set_sweep_order).
+        Returns None for the raster order.
+        """
+        if isinstance(self.sweep_order, str) and self.sweep_order == 'raster':
+            return None
+        _, sweep_shape = self.get_stepped_sweep()
+        return get_traversal_order(sweep_shape, self.sweep_order, self.sweep_order_dims)
+
+    def get_stepped_sweep(self) -> Tuple[List[SweepParameter], np.ndarray]:
+        """
+        Swept parameters and sweep shape of the steps applied by the sweeper.
+        With a hardware fast axis (see .set_fast_axis), dim 1 is executed by the hardware: the steps are the points
+        of the outer dims, whose parameters are copies with dim - 1.
+        """
+        self._update_sweep_params_shape()
+        if self.fast_axis is None:
+            return list(self.sweep_parameters.values()), self.sweep_shape
+        sweep_shape = self.get_saved_sweep_shape()
+        sweep_parameters = []
+        for sparam in self.sweep_parameters.values():
+            if sparam.dim > 1:
+                outer = SweepParameter(sparam.parameter, sparam.value_generator, sparam.dim - 1,
+                                       apply=sparam.apply, refresh=sparam.refresh)
+                outer.set_sweep_shape(sweep_shape)
+                sweep_parameters.append(outer)
+        return sweep_parameters, sweep_shape
+
+    def get_saved_sweep_shape(self) -> np.ndarray:
+        """
+        Sweep shape saved in the dataset. With a hardware fast axis, dim 1 is saved as the first dimension of the
+        readouts (sweep_readouts_dim0s), so only the outer dims are saved.
+        """
+        if self.fast_axis is None:
+            return self.sweep_shape
+        if len(self.sweep_shape) < 2:
+            return np.array([1], dtype=int)
+        return self.sweep_shape[1:]
 
     def get_total_sweep_points(self):
         return np.prod(self.sweep_shape)
 
+    def get_saved_points(self) -> int:
+        """
+        Number of sweep points saved by the last execution (each step of a hardware fast axis saves a full dim 1).
+        """
+        points_per_step = int(self.sweep_shape[0]) if self.fast_axis is not None else 1
+        return self._saved_steps * points_per_step
+
     def get_sweep_params_by_dims(self):
         d = {}
         for param in self.sweep_parameters.values():
@@ -1057,12 +2024,34 @@ class Sweeper(object):
         }
 
     def get_time_report(self):
-        timers = self._timers
+        """
+        Returns a dictionary with the statistics of the timers of the last sweep.
+        For each key in ['loop', 'apply', 'readout', 'save'], 'ramp' (if any parameter was ramped) and the
+        instrument groups (ex: 'readout[dmm]', 'ramp[dac]'):
+            {key}_mean, {key}_std, {key}_min, {key}_max, {key}_ewma, {key}_total, {key}_count
+            {key}_p50, {key}_p95, {key}_p99: percentiles estimated from a reservoir of sampled laps
+            {key}_laps: reservoir of sampled laps
+        travel, travel_raster: total applied travel of the sweep and of the same sweep in raster order, in units of
+            the range of each parameter (see SweepPlan.get_travel)
+        """
+        timers = dict(self._timers)
+        timers.update(self._group_timers)
         timings = {}
-        for key in ['loop', 'apply', 'readout', 'save']:
-            timings[f'{key}_mean'] = timers[key].mean
-            timings[f'{key}_laps'] = timers[key].values
+        for key in self._get_report_keys():
+            timer = timers[key]
+            timings[f'{key}_mean'] = timer.mean
+            timings[f'{key}_std'] = timer.std
+            timings[f'{key}_min'] = timer.min
+            timings[f'{key}_max'] = timer.max
+            timings[f'{key}_ewma'] = timer.ewma
+            timings[f'{key}_total'] = timer.sum
+            timings[f'{key}_count'] = timer.count
+            for q in [50, 95, 99]:
+                timings[f'{key}_p{q}'] = timer.percentile(q)
+            timings[f'{key}_laps'] = timer.values
         timings['execution'] = timers['total'].last_value
+        timings['travel'] = self._travel.get('travel', np.nan)
+        timings['travel_raster'] = self._travel.get('travel_raster', np.nan)
         return timings
 
     def show_time_report(self):
@@ -1070,15 +2059,56 @@ class Sweeper(object):
         t = 'Last sweep timings:\n'
         seconds = timings[f'execution']
         t += f"Total time: {self._fmt_time(seconds)}\n"
-        for key in ['loop', 'apply', 'readout', 'save']:
+        for key in self._get_report_keys():
             mean = timings[f'{key}_mean']
-            total = np.sum(timings[f'{key}_laps'])
-            t += f"{key}: {self._fmt_time(mean)} (mean) | {self._fmt_time(total)} (total)\n"
+            total = timings[f'{key}_total']
+            t += f"{key}: {self._fmt_time(mean)} (mean) | {self._fmt_time(total)} (total)"
+            if key != 'loop':
+                pcts = [self._fmt_time(timings[f'{key}_p{q}']) for q in [50, 95, 99]]
+                t += f" | {' / '.join(pcts)} (p50 / p95 / p99)"
+            t += '\n'
+        travel, travel_raster = timings['travel'], timings['travel_raster']
+        if travel_raster > 0:
+            reduction = 100 * (1 - travel / travel_raster)
+            t += f"travel: {travel:.2f} (raster: {travel_raster:.2f}, reduction: {reduction:.1f}%)\n"
         print(t)
 
+    def get_rule_events(self) -> List[Dict[str, Any]]:
+        """
+        Rules triggered in the last sweep (see .add_rule): list of {'step': step index, 'rule': str, 'action': str}.
+        """
+        return list(self._monitor.events) if self._monitor is not None else []
+
+    def get_latency_report(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Latency statistics of each parameter in the last profiled sweep (see .set_profiling).
+        Returns:
+            {parameter full name: {'set'/'get': {count, total, mean, std, min, max, p50, p95, p99}}}
+        """
+        if self.profiler is None:
+            raise ValueError('The last sweep was not profiled. Use .set_profiling')
+        return self.profiler.get_report()
+
+    def show_latency_report(self):
+        if self.profiler is None:
+            raise ValueError('The last sweep was not profiled. Use .set_profiling')
+        self.profiler.show()
+
+    def _get_report_keys(self) -> List[str]:
+        keys = ['loop', 'apply', 'readout', 'save']
+        if self._timers['ramp'].count > 0:
+            keys.append('ramp')
+        for key in ['apply', 'readout', 'save', 'ramp']:
+            keys += sorted([k for k in self._group_timers.keys() if k.startswith(f'{key}[')])
+        return keys
+
     @staticmethod
     def _fmt_time(seconds):
-        if seconds < 60:
+        if not np.isfinite(seconds):
+            return f'{seconds}s'
+        elif seconds < 1:
+            return f'{seconds * 1e3:.2f}ms'
+        elif seconds < 60:
             return f'{seconds:.2f}s'
         elif seconds < 60 * 60:
             return f'{seconds // 60}min {seconds % 60:.2f}s'
@@ -1196,14 +2226,223 @@ class Sweeper(object):
     def _reset_timers(self):
         for timers in self._timers.values():
             timers.reset()
+        self._group_timers = {}
+
+    def _get_group_timer(self, key, instrument) -> Timer:
+        name = f'{key}[{get_group_name(instrument)}]'
+        if name not in self._group_timers:
+            self._group_timers[name] = Timer()
+        return self._group_timers[name]
+
+    def _get_ramp_policies(self) -> Dict[QcParamType, RampPolicy]:
+        """ Ramp policies of the parameters applied by the sweep (.ramps or the metadata of the controls) """
+        policies = {}
+        for param in self.get_tracked_parameters():
+            policy = self.ramps.get(param, None)
+            if policy is None:
+                policy = to_ramp_policy(getattr(param, 'metadata', {}).get(RAMP_TAG, None))
+            if policy is not None:
+                policies[param] = policy
+        return policies
+
+    def _ramp(self, instr: Dict[QcParamType, Any]):
+        """
+        Ramp the parameters of instr which have a ramp policy (see .set_ramp). The targets are set afterwards by the
+        apply method. The instruments are ramped in parallel threads if the apply method is concurrent.
+        """
+        if not self._ramp_policies or len(instr) == 0:
+            return
+        executor = self._group_executor if self._is_concurrent_apply() else None
+        t0 = time.perf_counter()
+        durations = ramp_parameters(instr.items(), self._ramp_policies, executor=executor)
+        if len(durations) == 0:
+            return
+        self._timers['ramp'].add(time.perf_counter() - t0)
+        for instrument, duration in durations.items():
+            self._get_group_timer('ramp', instrument).add(duration)
+
+    def _is_concurrent_apply(self) -> bool:
+        return getattr(self.apply_method, '__func__', None) is Sweeper.concurrent_apply
+
+    def _run_step(self, index, instr, readouts, total_pts, save: Callable = None):
+        """
+        Apply, readout and save (if save is not None) a sweep step. A step skipped by a rule (instr is None) saves
+        nan instead of the readouts.
+        Returns:
+            results: dictionary {readout: value}
+            timings: dictionary with the timings for the callback
+        """
+        if instr is None:
+            return self._skip_step(index, total_pts, save=save)
+        # Apply parameter values in order
+        self._start_step()
+        self._ramp(instr)
+        self.apply_method(instr)
+        self._end_apply()
+
+        # Perform readout
+        self.apply_pre_readout()
+        self._start_readout()
+        if self._armed_fast_axis is not None:
+            self._armed_fast_axis.acquire()
+        results = self.readout_method(readouts)
+        self._end_readout(index, results, save=save)
+
+        self.apply_post_readout()
+        return self._end_step(index, results, total_pts)
+
+    def _start_step(self):
+        """ Bookkeeping before applying a step (shared with the AsyncSweeper loop) """
+        self._timers['loop'].start()
+        self._timers['apply'].start()
+
+    def _end_apply(self):
+        self._timers['apply'].elapse()
+
+    def _start_readout(self):
+        self._timers['readout'].start()
+
+    def _end_readout(self, index, results, save: Callable = None):
+        """ Stop the readout timer and save data to qcodes database (if save is not None) """
+        self._timers['readout'].elapse()
+        if save is not None:
+            save(index, results)
+
+    def _end_step(self, index, results, total_pts):
+        """
+        Check the monitor rules and stop the step timers.
+        Returns:
+            results: dictionary {readout: value}
+            timings: dictionary with the timings for the callback
+        """
+        if self._monitor is not None:
+            self._monitor.check(index, results)
+        self._timers['loop'].elapse()
+        self._timers['total'].elapse()
+        return results, self._get_step_timings(total_pts)
+
+    def _skip_step(self, index, total_pts, save: Callable = None):
+        results = self._monitor.get_skipped_results()
+        if save is not None:
+            save(index, results)
+        self._timers['total'].elapse()
+        return results, self._get_step_timings(total_pts)
+
+    def _get_steps(self, ordered_instrs) -> Iterator[Tuple[int, Union[Dict[QcParamType, Any], None]]]:
+        """ Enumerate the steps of the sweep, which can be skipped (None) or stopped by the rules """
+        if self._monitor is None:
+            return enumerate(ordered_instrs)
+        return self._monitor.iterate(ordered_instrs)
+
+    def _get_step_timings(self, total_pts) -> Dict[str, float]:
+        timers = self._timers
+        return {
+            'loop_mean': timers['loop'].mean,
+            'loop_i': timers['loop'].last_value,
+            'execution': timers['total'].last_value,
+            'expected_end': timers['loop'].mean * total_pts,
+        }
+
+    def _run_loop(self, datasaver, writer: WriteBuffer, bar, ordered_instrs, readouts, total_pts):
+        """
+        Sweep loop: apply, readout, save and callback for each step.
+        """
+        if self.pipeline:
+            self._run_pipeline(datasaver, writer, bar, ordered_instrs, readouts, total_pts)
+            return
+        save = lambda index, results: self._save_step(datasaver, writer, index, results)
+        feedback = getattr(ordered_instrs, 'add_result', None)  # for adaptive sweeps
+        throttle = self._create_throttle(total_pts)
+        for i, instr in self._get_steps(ordered_instrs):
+            results, timings = self._run_step(i, instr, readouts, total_pts, save=save)
+            if feedback is not None: feedback(i, results)
+            self._throttled_callback(throttle, bar, i, results, timings)
+        self._flush_callback(throttle, bar)
+
+    def _run_pipeline(self, datasaver, writer: WriteBuffer, bar, ordered_instrs, readouts, total_pts):
+        """
+        Apply and readout in a worker thread while the results are saved and the callbacks executed in this thread,
+        which owns the qcodes database connection.
+        """
+        step = lambda index, instr: (index,) + self._run_step(index, instr, readouts, total_pts)
+        worker = PipelineWorker(step, self._get_steps(ordered_instrs), maxsize=self.pipeline_queue_size,
+                                name=f'{self.name}_acquisition')
+        throttle = self._create_throttle(total_pts)
+        worker.start()
+        try:
+            for index, results, timings in worker:
+                self._save_step(datasaver, writer, index, results)
+                self._throttled_callback(throttle, bar, index, results, timings)
+            self._flush_callback(throttle, bar)
+        finally:
+            # Save the steps that were already measured if the sweep is interrupted
+            for index, results, timings in worker.stop():
+                self._save_step(datasaver, writer, index, results)
+
+    def _save_step(self, datasaver, writer: WriteBuffer, index, results):
+        timers = self._timers
+        timers['save'].start()
+        results = self._reduce_results(index, results)
+        # Save readout info (only for the first time)
+        if index == 0:
+            [self._save_readout_info(datasaver, p, dim0_pts=np.array(v).size) for p, v in results.items()]
+        # reduced readouts are saved by name since their shape is different from the validator of the parameter
+        data = [tuple([p.full_name if p in self.reductions else p, v]) for p, v in results.items()]
+        writer.add_result(*data)
+        timers['save'].elapse()
+        self._saved_steps = index + 1
+        if self._checkpoint is not None:
+            self._checkpoint.update(self._saved_steps)
+
+    def _reduce_results(self, index, results: Dict[QcParamType, Any]) -> Dict[QcParamType, Any]:
+        """ Apply the reductions of the readouts and write the raw values in the side file """
+        if len(self.reductions) == 0:
+            return results
+        reduced = {}
+        for param, value in results.items():
+            if param not in self.reductions:
+                reduced[param] = value
+                continue
+            if self._raw_writer is not None and param in self.raw_readouts:
+                self._raw_writer.write(param.full_name, index, value)
+            reduced[param] = self.reductions[param](value)
+        return reduced
+
+    def _callback_step(self, bar, index, results, timings):
+        info = self._generate_callback_dict(index, results, timings)
+        if bar is not None: bar(info)
+        self.callback(info)
+
+    def _create_throttle(self, total_pts) -> CallbackThrottle:
+        return CallbackThrottle(self.callback_every, self.callback_interval, total_pts=total_pts)
+
+    def _throttled_callback(self, throttle: CallbackThrottle, bar, index, results, timings):
+        if bar is None and len(self._callback_methods) == 0:
+            return  # no UI nor callbacks
+        if throttle.ready(index):
+            self._callback_step(bar, index, results, timings)
+        else:
+            throttle.hold(bar, index, results, timings)
+
+    def _flush_callback(self, throttle: CallbackThrottle, bar):
+        """ Execute the callbacks of the last step if it was skipped by the rate limit (ex: aborted sweep) """
+        step = throttle.flush()
+        if step is not None:
+            self._callback_step(*step)
+
+    def _create_write_buffer(self, datasaver) -> WriteBuffer:
+        paramtypes = {name: spec.type for name, spec in self.measurement.parameters.items()}
+        return WriteBuffer(datasaver, size=self.write_buffer_size, interval=self.write_buffer_time,
+                           paramtypes=paramtypes)
 
     def _generate_callback_dict(self, index, results, timings):
-        d = self.get_callback_dict_template()
-        d.update({
-            'index': index,
-            'results': results,
-            'timings': timings,
-        })
+        """ Update the callback payload of the sweep, which is reused at each step """
+        if self._callback_payload is None:
+            self._callback_payload = self.get_callback_dict_template()
+        d = self._callback_payload
+        d['index'] = index
+        d['results'] = results
+        d['timings'].update(timings)
         return d
 
     def _validate_sweep_shape(self, sweep_shape: Iterable[int]):
@@ -1213,6 +2452,72 @@ class Sweeper(object):
             if pts <= 0:
                 raise ValueError(f'Points to sweep ({pts}) must be > 0')
 
+    def _validate_checkpoint_config(self, checkpoint: Dict[str, Any]):
+        config = json.loads(json.dumps(self.get_checkpoint_config()))
+        for key, value in config.items():
+            if checkpoint.get(key) != value:
+                raise ValueError(f'The sweep configuration ({key}) is different from the interrupted sweep')
+
+    def _get_travel(self, plan: Union[SweepPlan, AdaptivePlan]) -> Dict[str, float]:
+        sweep_parameters, sweep_shape = self.get_stepped_sweep()
+        if isinstance(plan, AdaptivePlan):
+            plan = SweepPlan.compile(sweep_parameters, sweep_shape, order=plan.get_order())
+        travel = plan.get_travel()
+        if plan.order is None:
+            return {'travel': travel, 'travel_raster': travel}
+        raster = SweepPlan.compile(sweep_parameters, sweep_shape)
+        return {'travel': travel, 'travel_raster': raster.get_travel()}
+
+    def _create_profiler(self) -> ParameterProfiler:
+        params = list(self.sweep_parameters.keys()) + list(self.readouts)
+        params += list(self.start_at.keys()) + list(self.return_to.keys())
+        return ParameterProfiler(params, max_events=self.profile_max_events)
+
+    def _save_profile(self, datasaver):
+        if self.profiler is not None:
+            trace_path = self._get_side_file(datasaver, '_trace.json') if self.profile_trace else None
+            self.profiler.save(datasaver.dataset, trace_path=trace_path)
+
+    def _get_side_file(self, datasaver, suffix: str) -> str:
+        """ Path of a side file of the dataset in the raw folder (see .set_raw_folder) """
+        folder = self.raw_folder
+        if folder is None:
+            folder = os.path.join(os.path.dirname(os.path.abspath(datasaver.dataset.path_to_db)), 'raw')
+        return os.path.join(folder, f'{datasaver.dataset.guid}{suffix}')
+
+    def _open_raw_file(self, datasaver, test_run: bool = False):
+        self.raw_file = None
+        if test_run or not any(param in self.readouts for param in self.raw_readouts):
+            return
+        self.raw_file = self._get_side_file(datasaver, '.h5')
+        self._raw_writer = RawWriter(self.raw_file)
+        datasaver.dataset.add_metadata(RAW_FILE_TAG, self.raw_file)
+
+    def _close_raw_file(self):
+        if self._raw_writer is not None:
+            self._raw_writer.close()
+            self._raw_writer = None
+
+    def _create_monitor(self, plan: Union[SweepPlan, AdaptivePlan]) -> RuleMonitor:
+        _, sweep_shape = self.get_stepped_sweep()
+        order = plan.get_order() if isinstance(plan, SweepPlan) else None
+        dim_offset = 0 if self.fast_axis is None else 1
+        return RuleMonitor(self.rules, order=order, sweep_shape=sweep_shape, dim_offset=dim_offset)
+
+    def _get_end_status(self, finished: bool) -> str:
+        if not finished:
+            return 'interrupted'
+        return 'aborted' if self._monitor is not None and self._monitor.aborted else 'completed'
+
+    def _save_rule_events(self, datasaver):
+        if self._monitor is not None:
+            datasaver.dataset.add_metadata(RULES_TAG, json.dumps(self._monitor.events))
+
+    def _program_fast_axis(self):
+        fast = [p for p in self.sweep_parameters.values() if p.dim == 1 and p.apply]
+        self.fast_axis.program(self.sweep_shape[0], [p.parameter for p in fast], [p.values for p in fast])
+        self._armed_fast_axis = self.fast_axis
+
     def _update_sweep_params_shape(self):
         for param in self.sweep_parameters.values():
             param.set_sweep_shape(self.sweep_shape)
@@ -1244,6 +2549,8 @@ class Sweeper(object):
             'sweep_readouts_names': [vals.Strings(), 'text'],
             'sweep_readouts_full_names': [vals.Strings(), 'text'],
             'sweep_readouts_dim0s': [vals.Numbers(), 'numeric'],
+            'sweep_readouts_reductions': [vals.Strings(), 'text'],
+            'sweep_order': [vals.Numbers(), 'numeric'],
             'sweep_note': [vals.Strings(), 'text'],
             'static_labels': [vals.Strings(), 'text'],
             'static_names': [vals.Strings(), 'text'],
@@ -1267,10 +2574,32 @@ class Sweeper(object):
     def _save_sweep_info(self, datasaver):
         self._save_axes_info(datasaver)
         self._save_axes_values(datasaver)
-        for pts in self.sweep_shape:
+        for pts in self.get_saved_sweep_shape():
             datasaver.add_result(('sweep_shape', pts))
         datasaver.add_result(('sweep_note', str(self.note)))
 
+    def _save_sweep_order(self, datasaver, plan: Union[SweepPlan, AdaptivePlan]):
+        """
+        Save the canonical index of the steps when they are not in raster order (custom order or resumed sweep).
+        SweeperContent uses it to place the data on the sweep grid. For adaptive sweeps, the order is only known
+        after measuring and it is saved with .save_adaptive_order.
+        """
+        if isinstance(plan, SweepPlan) and plan.order is not None and len(plan) > 0:
+            datasaver.add_result(('sweep_order', plan.order))
+
+    def _save_adaptive_order(self, datasaver, plan: Union[SweepPlan, AdaptivePlan]):
+        """ Save the canonical index of the adaptive steps saved since the last call """
+        if not isinstance(plan, AdaptivePlan):
+            return
+        order = plan.get_order()[self._saved_order_steps:self._saved_steps]
+        if len(order) > 0:
+            datasaver.add_result(('sweep_order', order))
+        self._saved_order_steps = self._saved_steps
+
+    def _write_pending(self, datasaver, writer: WriteBuffer, plan: Union[SweepPlan, AdaptivePlan]):
+        writer.flush()
+        self._save_adaptive_order(datasaver, plan)
+
     def _save_static_info(self, datasaver):
         tparams = self.get_tracked_parameters()
         for param in tparams:
@@ -1282,13 +2611,14 @@ class Sweeper(object):
             )
 
     def _save_axes_info(self, datasaver):
+        dim_offset = 0 if self.fast_axis is None else 1  # dim 1 of a fast axis is the first axis of the readouts
         for qc_param, sw_param in self.sweep_parameters.items():
             isbool = int(isinstance(sw_param.values[0], bool))
             datasaver.add_result(
                 ('sweep_axes_names', qc_param.name),
                 ('sweep_axes_full_names', qc_param.full_name),
                 ('sweep_axes_isbools', isbool),
-                ('sweep_dims', sw_param.dim),
+                ('sweep_dims', sw_param.dim - dim_offset),
             )
 
     def _save_axes_values(self, datasaver):
@@ -1306,10 +2636,12 @@ class Sweeper(object):
                 datasaver.add_result(*param_values)
 
     def _save_readout_info(self, datasaver, param, dim0_pts):
+        reduction = self.reductions[param].to_json() if param in self.reductions else ''
         datasaver.add_result(
             ('sweep_readouts_names', param.name),
             ('sweep_readouts_full_names', param.full_name),
             ('sweep_readouts_dim0s', dim0_pts),
+            ('sweep_readouts_reductions', reduction),
         )
 
     def _save_current_static_config(self, datasaver, label):
@@ -1329,21 +2661,29 @@ class Sweeper(object):
 
 
 class ProgressBar(object):
-    def __init__(self, total_pts):
+    start_idx = 3  # the expected time is estimated from the first steps
+
+    def __init__(self, total_pts, mode: str = 'notebook'):
+        """
+        mode: 'notebook' (tqdm.notebook) or 'console' (tqdm)
+        """
         self.total_pts = int(total_pts)
+        self.mode = mode
+        self.bar = None
 
     def update(self, callback_dict: dict):
-        timings = callback_dict['timings']
-        meas_time = datetime.timedelta(seconds=timings['expected_end'])
         i = callback_dict['index']
-        start_idx = 3
-        if i == start_idx:
-            from tqdm.notebook import tqdm as progress_bar
+        if self.bar is None:
+            if i < self.start_idx:
+                return
+            if self.mode == 'notebook':
+                from tqdm.notebook import tqdm as progress_bar
+            else:
+                from tqdm import tqdm as progress_bar
+            meas_time = datetime.timedelta(seconds=callback_dict['timings']['expected_end'])
             print(f'The measurement will take {meas_time}')
             self.bar = progress_bar(total=self.total_pts)
-            self.bar.update(start_idx + 1)
-        elif i > start_idx:
-            self.bar.update(1)
+        self.bar.update(i + 1 - self.bar.n)  # steps can be skipped by the callback rate (see Sweeper.set_callback_rate)
 
     def __call__(self, callback_dict: dict):
         self.update(callback_dict)
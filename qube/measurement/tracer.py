@@ -0,0 +1,254 @@
+import threading
+import time
+from typing import Any, Callable, List, Tuple
+
+import numpy as np
+
+
+class RingBuffer(object):
+    def __init__(self, capacity: int):
+        """
+        Fixed-capacity buffer of (time, value) samples. When it is full, the oldest samples are overwritten, so the
+        memory does not grow with the duration of the acquisition. Appending and reading are thread-safe.
+        capacity: maximum number of samples
+        """
+        capacity = int(capacity)
+        if capacity < 1:
+            raise ValueError('The capacity of a ring buffer must be >= 1')
+        self.capacity = capacity
+        self._t = np.full(capacity, np.nan)
+        self._y = np.full(capacity, np.nan)
+        self._next = 0  # position of the next sample
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, t: float, y: float):
+        with self._lock:
+            self._t[self._next] = t
+            self._y[self._next] = y
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def get(self, t_min: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Samples in chronological order (copies).
+        t_min: only the samples with time >= t_min
+        """
+        with self._lock:
+            start = (self._next - self._count) % self.capacity
+            order = (start + np.arange(self._count)) % self.capacity
+            t, y = self._t[order], self._y[order]
+        if t_min is not None:
+            first = int(np.searchsorted(t, t_min, side='left'))
+            t, y = t[first:], y[first:]
+        return t, y
+
+    def clear(self):
+        with self._lock:
+            self._next = 0
+            self._count = 0
+
+    def __len__(self):
+        return self._count
+
+
+def decimate_minmax(t: np.ndarray, y: np.ndarray, bins: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce a trace to at most 2 * bins points by keeping the minimum and the maximum of each of bins consecutive
+    blocks (in their time order), so spikes are still visible after decimation.
+    """
+    n = len(t)
+    if n <= 2 * bins:
+        return t, y
+    width = int(np.ceil(n / bins))
+    n_blocks = int(np.ceil(n / width))
+    blocks = np.full(n_blocks * width, np.nan)
+    blocks[:n] = y
+    blocks = blocks.reshape(n_blocks, width)
+    blocks[np.all(np.isnan(blocks), axis=1), 0] = 0  # blocks without values: avoid the errors of nanargmin
+    offsets = np.arange(n_blocks) * width
+    i_min = offsets + np.nanargmin(blocks, axis=1)
+    i_max = offsets + np.nanargmax(blocks, axis=1)
+    selected = np.sort(np.stack([i_min, i_max], axis=1), axis=1).ravel()
+    return t[selected], y[selected]
+
+
+class LiveTracer(object):
+    def __init__(self, readouts: List[Any], read_function: Callable[[], List[float]], window: float = 60,
+                 interval: float = 0.1, capacity: int = None, refresh_interval: float = 0.5,
+                 max_points: int = 1000):
+        """
+        Live plot of readouts as a function of time (see Controls.trace).
+        The readouts are acquired in a dedicated thread every interval seconds and stored in a ring buffer per
+        readout. The figure is refreshed every refresh_interval seconds by a timer of the figure canvas, independently
+        of the acquisition. At each refresh, only the samples in the time window are plotted, decimated with min/max
+        to at most max_points points, and only the lines are redrawn (blitting). The axes (and the whole figure) are
+        redrawn only when the data leaves the current limits. The memory and the cost of a refresh do not depend on
+        the duration of the trace.
+        readouts: list of qcodes parameters (for the labels of the plots)
+        read_function: function returning the list of values of the readouts
+        window: time window of the plot in seconds
+        interval: acquisition interval in seconds
+        capacity: samples kept per readout (default: enough for the time window)
+        refresh_interval: time between refreshes of the figure in seconds
+        max_points: maximum number of points plotted per readout
+        Example:
+            tracer = LiveTracer([dmm.v], lambda: [dmm.v()], window=600, interval=0.05)
+            tracer.create_figure()
+            tracer.start()
+            ...
+            tracer.stop()
+        """
+        if interval <= 0 or window <= 0 or refresh_interval <= 0:
+            raise ValueError('window, interval and refresh_interval must be > 0')
+        self.readouts = list(readouts)
+        self.read_function = read_function
+        self.window = float(window)
+        self.interval = float(interval)
+        self.refresh_interval = float(refresh_interval)
+        self.max_points = int(max_points)
+        if capacity is None:
+            capacity = int(np.ceil(self.window / self.interval)) + 1
+        self.buffers = [RingBuffer(capacity) for _ in self.readouts]
+        self.error = None  # exception raised by the acquisition
+        self.fig = None
+        self.axs = []
+        self.lines = []
+        self._t0 = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._timer = None
+        self._background = None
+        self._needs_draw = True
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """ Start the acquisition thread and the refresh timer of the figure """
+        if self.running:
+            return
+        self._stop.clear()
+        self.error = None
+        if self._t0 is None:
+            self._t0 = time.time()
+        self._thread = threading.Thread(target=self._acquire, name='LiveTracer', daemon=True)
+        self._thread.start()
+        if self.fig is not None and self._timer is None:
+            self._timer = self.fig.canvas.new_timer(interval=int(self.refresh_interval * 1e3))
+            self._timer.add_callback(self.refresh)
+            self._timer.start()
+
+    def stop(self):
+        """ Stop the acquisition and the refreshes (the last data is plotted once more) """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        if self.fig is not None:
+            self.refresh()
+
+    def get_data(self, index: int = 0, window: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Time (s since the start) and values of a readout.
+        window: only the samples in the time window
+        """
+        t, y = self.buffers[index].get()
+        if window and len(t) > 0:
+            first = int(np.searchsorted(t, t[-1] - self.window, side='left'))
+            t, y = t[first:], y[first:]
+        return t, y
+
+    def create_figure(self, figwidth: float = 7.2, subplotheight: float = 2.75):
+        import matplotlib.pyplot as plt
+        fig, axs = plt.subplots(len(self.readouts), squeeze=False)
+        fig.set_figwidth(figwidth)
+        fig.set_figheight(subplotheight * len(self.readouts))
+        self.fig, self.axs, self.lines = fig, list(axs[:, 0]), []
+        for idx, (ax, readout) in enumerate(zip(self.axs, self.readouts)):
+            line, = ax.plot([], [], animated=True)
+            self.lines.append(line)
+            ax.grid(True)
+            ax.set_ylabel(r'{:s} ({:s})'.format(getattr(readout, 'label', str(readout)),
+                                               getattr(readout, 'unit', '')))
+            ax.set_xlim(0, self.window)
+        self.axs[-1].set_xlabel(r'Time $t$ (sec)')
+        fig.tight_layout()
+        fig.canvas.mpl_connect('draw_event', self._on_draw)
+        self._needs_draw = True
+        return fig
+
+    def refresh(self):
+        """ Plot the data of the time window (blitting the lines when the limits don't change) """
+        if self.fig is None:
+            return
+        for idx, (ax, line) in enumerate(zip(self.axs, self.lines)):
+            t, y = decimate_minmax(*self.get_data(idx), bins=max(1, self.max_points // 2))
+            line.set_data(t, y)
+            if len(t) > 0 and self._update_limits(ax, t, y):
+                self._needs_draw = True
+        canvas = self.fig.canvas
+        if self._needs_draw or self._background is None or not getattr(canvas, 'supports_blit', False):
+            canvas.draw()  # calls _on_draw, which saves the background and draws the lines
+        else:
+            canvas.restore_region(self._background)
+            for ax, line in zip(self.axs, self.lines):
+                ax.draw_artist(line)
+            canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+    """ Private methods """
+
+    def _acquire(self):
+        next_time = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                values = self.read_function()
+            except Exception as e:
+                self.error = e
+                break
+            t = time.time() - self._t0
+            for buffer, value in zip(self.buffers, values):
+                try:
+                    buffer.append(t, float(value))
+                except (TypeError, ValueError):
+                    buffer.append(t, np.nan)  # non-numeric readouts cannot be plotted
+            # Fixed rate without accumulating the time of the readout (samples are skipped if it is too slow)
+            next_time += self.interval
+            now = time.perf_counter()
+            if next_time < now:
+                next_time = now
+            self._stop.wait(next_time - now)
+
+    def _update_limits(self, ax, t: np.ndarray, y: np.ndarray) -> bool:
+        """
+        Move the time axis by steps of 20% of the window and expand the y axis with a margin when the data leaves
+        the current limits. Returns True if the limits changed.
+        """
+        changed = False
+        x0, x1 = ax.get_xlim()
+        if t[-1] > x1 or t[-1] < x1 - self.window:
+            x1 = max(t[-1] + 0.2 * self.window, self.window)
+            ax.set_xlim(x1 - self.window, x1)
+            changed = True
+        finite = y[np.isfinite(y)]
+        if len(finite) > 0:
+            y_min, y_max = float(np.min(finite)), float(np.max(finite))
+            y0, y1 = ax.get_ylim()
+            if y_min < y0 or y_max > y1 or changed:
+                margin = 0.1 * (y_max - y_min) if y_max > y_min else max(abs(y_max) * 0.1, 1e-12)
+                ax.set_ylim(y_min - margin, y_max + margin)
+                changed = True
+        return changed
+
+    def _on_draw(self, event):
+        canvas = self.fig.canvas
+        if getattr(canvas, 'supports_blit', False):
+            self._background = canvas.copy_from_bbox(self.fig.bbox)
+        for ax, line in zip(self.axs, self.lines):
+            ax.draw_artist(line)
+        self._needs_draw = False
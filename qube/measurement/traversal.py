@@ -0,0 +1,160 @@
+from typing import Any, Iterable, List, Union
+
+import numpy as np
+
+TRAVERSAL_ORDERS = ['raster', 'snake', 'hilbert', 'zorder']
+
+
+def get_traversal_order(sweep_shape: Iterable[int], order: Union[str, Iterable[int]] = 'raster',
+                        dims: Iterable[int] = None) -> np.ndarray:
+    """
+    Order in which the points of a sweep are measured.
+    The points are identified by their canonical index, which is the linear index of the point in the sweep grid
+    with the dim 1 changing first (i.e. Fortran order, the same order as the raster sweep).
+    sweep_shape: list of points for each dim
+    order:
+        'raster': dim 1 always goes from the first to the last value (default)
+        'snake': the swept direction of dim 1 (or of the given dims) is reversed each time that a higher dim changes
+        'hilbert': Hilbert curve over the dims 1 and 2 (higher dims are raster)
+        'zorder': Z-order (Morton) curve over the dims 1 and 2 (higher dims are raster)
+        array: custom permutation of the canonical indices
+    dims: only for 'snake'. List of dims that are reversed. If it is None, all the dims except the last one.
+    Returns:
+        integer array with the canonical index of the point measured at each step
+    Example:
+        get_traversal_order([3, 2], 'snake') -> [0, 1, 2, 5, 4, 3]
+    """
+    shape = np.array(tuple(sweep_shape), dtype=int)
+    total_pts = int(np.prod(shape))
+    if isinstance(order, str):
+        if order == 'raster':
+            return np.arange(total_pts, dtype=np.intp)
+        elif order == 'snake':
+            return snake_order(shape, dims)
+        elif order == 'hilbert':
+            return _curve_order(shape, _hilbert_index)
+        elif order == 'zorder':
+            return _curve_order(shape, _zorder_index)
+        else:
+            raise ValueError(f'Unknown traversal order ({order}). Valid orders are {TRAVERSAL_ORDERS}')
+    order = np.asarray(order)
+    validate_traversal_order(order, total_pts)
+    return order.astype(np.intp)
+
+
+def validate_traversal_order(order: np.ndarray, total_pts: int):
+    """
+    A custom traversal order must be a permutation of the canonical indices (0, 1, ..., total_pts - 1).
+    """
+    if order.ndim != 1 or len(order) != total_pts:
+        raise ValueError(f'Traversal order must be a 1D array with {total_pts} elements')
+    if not np.issubdtype(order.dtype, np.integer):
+        raise TypeError('Traversal order must contain integer indices')
+    if not np.array_equal(np.sort(order), np.arange(total_pts)):
+        raise ValueError('Traversal order must be a permutation of the indices from 0 to total_pts - 1')
+
+
+def snake_order(sweep_shape: Iterable[int], dims: Iterable[int] = None) -> np.ndarray:
+    """
+    Boustrophedon order: the direction of each given dim is reversed every time that the next dim changes, so
+    consecutive steps only change one value of one dimension.
+    dims: list of dims (starting from 1) to reverse. If it is None, all the dims except the last one.
+    """
+    shape = np.array(tuple(sweep_shape), dtype=int)
+    dims = range(1, len(shape)) if dims is None else dims
+    dims = sorted(set(dims))
+    for dim in dims:
+        if not 1 <= dim <= len(shape):
+            raise ValueError(f'Snake dim ({dim}) must be between 1 and {len(shape)}')
+    steps = np.arange(int(np.prod(shape)), dtype=np.intp)
+    strides = np.concatenate([[1], np.cumprod(shape)[:-1]]).astype(np.intp)
+    canonical = np.zeros_like(steps)
+    for i, (pts, stride) in enumerate(zip(shape, strides)):
+        digit = (steps // stride) % pts
+        if i + 1 in dims:
+            reverse = (steps // (stride * pts)) % 2 == 1
+            digit = np.where(reverse, pts - 1 - digit, digit)
+        canonical += digit * stride
+    return canonical
+
+
+def get_travel(values: np.ndarray, changes: np.ndarray = None) -> float:
+    """
+    Total travel of a parameter, i.e. sum of the absolute differences between consecutive applied values.
+    values: value of the parameter at each step
+    changes: boolean array indicating if the value is applied at each step. If it is None, all of them.
+    Returns nan for non-numeric values.
+    """
+    values = np.asarray(values)
+    if changes is not None:
+        values = values[np.asarray(changes, dtype=bool)]
+    try:
+        values = values.astype(float)
+    except (TypeError, ValueError):
+        return np.nan
+    if values.size < 2:
+        return 0.
+    return float(np.sum(np.abs(np.diff(values))))
+
+
+def get_normalized_travel(values_list: List[np.ndarray], changes_list: List[np.ndarray],
+                          ranges: List[Any]) -> float:
+    """
+    Sum of the travels (see get_travel) of several parameters, each one divided by its sweep range (max - min), so
+    parameters with different units can be compared. A value of 1 is equivalent to going once from the min to the
+    max value of a parameter. Non-numeric parameters and parameters with a single value are ignored.
+    """
+    total = 0.
+    for values, changes, values_range in zip(values_list, changes_list, ranges):
+        travel = get_travel(values, changes)
+        try:
+            span = float(np.max(values_range) - np.min(values_range))
+        except (TypeError, ValueError):
+            continue
+        if np.isfinite(travel) and span > 0:
+            total += travel / span
+    return total
+
+
+def _curve_order(shape: np.ndarray, index_func) -> np.ndarray:
+    """
+    Order the points of dims 1 and 2 by their index along a 2D space-filling curve. Higher dims are raster.
+    """
+    if len(shape) < 2:
+        raise ValueError('Space-filling traversal orders need at least 2 dims')
+    n1, n2 = int(shape[0]), int(shape[1])
+    x, y = np.meshgrid(np.arange(n1), np.arange(n2), indexing='ij')
+    x, y = x.ravel(order='F'), y.ravel(order='F')
+    side = 1 << int(max(n1, n2) - 1).bit_length()
+    plane = np.argsort(index_func(x, y, side), kind='stable').astype(np.intp)
+    plane_pts = n1 * n2
+    outer = np.arange(int(np.prod(shape[2:])), dtype=np.intp) * plane_pts
+    return (outer[:, None] + plane[None, :]).ravel()
+
+
+def _hilbert_index(x: np.ndarray, y: np.ndarray, side: int) -> np.ndarray:
+    """ Index along the Hilbert curve of a (side x side) grid, where side is a power of 2 """
+    x, y = x.astype(np.int64), y.astype(np.int64)
+    d = np.zeros_like(x)
+    s = side // 2
+    while s > 0:
+        rx = ((x & s) > 0).astype(np.int64)
+        ry = ((y & s) > 0).astype(np.int64)
+        d += s * s * ((3 * rx) ^ ry)
+        flip = (ry == 0) & (rx == 1)
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        swap = ry == 0
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+        s //= 2
+    return d
+
+
+def _zorder_index(x: np.ndarray, y: np.ndarray, side: int) -> np.ndarray:
+    """ Morton index of a (side x side) grid: bits of x and y interleaved, with x in the lower bit """
+    x, y = x.astype(np.int64), y.astype(np.int64)
+    d = np.zeros_like(x)
+    for bit in range(max(int(side - 1).bit_length(), 1)):
+        d |= ((x >> bit) & 1) << (2 * bit)
+        d |= ((y >> bit) & 1) << (2 * bit + 1)
+    return d
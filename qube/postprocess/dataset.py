@@ -126,9 +126,13 @@ class ArrayData(Data):
     def raw_value(self):
         return self._value
 
+    @property
+    def shape(self):
+        return self.value.shape
+
     @property
     def ndim(self):
-        return self.value.ndim
+        return len(self.shape)
 
     def set_offset(self, offset):
         if offset is not None:
@@ -259,11 +263,11 @@ class Dataset(ArrayData):
 
     @property
     def counter_axes(self):
-        ndim = self.value.ndim
+        shape = self.shape
         axes = []
-        for dim in range(ndim):
+        for dim in range(len(shape)):
             name = f'counter_dim{dim}'
-            value = np.arange(self.value.shape[dim], dtype=int)
+            value = np.arange(shape[dim], dtype=int)
             cax = Axis(name=name, value=value, dim=dim, unit=None, offset=0, instrument=None, metadata={})
             axes.append(cax)
         return axes
@@ -281,8 +285,9 @@ class Dataset(ArrayData):
 
     def is_valid_axis(self, axis):
         b = False
-        if axis.value.size in self.value.shape and axis.dim <= self.value.ndim - 1:
-            if axis.value.size == self.value.shape[axis.dim]:
+        shape = self.shape
+        if axis.value.size in shape and axis.dim <= len(shape) - 1:
+            if axis.value.size == shape[axis.dim]:
                 b = True
         return b
 
@@ -341,7 +346,7 @@ class Dataset(ArrayData):
         self.remove_axes_by_name(name, exact_match=False)
 
     def __str__(self):
-        return f'name: {self.name} - unit: {self.unit} - shape: {self.value.shape}'
+        return f'name: {self.name} - unit: {self.unit} - shape: {self.shape}'
 
     def __repr__(self):
         out = []
@@ -353,6 +358,61 @@ class Dataset(ArrayData):
         return out
 
 
+class LazyDataset(Dataset):
+    """
+    Dataset whose value is loaded the first time it is accessed (ex: readouts of a qcodes dataset, see
+    SweeperContent). The loaded value is kept, so the loader is called at most once.
+
+    Parameters
+    ----------
+    name : str
+        name of the dataset
+    loader : callable
+        function without arguments returning the value
+    shape : tuple
+        shape of the value, used to validate the axes before loading it
+    """
+
+    def __init__(self, name, loader, shape, axes=[], **kwargs):
+        self._loader = loader
+        self._shape = tuple(int(n) for n in shape)
+        super().__init__(name, None, axes=axes, **kwargs)
+
+    @property
+    def value(self):
+        self.load()
+        return super().value
+
+    @value.setter
+    def value(self, v):
+        self._loader = None
+        self._value = v
+
+    @property
+    def raw_value(self):
+        self.load()
+        return self._value
+
+    @property
+    def shape(self):
+        if not self.is_loaded:
+            return self._shape
+        return super().shape
+
+    @property
+    def is_loaded(self):
+        return self._loader is None
+
+    def load(self):
+        if self._loader is not None:
+            self._value = self._loader()
+            self._loader = None
+
+    def copy(self, shallow_copy=False):
+        self.load()  # the copy does not keep a reference to the source of the data
+        return super().copy(shallow_copy=shallow_copy)
+
+
 class Sequence(Data):
     """
     """
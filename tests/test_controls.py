@@ -1,8 +1,14 @@
+import time
 import unittest
 
-from qcodes import Parameter, DelegateParameter
+import numpy as np
+
+from qcodes import Parameter, DelegateParameter, Measurement
+from qcodes import validators as vals
 
 from qube.measurement import Controls
+from qube.measurement.sweep import Sweep
+from qube.measurement.tracer import RingBuffer, LiveTracer, decimate_minmax
 
 v_values = [0, 0, 0]
 y_values = [0, 0, 0]
@@ -124,6 +130,13 @@ class Test_Controls(unittest.TestCase):
         self.assertEqual(p1(), 1)
         self.assertEqual(p2(), 2)
 
+        c.apply({'v2_new': 3, 'v1_new': 4}, parallel=True)
+        self.assertEqual(p1(), 4)
+        self.assertEqual(p2(), 3)
+        c.apply({'v1_new': 5, 'v2_new': 6}, parallel=True, settle=True)
+        self.assertEqual(p1(), 5)
+        self.assertEqual(p2(), 6)
+
         """
         Apply one readout --> raise KeyError
         """
@@ -136,6 +149,149 @@ class Test_Controls(unittest.TestCase):
         d = {'random': 100}
         self.assertRaises(KeyError, c.apply, d)
 
+    def test_ramp(self):
+        c = Controls(name='test_controls')
+        moves = []
+        p1 = c.add_control('v1_new', source=v1, move_command=lambda: moves.append(v_values[0]))
+        p2 = c.add_control('v2_new', source=v2)
+        c.apply({p1: 0, p2: 0})
+        self.assertIsNone(c.get_ramp('v1_new'))
+
+        c.set_ramp('v1_new', max_step=0.5)
+        self.assertEqual(c.get_ramp(p1).max_step, 0.5)
+        moves.clear()
+        c.apply({p1: 2, p2: 5})
+        self.assertEqual(moves, [0.5, 1, 1.5, 2])  # move command after each step and after applying
+        self.assertEqual(p1(), 2)
+        self.assertEqual(p2(), 5)
+
+        c.set_ramp('v1_new')  # remove ramp
+        self.assertIsNone(c.get_ramp('v1_new'))
+        self.assertRaises(KeyError, c.set_ramp, 'y_random', max_step=1)
+
+
+    def test_index(self):
+        c = Controls(name='test_controls')
+        moves = []
+        move1 = lambda: moves.append(1)
+        move2 = lambda: moves.append(2)
+        p1 = c.add_control('v1_new', source=v1, move_command=move1)
+        r1 = c.add_readout('y1_new', source=y1, move_command=move2)
+        self.assertEqual(c.get_controls(), ['v1_new'])
+        self.assertEqual(c.get_readouts(), ['y1_new'])
+
+        # The index is updated when new parameters are added
+        p2 = c.add_control('v2_new', source=v2, move_command=move1)
+        self.assertEqual(c.get_controls(as_instance=True), [p1, p2])
+        self.assertEqual(c.get_all_parameters(as_instance=False), ['v1_new', 'y1_new', 'v2_new'])
+        self.assertEqual(c.get_control(p2, as_instance=False), 'v2_new')
+        self.assertRaises(KeyError, c.get_readout, 'v1_new')
+        self.assertRaises(KeyError, c.get_control, r1)
+
+        # Move commands are applied once per group
+        self.assertEqual(c._get_move_cmds([p1, 'v2_new']), [move1])
+        self.assertEqual(c._get_move_cmds(['y1_new', p1]), [move2, move1])
+        c.apply({p1: 1, p2: 2})
+        self.assertEqual(moves, [1])
+        c.readout()
+        self.assertEqual(moves, [1, 2])
+
+
+class Test_Sweep(unittest.TestCase):
+    def test_indices_for_sweep(self):
+        s = Sweep(name='test_sweep')
+        s.parameters['shape_of_sweep'].set([4, 3, 2])
+        expected = np.array([[i, j, k] for k in range(2) for j in range(3) for i in range(4)])
+
+        np.testing.assert_array_equal(s.get_indices_for_sweep(), expected)
+        self.assertEqual(s.get_number_of_sweep_points(), 24)
+        np.testing.assert_array_equal(np.array(list(s.iter_indices_for_sweep())), expected)
+        chunks = list(s.iter_index_chunks(chunk_size=10))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 4])
+        np.testing.assert_array_equal(np.concatenate(chunks), expected)
+        self.assertRaises(ValueError, lambda: list(s.iter_index_chunks(chunk_size=0)))
+
+        s.parameters['shape_of_sweep'].set([5])
+        np.testing.assert_array_equal(np.array(list(s.iter_indices_for_sweep())), [[0], [1], [2], [3], [4]])
+
+    def test_target_values(self):
+        s = Sweep(name='test_sweep')
+        s.measurement = Measurement()
+        g1 = Parameter('g1', set_cmd=None, get_cmd=None)
+        g2 = Parameter('g2', set_cmd=None, get_cmd=None)
+        n = Parameter('n', set_cmd=None, get_cmd=None, vals=vals.Ints())
+        instructions = [
+            [1, g1, np.linspace(0.0, -1.5, 4)],
+            [1, g2, np.linspace(0.0, -1.5, 4)],
+            [2, n, np.array([1, 2, 3])],
+            [2, g1, np.linspace(0.0, -0.3, 3)],  # offset of g1 in dim 2
+            [3, None, 2],  # repetition
+        ]
+        s.register_sweep_info(instructions, [y1])
+        s.parameters['shape_of_sweep'].set([4, 3, 2])
+        gates, counts, offsets = np.linspace(0.0, -1.5, 4), [1, 2, 3], np.linspace(0.0, -0.3, 3)
+        for i, j, k in s.iter_indices_for_sweep():
+            targets = s.get_target_values([i, j, k])
+            self.assertEqual([p for p, _ in targets], [g1, g2, n])
+            np.testing.assert_allclose([v for _, v in targets], [gates[i] + offsets[j], gates[i], counts[j]])
+        i, j = 2, 1
+        targets = dict(s.get_target_values([i, j, 0]))
+        self.assertAlmostEqual(targets[g1], -1.0 - 0.15)
+        self.assertAlmostEqual(targets[g2], -1.0)
+        self.assertEqual(targets[n], 2)
+        self.assertIsInstance(targets[n], np.integer)  # integer parameters keep their type
+
+
+class Test_LiveTracer(unittest.TestCase):
+    def test_ring_buffer(self):
+        buffer = RingBuffer(4)
+        for i in range(6):
+            buffer.append(i, 10 * i)
+        self.assertEqual(len(buffer), 4)
+        t, y = buffer.get()
+        np.testing.assert_array_equal(t, [2, 3, 4, 5])
+        np.testing.assert_array_equal(y, [20, 30, 40, 50])
+        np.testing.assert_array_equal(buffer.get(t_min=4)[0], [4, 5])
+        buffer.clear()
+        self.assertEqual(len(buffer.get()[0]), 0)
+        self.assertRaises(ValueError, RingBuffer, 0)
+
+    def test_decimate_minmax(self):
+        t = np.arange(1000.)
+        y = np.sin(t / 50)
+        y[333] = 5  # spike
+        td, yd = decimate_minmax(t, y, bins=50)
+        self.assertLessEqual(len(td), 100)
+        self.assertTrue(np.all(np.diff(td) >= 0))
+        self.assertEqual(np.max(yd), 5)
+        self.assertAlmostEqual(np.min(yd), np.min(y))
+        np.testing.assert_array_equal(decimate_minmax(t[:10], y[:10], bins=50)[1], y[:10])
+
+    def test_tracer(self):
+        import matplotlib
+        matplotlib.use('Agg')
+        values = iter(range(1000000))
+        tracer = LiveTracer([y1], lambda: [next(values)], window=1, interval=0.01, refresh_interval=0.05,
+                            max_points=20)
+        self.assertEqual(tracer.buffers[0].capacity, 101)
+        tracer.create_figure()
+        tracer.start()
+        time.sleep(0.3)
+        tracer.refresh()
+        tracer.stop()
+        self.assertFalse(tracer.running)
+        self.assertIsNone(tracer.error)
+        t, y = tracer.get_data(0)
+        self.assertGreater(len(t), 5)
+        np.testing.assert_array_equal(np.diff(y), 1)  # consecutive samples
+        self.assertLessEqual(len(tracer.lines[0].get_xdata()), 20)
+
+        tracer = LiveTracer([y1], lambda: 1 / 0, interval=0.01)
+        tracer.start()
+        time.sleep(0.05)
+        tracer.stop()
+        self.assertIsInstance(tracer.error, ZeroDivisionError)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -100,6 +100,41 @@ class TestDataset(TestData):
             self.assertEqual(ds.ndim, ndim)
 
 
+class TestLazyDataset(unittest.TestCase):
+    dataset_class = dataset.LazyDataset
+
+    def test_load(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return np.ones((10, 4))
+
+        ds = self.dataset_class(name='test', loader=loader, shape=(10, 4))
+        s = dataset.Axis('test', value=np.arange(10), dim=0)
+        ds.add_axis(s)
+        self.assertEqual(len(ds.axes), 3)
+        self.assertEqual(ds.ndim, 2)
+        self.assertFalse(ds.is_loaded)
+        self.assertEqual(len(calls), 0)
+        npt.assert_equal(ds.value, np.ones((10, 4)))
+        npt.assert_equal(ds.raw_value, np.ones((10, 4)))
+        self.assertTrue(ds.is_loaded)
+        self.assertEqual(len(calls), 1)
+
+    def test_set_value(self):
+        ds = self.dataset_class(name='test', loader=lambda: np.ones(3), shape=(3,))
+        ds.value = np.zeros(3)
+        self.assertTrue(ds.is_loaded)
+        npt.assert_equal(ds.value, np.zeros(3))
+
+    def test_copy(self):
+        ds = self.dataset_class(name='test', loader=lambda: np.arange(3), shape=(3,))
+        ds_copy = ds.copy()
+        self.assertTrue(ds_copy.is_loaded)
+        npt.assert_equal(ds_copy.value, np.arange(3))
+
+
 class TestStatic(TestData):
     dataset_class = dataset.Static
 
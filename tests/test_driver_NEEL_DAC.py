@@ -4,7 +4,7 @@ from qcodes import Parameter
 from qcodes import validators as vals
 
 from qube.measurement import Controls
-from qube.drivers.NEEL_DAC import Virtual_NEEL_DAC, NEEL_DAC_Sequencer
+from qube.drivers.NEEL_DAC import NEEL_DAC, Virtual_NEEL_DAC, NEEL_DAC_Sequencer
 
 V = Virtual_NEEL_DAC
 V.print_order = False
@@ -70,6 +70,81 @@ class Test_Virtual_NEEL_DAC(unittest.TestCase):
         # dac.move_all_to(vi)
         # npt.assert_equal(dac.get_values(precision=4), np.ones((len(l),dac.max_channels))*vi)
 
+    def test_bulk_values(self):
+        dac = V(
+            name='test_bulk_values',
+            bitfile='bitfile',
+            address='address',
+            panels=[1, 2],
+            delay_between_steps=1,
+        )
+        dac.p1.c2.v(-0.5)
+        dac.p2.c3.v(0.25)
+        values = dac.get_bulk_values([dac.p1.c2.v, dac.p2.c3.v, dac.panels])
+        self.assertEqual(values, {dac.p1.c2.v: -0.5, dac.p2.c3.v: 0.25, dac.panels: [1, 2]})
+
+        c = Controls('test_bulk_controls')
+        c.add_control('g1', source=dac.p1.c2.v, scale=2)
+        c.add_control('g2', source=dac.p2.c3.v)
+        self.assertEqual(c.get_control_values(), {'g1': -0.25, 'g2': 0.25})
+
+
+class _FakeRegister(object):
+    def __init__(self, name, log, read_values=None):
+        self.name = name
+        self.log = log
+        self.read_values = list(read_values) if read_values is not None else []
+        self.default = False
+
+    def write(self, value):
+        self.log.append((self.name, 'write', value))
+
+    def read(self):
+        value = self.read_values.pop(0) if self.read_values else self.default
+        self.log.append((self.name, 'read', value))
+        return value
+
+
+class _FakeSession(object):
+    def __init__(self, data):
+        self.log = []
+        self.registers = {
+            'get DAC value': _FakeRegister('get', self.log, read_values=[True]),  # one stale sequence
+            'got DAC value': _FakeRegister('got', self.log, read_values=[False, True, False]),
+            'DAC to retrieve': _FakeRegister('retrieve', self.log),
+            'DAC data': _FakeRegister('data', self.log, read_values=data),
+        }
+
+
+class Test_NEEL_DAC_Handshake(unittest.TestCase):
+    def test_read_channel_values(self):
+        dac = V(
+            name='test_handshake',
+            bitfile='bitfile',
+            address='address',
+            panels=[1, 2],
+            delay_between_steps=1,
+        )
+        res = 2 ** dac.bits_resolution
+        dac.ref = _FakeSession(data=[res, res + res // 2])  # 0 V and half of the voltage range
+        values = NEEL_DAC.read_channel_values(dac, [(1, 2), (2, 3)])  # real handshake, not the virtual values
+        self.assertEqual(values, [0., dac.voltage_range / 2])
+
+        log = dac.ref.log
+        cleanup = [('got', 'write', True), ('get', 'read', True), ('got', 'write', True), ('get', 'read', False)]
+        self.assertEqual(log[:4], cleanup)  # single cleanup of the stale sequence
+        self.assertEqual(sum(entry[0] == 'get' and entry[1] == 'read' for entry in log), 2)
+        starts = [i for i, entry in enumerate(log) if entry[0] == 'retrieve'] + [len(log)]
+        handshakes = [log[i:j] for i, j in zip(starts[:-1], starts[1:])]
+        self.assertEqual(len(handshakes), 2)
+        self.assertEqual(handshakes[1][3:5], [('got', 'read', True), ('got', 'read', False)])  # busy poll
+        for (panel, channel), handshake in zip([(1, 2), (2, 3)], handshakes):
+            self.assertEqual([entry[:2] for entry in handshake[:3]],
+                             [('retrieve', 'write'), ('got', 'write'), ('get', 'write')])
+            self.assertEqual(handshake[0][2], panel * dac.max_panels + channel)
+            self.assertEqual(handshake[-2][:2], ('data', 'read'))
+            self.assertEqual(handshake[-1], ('got', 'write', True))  # end of the sequence of the channel
+
 
 class Test_NEEL_DAC_Sequencer(unittest.TestCase):
     def test_defaults(self):
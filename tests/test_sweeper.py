@@ -1,11 +1,61 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
 import unittest
+import time
 
 import numpy as np
 import numpy.testing as npt
-from qcodes import Parameter, DelegateParameter, Measurement
+import qcodes as qc
+from qcodes import Parameter, DelegateParameter, Measurement, Instrument, load_by_id
+from qcodes import validators as vals
+from qcodes.dataset import initialise_or_create_database_at, load_or_create_experiment, load_last_experiment
 
-from qube.measurement.sweeper import SweepParameter, Sweeper
-from qube.measurement.sweeper import split_sweep_shape, is_qc_param
+from qube.measurement.parallel import group_by_instrument, get_root_instrument, GroupExecutor, set_parameters, \
+    snapshot_parameters
+from qube.measurement.sweeper import SweepParameter, SweepPlan, Sweeper
+from qube.measurement.adaptive import AdaptivePlan, gradient_loss, curvature_loss
+from qube.measurement.traversal import get_traversal_order, snake_order, get_travel
+from qube.measurement.hardware import HardwareFastAxis
+from qube.measurement.simulator import SweepSimulator, LatencyModel, to_latency_model
+from qube.measurement.profiler import ParameterProfiler, LatencyStats, load_latency_report, load_chrome_trace
+from qube.measurement.async_sweeper import AsyncSweeper
+from qube.measurement.scheduler import SweepQueue
+from qube.measurement.rules import SweepRule, RuleMonitor
+from qube.measurement.reduction import Reduction, to_reduction
+from qube.measurement.ramp import RAMP_TAG, RampPolicy, get_ramp_groups, ramp_parameters
+from qube.drivers.NEEL_DAC import Virtual_NEEL_DAC
+from qube.measurement.sweeper import split_sweep_shape, is_qc_param, Timer, WriteBuffer, PipelineWorker, \
+    validate_qc_param_values, CallbackThrottle
+from qube.measurement.content import SweeperContent
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """ Tests which execute sweeps in a temporary qcodes database """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._db_location = qc.config.core.db_location
+        cls._db_folder = tempfile.mkdtemp()
+        initialise_or_create_database_at(os.path.join(cls._db_folder, 'test.db'))
+        load_or_create_experiment('test', sample_name='test')
+
+    @classmethod
+    def tearDownClass(cls):
+        qc.config.core.db_location = cls._db_location
+        shutil.rmtree(cls._db_folder, ignore_errors=True)
+
+    @staticmethod
+    def load(run_id: int) -> SweeperContent:
+        return SweeperContent(load_by_id(run_id))
+
+    @staticmethod
+    def load_last() -> SweeperContent:
+        """ Content of the last dataset (ex: sweep interrupted by an error) """
+        return SweeperContent(load_last_experiment().last_data_set())
 
 
 class TestSweepParameter(unittest.TestCase):
@@ -72,6 +122,828 @@ class TestSweepParameter(unittest.TestCase):
             self.assertEqual(change, False)
 
 
+class TestSweepPlan(unittest.TestCase):
+    def test_same_as_instructions(self):
+        x1 = Parameter('x1', unit='V', set_cmd=None, get_cmd=None)
+        x2 = Parameter('x2', unit='V', set_cmd=None, get_cmd=None)
+        x3 = Parameter('x3', unit='V', set_cmd=None, get_cmd=None)
+        sw = Sweeper('Sweeper')
+        sw.sweep_linear(x1, 0, -1, dim=1)
+        sw.sweep_linear(x2, 0, 1, dim=2, refresh=True)
+        sw.sweep_linear(x3, 0, 2, dim=3)
+        sw.set_sweep_shape([3, 4, 5])
+
+        plan = sw.get_sweep_plan()
+        self.assertEqual(len(plan), 3 * 4 * 5)
+        expected = []
+        instrs = [sp.get_ordered_instructions() for sp in sw.sweep_parameters.values()]
+        for instr_i in zip(*instrs):
+            expected.append({param: value for param, value, change in instr_i if change})
+        self.assertEqual(list(plan), expected)
+        for i in [0, 1, 12, -1]:
+            self.assertEqual(plan[i], expected[i])
+
+    def test_slice_and_values(self):
+        x1 = Parameter('x1', unit='V', set_cmd=None, get_cmd=None)
+        x2 = Parameter('x2', unit='V', set_cmd=None, get_cmd=None)
+        sw = Sweeper('Sweeper')
+        sw.sweep_values(x1, [0, 1, 2], dim=1)
+        sw.sweep_values(x2, [5, 6], dim=2, apply=False)
+        sw.set_sweep_shape([3, 2])
+
+        plan = sw.get_sweep_plan()
+        npt.assert_equal(plan.get_values(x1), [0, 1, 2, 0, 1, 2])
+        npt.assert_equal(plan.get_values(x2), [5, 5, 5, 6, 6, 6])
+        npt.assert_equal(plan.get_changes(x2), [False] * 6)
+        sub = plan[2:4]
+        self.assertIsInstance(sub, SweepPlan)
+        self.assertEqual(list(sub), [{x1: 2}, {x1: 0}])
+        self.assertRaises(IndexError, plan.get_instruction, 6)
+
+    def test_only_repetitions(self):
+        sw = Sweeper('Sweeper')
+        sw.set_sweep_shape([3, 2])
+        self.assertEqual(list(sw.get_sweep_plan()), [{}] * 6)
+
+    def test_order(self):
+        x1 = Parameter('x1', unit='V', set_cmd=None, get_cmd=None)
+        x2 = Parameter('x2', unit='V', set_cmd=None, get_cmd=None)
+        sw = Sweeper('Sweeper')
+        sw.sweep_values(x1, [0, 1, 2], dim=1)
+        sw.sweep_values(x2, [5, 6], dim=2)
+        sw.set_sweep_shape([3, 2])
+        self.assertAlmostEqual(sw.get_sweep_plan().get_travel(), 4)
+
+        sw.set_sweep_order('snake')
+        plan = sw.get_sweep_plan()
+        npt.assert_equal(plan.get_order(), [0, 1, 2, 5, 4, 3])
+        self.assertEqual(list(plan), [{x1: 0, x2: 5}, {x1: 1}, {x1: 2}, {x2: 6}, {x1: 1}, {x1: 0}])
+        self.assertAlmostEqual(plan.get_travel(), 3)
+        npt.assert_equal(plan[3:].get_order(), [5, 4, 3])
+        npt.assert_equal(sw.get_sweep_plan()[3:].get_order(), [5, 4, 3])
+
+        sw.set_sweep_order([5, 4, 3, 2, 1, 0])
+        self.assertEqual(list(sw.get_sweep_plan())[:2], [{x1: 2, x2: 6}, {x1: 1}])
+        self.assertRaises(ValueError, sw.set_sweep_order, [0, 1, 2])
+        self.assertRaises(ValueError, sw.set_sweep_order, 'unknown')
+
+
+class TestTraversal(unittest.TestCase):
+    def test_snake(self):
+        npt.assert_equal(get_traversal_order([3, 2], 'raster'), np.arange(6))
+        npt.assert_equal(snake_order([2, 2, 2]), [0, 1, 3, 2, 6, 7, 5, 4])
+        npt.assert_equal(snake_order([2, 2, 2], dims=[1]), [0, 1, 3, 2, 4, 5, 7, 6])
+        self.assertRaises(ValueError, snake_order, [2, 2], dims=[3])
+
+    def test_curves(self):
+        shape = [4, 8, 2]
+        for order in ['snake', 'hilbert', 'zorder']:
+            canonical = get_traversal_order(shape, order)
+            npt.assert_equal(np.sort(canonical), np.arange(np.prod(shape)))
+        canonical = get_traversal_order([8, 8], 'hilbert')
+        ij = np.array(np.unravel_index(canonical, (8, 8), order='F'))
+        npt.assert_equal(np.abs(np.diff(ij, axis=1)).sum(axis=0), 1)  # always a single step
+        npt.assert_equal(get_traversal_order([2, 2], 'zorder'), [0, 1, 2, 3])
+        self.assertRaises(ValueError, get_traversal_order, [4], 'hilbert')
+
+    def test_travel(self):
+        self.assertEqual(get_travel([0, 1, 2, 0]), 4)
+        self.assertEqual(get_travel([0, 1, 2, 0], [True, False, True, True]), 4)
+        self.assertTrue(np.isnan(get_travel(['a', 'b'])))
+
+
+class TestAdaptivePlan(unittest.TestCase):
+    def _run(self, plan, func):
+        sparams = plan.sweep_parameters
+        for step, instr in enumerate(plan):
+            index = plan.order[step]
+            point = [sp.values[sp.get_value_index(index)] for sp in sparams]
+            plan.add_result(step, {'z': func(*point)})
+
+    def test_refinement(self):
+        x1 = Parameter('x1', unit='V', set_cmd=None, get_cmd=None)
+        x2 = Parameter('x2', unit='V', set_cmd=None, get_cmd=None)
+        sw = Sweeper('Sweeper')
+        sw.sweep_values(x1, np.arange(17), dim=1)
+        sw.sweep_values(x2, np.arange(9), dim=2)
+        sw.set_sweep_shape([17, 9])
+        step_func = lambda a, b: float(a > 10)
+
+        plan = AdaptivePlan(sw.sweep_parameters.values(), sw.sweep_shape, readout=lambda r: r['z'],
+                            initial_step=8, max_points=40)
+        self._run(plan, step_func)
+        self.assertEqual(len(plan.order), 40)
+        self.assertEqual(len(set(plan.order)), 40)
+        self.assertEqual(plan.order[:3], [0, 8, 16])  # coarse grid first
+        cols = np.array(plan.order) % 17
+        self.assertGreater(np.sum((cols > 8) & (cols < 16)), np.sum(cols < 8))  # refined around the step
+
+        plan = AdaptivePlan(sw.sweep_parameters.values(), sw.sweep_shape, readout=lambda r: r['z'], initial_step=3)
+        self._run(plan, step_func)
+        npt.assert_equal(np.sort(plan.get_order()), np.arange(17 * 9))  # no limit: full grid
+
+    def test_values_generated_once(self):
+        x1 = Parameter('x1', unit='V', set_cmd=None, get_cmd=None)
+        x2 = Parameter('x2', unit='V', set_cmd=None, get_cmd=None)
+        calls = []
+        sw = Sweeper('Sweeper')
+        sw.sweep_custom(x1, lambda pts: calls.append(pts) or np.arange(pts), dim=1)
+        sw.sweep_values(x2, np.arange(5), dim=2)
+        sw.set_sweep_shape([9, 5])
+        plan = AdaptivePlan(sw.sweep_parameters.values(), sw.sweep_shape, readout=lambda r: r['z'], initial_step=2)
+        n_calls = len(calls)
+        instrs = []
+        for step, instr in enumerate(plan):
+            instrs.append(instr)
+            plan.add_result(step, {'z': 0.})
+        self.assertEqual(len(calls), n_calls)
+        self.assertEqual(instrs[0], {x1: 0, x2: 0})
+        index = plan.order[1]
+        self.assertEqual(instrs[1][x1], sw.sweep_parameters[x1].get_value_index(index))
+
+    def test_losses(self):
+        points = np.array([[0, 0], [2, 0], [0, 2], [2, 2]])
+        self.assertAlmostEqual(gradient_loss(np.array([0, 1, 0, 1]), points), np.sqrt(8))
+        self.assertAlmostEqual(curvature_loss(np.array([0, 1, 2, 3]), points), 0)
+        self.assertGreater(curvature_loss(np.array([0, 0, 0, 1]), points), 0)
+        self.assertRaises(ValueError, AdaptivePlan, [], [], None, loss='unknown')
+
+    def test_sweeper_config(self):
+        x1 = Parameter('x1', unit='V', set_cmd=None, get_cmd=None)
+        sw = Sweeper('Sweeper')
+        sw.sweep_values(x1, np.arange(5), dim=1)
+        sw.set_sweep_shape([5])
+        self.assertRaises(ValueError, sw.get_adaptive_plan)
+        sw.set_adaptive(max_points=3)
+        self.assertRaises(ValueError, sw.get_adaptive_plan)  # no readout
+        sw.set_readouts(x1)
+        plan = sw.get_adaptive_plan()
+        self.assertEqual(plan.readout, x1)
+        self.assertEqual(len(plan), 3)
+        sw.set_adaptive(enable=False)
+        self.assertIsNone(sw.adaptive)
+        self.assertRaises(ValueError, sw.set_adaptive, max_points=0)
+
+
+class _FakeDAQ(object):
+    def __init__(self):
+        self.trigger_mode = Parameter('trigger_mode', set_cmd=None, initial_value='free')
+        self.acquire_points = Parameter('acquire_points', set_cmd=None, initial_value=2)
+        self.average_time = Parameter('average_time', set_cmd=None, initial_value=1)
+        self.calls = []
+
+    def prepare_array_measurement(self):
+        self.calls.append('prepare')
+
+    def run_array_measurement(self):
+        self.calls.append('run')
+
+
+class TestHardwareFastAxis(unittest.TestCase):
+    def test_program(self):
+        Virtual_NEEL_DAC.print_order = False
+        dac = Virtual_NEEL_DAC(name='test_fast_axis', bitfile='bitfile', address='address', panels=[1],
+                               delay_between_steps=1)
+        daq = _FakeDAQ()
+        fast = HardwareFastAxis(dac.sequencer, [daq], point_time=0.5)
+        fast.program(3, [dac.p1.c1.v], [[0, 0.1, 0.2]])
+        orders = dac.sequencer.orders
+        self.assertEqual(orders[1][1], 0)
+        self.assertEqual(orders[2], ['trigger', [1, 0, 0, 0, 0]])
+        self.assertEqual(orders[3], ['wait', 0.5])
+        self.assertEqual(orders[4], ['trigger', [0, 0, 0, 0, 0]])
+        self.assertEqual(orders[9][1], 0.2)
+        self.assertEqual(orders[-1][0], 'jump')
+        self.assertEqual(len(orders), 1 + 3 * 4 + 1)
+        self.assertEqual((daq.trigger_mode(), daq.acquire_points(), daq.average_time()), ('ramp', 3, 0.5))
+        fast.acquire()
+        self.assertEqual(daq.calls, ['prepare', 'run'])
+        self.assertRaises(ValueError, fast.program, 1, [], [])
+        self.assertRaises(ValueError, fast.program, fast.get_max_points(1) + 1, [dac.p1.c1.v],
+                          [np.zeros(fast.get_max_points(1) + 1)])
+        self.assertRaises(ValueError, HardwareFastAxis, dac.sequencer, [])
+        dac.close()
+
+    def test_sweeper(self):
+        x1 = Parameter('x1', unit='V', set_cmd=None, get_cmd=None)
+        x2 = Parameter('x2', unit='V', set_cmd=None, get_cmd=None)
+        x3 = Parameter('x3', unit='V', set_cmd=None, get_cmd=None)
+        sw = Sweeper('Sweeper')
+        sw.sweep_values(x1, [0, 1, 2, 3], dim=1)
+        sw.sweep_values(x2, [10, 20, 30], dim=2)
+        sw.sweep_values(x3, [-1, -2], dim=3)
+        sw.set_sweep_shape([4, 3, 2])
+        self.assertRaises(ValueError, sw.set_fast_axis)
+        sw.set_fast_axis(object(), [_FakeDAQ()])
+        npt.assert_equal(sw.get_saved_sweep_shape(), [3, 2])
+        sweep_parameters, sweep_shape = sw.get_stepped_sweep()
+        self.assertEqual([sp.parameter for sp in sweep_parameters], [x2, x3])
+        self.assertEqual([sp.dim for sp in sweep_parameters], [1, 2])
+        self.assertEqual(sw.sweep_parameters[x2].dim, 2)  # original parameters are not modified
+        plan = sw.get_sweep_plan()
+        self.assertEqual(len(plan), 6)
+        self.assertEqual(plan[0], {x2: 10, x3: -1})
+        self.assertEqual(plan[3], {x2: 10, x3: -2})
+        sw.set_sweep_order('snake')
+        npt.assert_equal(sw.get_sweep_plan().get_order(), [0, 1, 2, 5, 4, 3])
+        sw.set_adaptive(max_points=2)
+        self.assertRaises(ValueError, sw.get_adaptive_plan)
+        sw.set_fast_axis(enable=False)
+        self.assertIsNone(sw.fast_axis)
+        self.assertEqual(len(sw.get_sweep_plan()), 24)
+
+
+class TestSweepSimulator(unittest.TestCase):
+    def test_latency_model(self):
+        rng = np.random.default_rng(0)
+        npt.assert_equal(LatencyModel(0.1).sample(3, rng), [0.1, 0.1, 0.1])
+        npt.assert_allclose(LatencyModel(0.1, per_unit=2).sample(2, rng, np.array([0, 0.5])), [0.1, 1.1])
+        self.assertTrue(np.all(LatencyModel(0.1, std=1).sample(100, rng) >= 0))
+        model = to_latency_model([0.1, 0.3])
+        self.assertAlmostEqual(model.mean, 0.2)
+        self.assertTrue(set(model.sample(10, rng)) <= {0.1, 0.3})
+        timer = Timer()
+        [timer.add(v) for v in [0.5, 0.5]]
+        self.assertEqual(to_latency_model(timer).mean, 0.5)
+        self.assertEqual(to_latency_model(2).mean, 2)
+
+    def test_simulate(self):
+        x1 = Parameter('x1', unit='V', set_cmd=None, get_cmd=None)
+        x2 = Parameter('x2', unit='V', set_cmd=None, get_cmd=None)
+        r = Parameter('r', set_cmd=None, get_cmd=None)
+        x2.post_delay = 0.5
+        sw = Sweeper('Sweeper')
+        sw.sweep_values(x1, [0, 1, 2], dim=1)
+        sw.sweep_values(x2, [0, 1], dim=2)
+        sw.set_sweep_shape([3, 2])
+        sw.set_readouts(r)
+        sw.pre_readout_wait = 0.1
+        sw.set_start_at({x1: 0})
+        sim = SweepSimulator(sw, set_latency={x1: 1, x2: 2}, get_latency=0.2, save_latency=0.01)
+        report = sim.simulate()
+        self.assertEqual(report['steps'], 6)
+        self.assertAlmostEqual(report['apply'], 6 * 1 + 2 * 2 + 1)  # x1 at each step, x2 twice, start_at
+        self.assertAlmostEqual(report['readout'], 6 * 0.2)
+        self.assertAlmostEqual(report['save'], 6 * 0.01)
+        self.assertAlmostEqual(report['settle'], 2 * 0.5 + 6 * 0.1)
+        self.assertAlmostEqual(report['total'], sum(report[k] for k in sim.report_keys))
+
+        # Travel dependent latency: snake avoids the jumps back to the first value of x1
+        sim = SweepSimulator(sw, set_latency=LatencyModel(0, per_unit=1))
+        reports = sim.compare_orders(['raster', 'snake', 'hilbert'])
+        self.assertAlmostEqual(reports['raster']['apply'], 6 + 1)
+        self.assertAlmostEqual(reports['snake']['apply'], 4 + 1)
+        self.assertEqual(set(reports.keys()), {'raster', 'snake', 'hilbert'})
+
+        sw.set_adaptive(max_points=4)
+        self.assertEqual(sim.simulate()['steps'], 4)
+
+    def test_ramps(self):
+        i1 = Instrument('sim_i1')
+        i2 = Instrument('sim_i2')
+        try:
+            [i1.add_parameter(name, set_cmd=None, get_cmd=None, initial_value=0) for name in ['a', 'b']]
+            i2.add_parameter('c', set_cmd=None, get_cmd=None, initial_value=0)
+            i2.c.metadata[RAMP_TAG] = {'max_step': 0.5, 'step_delay': 1}  # see Controls.set_ramp
+            sw = Sweeper('Sweeper')
+            sw.sweep_values(i1.a, [0, 1, 0], dim=1)
+            sw.sweep_values(i1.b, [0, 0.5, 0], dim=1)
+            sw.sweep_values(i2.c, [0, 2, 2], dim=1)
+            sw.set_sweep_shape([3])
+            sw.set_ramp(i1.a, max_step=0.25, step_delay=0.1)
+            sw.set_ramp(i1.b, max_step=0.1, step_delay=0.2)
+            sim = SweepSimulator(sw)
+            # i1 in lock-step: 5 steps of b with the step_delay of b (0.8 s) at steps 1 and 2. i2: 4 steps (3 s)
+            self.assertAlmostEqual(sim.simulate()['apply'], 2 * 0.8 + 3)
+            sw.set_apply_method(sw.concurrent_apply)
+            self.assertAlmostEqual(sim.simulate()['apply'], 3 + 0.8)  # instruments ramped in parallel
+            sw.set_start_at({i2.c: 2})
+            self.assertAlmostEqual(sim.simulate()['apply'], 3 + 3 + 0.8)  # the first step ramps down from start_at
+            sw.clear_ramps()
+            self.assertAlmostEqual(sim.simulate()['apply'], 3 + 3)  # only the ramp of the control
+        finally:
+            i1.close()
+            i2.close()
+
+
+class _FakeDataset(object):
+    def __init__(self):
+        self.run_id = 1
+        self.metadata = {}
+
+    def add_metadata(self, tag, metadata):
+        self.metadata[tag] = metadata
+
+
+class TestParameterProfiler(DatabaseTestCase):
+    def test_latency_stats(self):
+        stats = LatencyStats(reservoir_size=10)
+        [stats.add(v) for v in range(100)]
+        self.assertEqual(stats.count, 100)
+        self.assertEqual(stats.mean, 49.5)
+        self.assertEqual((stats.min, stats.max), (0, 99))
+        self.assertEqual(len(stats.values), 10)
+        counts, edges = stats.histogram(bins=5)
+        self.assertEqual(counts.sum(), 10)
+
+    def test_profile(self):
+        x1 = Parameter('x1', unit='V', set_cmd=None, get_cmd=None, initial_value=0)
+        r = Parameter('r', get_cmd=lambda: time.sleep(0.002) or 1)
+        set_x1 = x1.set
+        with ParameterProfiler([x1, r, x1], max_events=5) as profiler:
+            self.assertTrue(profiler.active)
+            [x1(v) for v in range(3)]
+            self.assertEqual(r(), 1)
+        self.assertFalse(profiler.active)
+        self.assertIs(x1.set, set_x1)  # original methods are restored
+        r()  # not recorded
+        report = profiler.get_report()
+        self.assertEqual(report['x1']['set']['count'], 3)
+        self.assertEqual(report['r']['get']['count'], 1)
+        self.assertGreaterEqual(report['r']['get']['mean'], 0.002)
+        self.assertEqual(profiler.get_slowest(1)[0][:2], ['r', 'get'])
+        self.assertRaises(KeyError, profiler.get_stats, x1, 'get')
+
+        trace = profiler.to_chrome_trace()
+        self.assertEqual(len(trace['traceEvents']), 4)
+        event = trace['traceEvents'][-1]
+        self.assertEqual((event['name'], event['cat'], event['ph']), ('r', 'get', 'X'))
+        self.assertGreaterEqual(event['dur'], 2000)  # us
+
+        ds = _FakeDataset()
+        self.assertRaises(ValueError, load_latency_report, ds)
+        profiler.save(ds)
+        self.assertEqual(load_latency_report(ds)['x1']['set']['count'], 3)
+        self.assertRaises(ValueError, load_chrome_trace, ds)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'trace.json')
+            profiler.save(ds, trace_path=path)
+            self.assertEqual(ds.metadata['sweep_trace'], path)  # only the path is saved in the metadata
+            self.assertEqual(len(load_chrome_trace(ds)['traceEvents']), 4)
+
+    def test_latency_stats_std(self):
+        stats = LatencyStats(reservoir_size=10)
+        values = np.random.default_rng(0).uniform(0, 1, 100)
+        [stats.add(v) for v in values]
+        self.assertAlmostEqual(stats.to_dict()['std'], np.std(values))  # all the latencies, not the reservoir
+
+    def test_sweep_trace_file(self):
+        x1 = Parameter('x1', set_cmd=None, get_cmd=None, initial_value=0)
+        r = Parameter('r', get_cmd=lambda: x1())
+        sw = Sweeper('Sweeper')
+        sw.sweep_linear(x1, 0, 1, dim=1)
+        sw.set_config(sweep_shape=[4], readouts=[r], show_progress_bar=False)
+        sw.set_profiling(True)
+        ds = load_by_id(sw.execute())
+        self.assertEqual(load_latency_report(ds)['r']['get']['count'], 4)
+        self.assertTrue(ds.metadata['sweep_trace'].endswith(f'{ds.guid}_trace.json'))
+        self.assertEqual(len(load_chrome_trace(ds)['traceEvents']), len(sw.profiler.events))
+
+    def test_sweeper_config(self):
+        sw = Sweeper('Sweeper')
+        self.assertFalse(sw.profile)
+        self.assertRaises(ValueError, sw.get_latency_report)
+        sw.set_profiling(True, trace=False, max_events=10)
+        self.assertEqual((sw.profile, sw.profile_trace, sw.profile_max_events), (True, False, 10))
+        self.assertRaises(ValueError, sw.set_profiling, max_events=-1)
+        sw.reset()
+        self.assertFalse(sw.profile)
+
+
+class TestAsyncSweeper(unittest.TestCase):
+    def test_methods(self):
+        i1 = Instrument('async_i1')
+        i2 = Instrument('async_i2')
+        try:
+            i1.add_parameter('r', get_cmd=lambda: time.sleep(0.1) or 1)
+            i2.add_parameter('r', get_cmd=lambda: time.sleep(0.1) or 2)
+            i1.add_parameter('v', set_cmd=None, get_cmd=None, initial_value=0)
+            sw = AsyncSweeper('Sweeper')
+            t0 = time.perf_counter()
+            values = sw.readout_method([i2.r, i1.r])
+            self.assertLess(time.perf_counter() - t0, 0.19)  # instruments are readout concurrently
+            self.assertEqual(values, {i2.r: 2, i1.r: 1})
+            self.assertEqual(list(values.keys()), [i2.r, i1.r])
+            self.assertEqual(set(sw._group_timers.keys()), {'readout[async_i1]', 'readout[async_i2]'})
+            sw.apply_method({i1.v: 3})
+            self.assertEqual(i1.v(), 3)
+
+            async def readout(params):
+                await asyncio.sleep(0)
+                return {p: 10 for p in params}
+
+            sw.set_readout_method(readout)
+            self.assertEqual(sw.readout_method([i1.r]), {i1.r: 10})
+            sw.set_readout_method(sw.default_readout)  # synchronous methods are also valid
+            self.assertEqual(sw.readout_method([i1.r]), {i1.r: 1})
+            sw.reset()
+            self.assertEqual(sw.async_readout_method, sw.async_readout)
+            self.assertRaises(ValueError, sw.set_callback_queue_size, 0)
+        finally:
+            i1.close()
+            i2.close()
+
+
+class TestSweepQueue(DatabaseTestCase):
+    def _make_sweeper(self, v, start, stop, name):
+        sw = Sweeper(name)
+        sw.sweep_linear(v, start, stop, dim=1)
+        sw.set_sweep_shape([5])
+        return sw
+
+    def test_order(self):
+        v = Parameter('v', set_cmd=None, get_cmd=None, initial_value=0)
+        sw1 = self._make_sweeper(v, 1, 2, 'sw1')
+        sw2 = self._make_sweeper(v, 0, 1, 'sw2')
+        sw3 = self._make_sweeper(v, 2, 3, 'sw3')
+        queue = SweepQueue([sw1, sw2, sw3])
+        self.assertEqual(queue.get_start_config(sw1), {v: 1})
+        self.assertEqual(queue.get_end_config(sw1), {v: 2})
+        sw1.set_config(return_to={v: 0})
+        self.assertEqual(queue.get_end_config(sw1), {v: 0})
+        sw1.set_config(return_to={})
+        self.assertEqual(queue.get_order(), [1, 0, 2])  # starts from the cached value 0
+        self.assertAlmostEqual(queue.get_transition_travel(), 0)
+        self.assertGreater(queue.get_transition_travel([0, 1, 2]), 0)
+        queue.optimize_order = False
+        self.assertEqual(queue.get_order(), [0, 1, 2])
+        self.assertRaises(TypeError, queue.add, 'sw4')
+
+    def test_report(self):
+        queue = SweepQueue()
+        report = queue.get_report()
+        self.assertEqual(report['points'], 0)
+        self.assertTrue(np.isnan(report['points_per_hour']))
+        queue._runs = [{'points': 1800}, {'points': 1800}]
+        queue._elapsed = 60
+        self.assertAlmostEqual(queue.get_report()['points_per_hour'], 3600 * 60)
+
+    def test_run_skipped_transitions(self):
+        x = Parameter('x', set_cmd=None, get_cmd=None, initial_value=0)
+        z = Parameter('z', set_cmd=None, get_cmd=None, initial_value=0)
+        r = Parameter('r', get_cmd=lambda: z())  # value of z seen at each step
+        sw1 = self._make_sweeper(x, 0, 1, 'sw1')
+        sw1.set_config(readouts=[r], start_at={z: 1}, return_to={z: 0}, show_progress_bar=False)
+        sw2 = self._make_sweeper(x, 0, 1, 'sw2')
+        sw2.set_config(readouts=[r], start_at={z: 0}, show_progress_bar=False)
+        queue = SweepQueue([sw1, sw2], optimize_order=False, skip_transitions=True)
+        run_ids = queue.run()
+        runs = queue.get_report()['runs']
+        self.assertEqual(runs[0]['skipped_return_to'], ['z'])
+        self.assertEqual(runs[1]['skipped_start_at'], [])  # return_to of sw1 was not applied
+        npt.assert_equal(self.load(run_ids[0]).datasets[0].value, np.ones(5))
+        npt.assert_equal(self.load(run_ids[1]).datasets[0].value, np.zeros(5))
+        self.assertEqual(z(), 0)
+
+
+class TestSweepRules(unittest.TestCase):
+    def test_rule(self):
+        r = Parameter('r', get_cmd=None)
+        rule = SweepRule((r, '>', 1), 'abort', consecutive=2)
+        self.assertFalse(rule.check({r: 2}))
+        self.assertFalse(rule.check({r: 0}))
+        self.assertFalse(rule.check({r: 2}))
+        self.assertTrue(rule.check({r: 2}))
+        self.assertTrue(SweepRule((r, '<', 0), 'abort').check({r: np.array([1, -1])}))  # any element
+        self.assertTrue(SweepRule(lambda res: res[r] == 3, 'skip').check({r: 3}))
+        self.assertRaises(ValueError, SweepRule, (r, '=>', 1))
+        self.assertRaises(ValueError, SweepRule, (r, '>', 1), 'stop')
+        self.assertRaises(ValueError, SweepRule, (r, '>', 1), 'skip', dim=0)
+
+    def test_monitor(self):
+        x = Parameter('x', set_cmd=None)
+        y = Parameter('y', set_cmd=None)
+        r = Parameter('r', get_cmd=None)
+        sw = Sweeper('Sweeper')
+        sw.sweep_values(x, [0, 1, 2], dim=1)
+        sw.sweep_values(y, [5, 6], dim=2)
+        sw.set_sweep_shape([3, 2])
+        plan = sw.get_sweep_plan()
+        monitor = RuleMonitor([SweepRule((r, '==', 1), 'skip', dim=1)], order=plan.get_order(), sweep_shape=[3, 2])
+        steps = []
+        for i, instr in monitor.iterate(plan):
+            steps.append(instr)
+            if instr is not None:
+                monitor.check(i, {r: i})
+        self.assertEqual(steps, [{x: 0, y: 5}, {x: 1}, None, {x: 0, y: 6}, {x: 1}, {x: 2}])
+        self.assertEqual(monitor.events[0]['step'], 1)
+        self.assertTrue(np.isnan(monitor.get_skipped_results()[r]))
+
+        monitor = RuleMonitor([SweepRule((r, '==', 1), 'abort')])
+        steps = []
+        for i, instr in monitor.iterate(plan):
+            steps.append(i)
+            monitor.check(i, {r: i})
+        self.assertEqual(steps, [0, 1])
+        self.assertTrue(monitor.aborted)
+        self.assertRaises(ValueError, RuleMonitor, [SweepRule((r, '==', 1), 'skip')])
+
+
+class TestReduction(unittest.TestCase):
+    def test_reductions(self):
+        raw = np.arange(10.)
+        npt.assert_equal(to_reduction('mean')(raw), [4.5])
+        red = to_reduction('decimate', factor=3)
+        npt.assert_equal(red(raw), [0, 3, 6, 9])
+        npt.assert_equal(red.get_axis_values(), [0, 3, 6, 9])
+        red = to_reduction('boxcar', width=4)
+        npt.assert_equal(red(raw), [1.5, 5.5])
+        npt.assert_equal(red.get_axis_values(), [1.5, 5.5])
+        red = to_reduction('envelope', width=5)
+        npt.assert_equal(red(raw), [0, 4, 5, 9])
+        npt.assert_equal(red.get_axis_values(), [2, 2, 7, 7])
+        red = to_reduction('histogram', bins=2)
+        npt.assert_equal(red(raw), [5, 5])
+        npt.assert_equal(red(raw + 5), [0, 5])  # range of the first step
+        npt.assert_equal(red.get_axis_values(), [2.25, 6.75])
+        red = to_reduction(lambda v: v[:2])
+        npt.assert_equal(red(raw), [0, 1])
+        self.assertTrue(np.all(np.isnan(red(np.full(10, np.nan)))))  # skipped steps
+        self.assertRaises(ValueError, red, np.arange(5.))
+        self.assertRaises(ValueError, to_reduction, 'median')
+        self.assertRaises(ValueError, to_reduction, 'boxcar', width=0)
+
+    def test_recipe(self):
+        red = to_reduction('histogram', bins=4, range=(0, 1))
+        red(np.linspace(0, 1, 20))
+        copy = Reduction.from_dict(json.loads(red.to_json()))
+        self.assertEqual(copy.name, 'histogram')
+        self.assertEqual(copy.raw_size, 20)
+        npt.assert_equal(copy.get_axis_values(), red.get_axis_values())
+
+    def test_sweeper(self):
+        r = Parameter('r', get_cmd=None)
+        sw = Sweeper('Sweeper')
+        sw.set_reduction(r, 'boxcar', width=10, raw=True)
+        self.assertEqual(sw.raw_readouts, [r])
+        sw.set_reduction(r, 'mean')
+        self.assertEqual(sw.raw_readouts, [])
+        self.assertEqual(sw._reduce_results(0, {r: np.ones(4)})[r], [1])
+        sw.reset()
+        self.assertEqual(sw.reductions, {})
+
+
+class TestRamp(unittest.TestCase):
+    def test_ramp_policy(self):
+        policy = RampPolicy(max_step=0.1, step_delay=0.01)
+        self.assertEqual(policy.get_steps(0, 0.05), 1)
+        self.assertEqual(policy.get_steps(0, 0.3), 3)
+        npt.assert_allclose(policy.get_ramp(0, -0.3), [-0.1, -0.2])
+        self.assertAlmostEqual(policy.get_duration(0, 0.3), 0.02)
+        policy = RampPolicy(max_rate=2)
+        self.assertAlmostEqual(policy.max_step, 0.02)
+        self.assertAlmostEqual(policy.step_delay, 0.01)
+        policy = RampPolicy(max_step=0.1, max_rate=2)
+        self.assertAlmostEqual(policy.step_delay, 0.05)
+        self.assertEqual(repr(RampPolicy.from_dict(policy.to_dict())), repr(policy))
+        self.assertRaises(ValueError, RampPolicy)
+        self.assertRaises(ValueError, RampPolicy, max_step=-1)
+
+    def test_lock_step(self):
+        ins1 = Instrument('test_ramp_ins1')
+        ins2 = Instrument('test_ramp_ins2')
+        try:
+            sets = []
+            for ins in [ins1, ins2]:
+                for name in ['a', 'b']:
+                    ins.add_parameter(name, set_cmd=lambda v, n=f'{ins.name}.{name}': sets.append((n, v)),
+                                      get_cmd=None, initial_value=0)
+            sets.clear()
+            policies = {ins1.a: RampPolicy(0.1, 0.01), ins1.b: RampPolicy(0.5, 0.02), ins2.a: RampPolicy(1)}
+            items = [(ins1.a, 0.4), (ins1.b, -1), (ins2.a, 0.5), (ins2.b, 10)]
+            groups = get_ramp_groups(items, policies)
+            self.assertEqual(list(groups.keys()), [ins1])  # ins2.a does not need steps, ins2.b has no policy
+            params, values, delay = groups[ins1]
+            self.assertEqual(params, [ins1.a, ins1.b])
+            npt.assert_allclose(values, [[0.1, -0.25], [0.2, -0.5], [0.3, -0.75]])  # same number of steps
+            self.assertEqual(delay, 0.02)
+
+            t0 = time.perf_counter()
+            durations = ramp_parameters(items, policies, executor=GroupExecutor())
+            self.assertGreaterEqual(time.perf_counter() - t0, 0.06)
+            self.assertEqual(list(durations.keys()), [ins1])
+            self.assertEqual([n for n, v in sets], ['test_ramp_ins1.a', 'test_ramp_ins1.b'] * 3)
+            self.assertAlmostEqual(ins1.a.cache.get(), 0.3)  # the target is set by the apply method
+        finally:
+            ins1.close()
+            ins2.close()
+
+
+class TestTimer(unittest.TestCase):
+    def test_statistics(self):
+        laps = np.random.default_rng(0).uniform(0, 1, 500)
+        t = Timer(reservoir_size=1000)
+        self.assertTrue(np.isnan(t.mean))
+        for lap in laps:
+            t.add(lap)
+        self.assertEqual(t.count, laps.size)
+        self.assertEqual(t.last_value, laps[-1])
+        self.assertAlmostEqual(t.sum, np.sum(laps))
+        self.assertAlmostEqual(t.mean, np.mean(laps))
+        self.assertAlmostEqual(t.std, np.std(laps))
+        self.assertEqual(t.min, np.min(laps))
+        self.assertEqual(t.max, np.max(laps))
+        self.assertAlmostEqual(t.percentile(95), np.percentile(laps, 95))
+        t.reset()
+        self.assertEqual(t.count, 0)
+        self.assertEqual(t.values, [])
+
+    def test_reservoir(self):
+        t = Timer(reservoir_size=10)
+        for lap in range(1000):
+            t.add(lap)
+        self.assertEqual(len(t.values), 10)
+        self.assertEqual(t.count, 1000)
+        self.assertAlmostEqual(t.mean, 499.5)
+
+
+class _FakeDatasaver(object):
+    def __init__(self):
+        self.calls = []
+
+    def add_result(self, *res_tuple):
+        self.calls.append(res_tuple)
+
+
+class TestWriteBuffer(unittest.TestCase):
+    def test_direct(self):
+        ds = _FakeDatasaver()
+        wb = WriteBuffer(ds, size=1)
+        wb.add_result(('y1', 1))
+        self.assertEqual(ds.calls, [(('y1', 1),)])
+
+    def test_bulk(self):
+        ds = _FakeDatasaver()
+        wb = WriteBuffer(ds, size=3, paramtypes={'y1': 'numeric', 'y2': 'array'})
+        wb.add_result(('y1', 1), ('y2', np.array([1, 2])))
+        wb.add_result(('y1', 2), ('y2', np.array([3, 4])))
+        self.assertEqual(ds.calls, [])
+        self.assertEqual(len(wb), 2)
+        wb.add_result(('y1', 3), ('y2', np.array([5, 6])))
+        self.assertEqual(len(wb), 0)
+        self.assertEqual(len(ds.calls), 4)  # 1 bulk call for y1 and 3 calls for y2
+        name, value = ds.calls[0][0]
+        self.assertEqual(name, 'y1')
+        npt.assert_equal(value, [1, 2, 3])
+        npt.assert_equal(ds.calls[3][0][1], [5, 6])
+
+        wb.add_result(('y1', 4), ('y2', np.array([7, 8])))
+        wb.flush()
+        self.assertEqual(len(ds.calls), 6)
+
+
+class TestPipelineWorker(unittest.TestCase):
+    def test_order(self):
+        worker = PipelineWorker(lambda i: i ** 2, [[i] for i in range(100)], maxsize=3)
+        worker.start()
+        self.assertEqual(list(worker), [i ** 2 for i in range(100)])
+
+    def test_error(self):
+        def f(i):
+            if i == 5:
+                raise RuntimeError('error at 5')
+            return i
+
+        worker = PipelineWorker(f, [[i] for i in range(10)], maxsize=2)
+        worker.start()
+        outputs = []
+        with self.assertRaises(RuntimeError):
+            for output in worker:
+                outputs.append(output)
+        self.assertEqual(outputs, [0, 1, 2, 3, 4])
+
+    def test_stop(self):
+        worker = PipelineWorker(lambda i: i, [[i] for i in range(100)], maxsize=5)
+        worker.start()
+        outputs = []
+        for output in worker:
+            outputs.append(output)
+            if output == 10:
+                break
+        pending = worker.stop()
+        self.assertEqual(outputs + pending, list(range(len(outputs) + len(pending))))
+
+
+class TestCallbackThrottle(unittest.TestCase):
+    def test_every(self):
+        throttle = CallbackThrottle(every=3, total_pts=10)
+        ready = [i for i in range(10) if throttle.ready(i)]
+        self.assertEqual(ready, [2, 5, 8, 9])  # the last step is always executed
+
+    def test_interval_and_flush(self):
+        throttle = CallbackThrottle(every=None, interval=0.05, total_pts=100)
+        self.assertFalse(throttle.ready(0))
+        throttle.hold('step 0')
+        time.sleep(0.06)
+        self.assertTrue(throttle.ready(1))
+        self.assertIsNone(throttle.flush())  # executed steps are not pending
+        self.assertFalse(throttle.ready(2))
+        throttle.hold('step 2')
+        self.assertEqual(throttle.flush(), ('step 2',))
+
+    def test_sweeper(self):
+        sw = Sweeper('Sweeper')
+        self.assertRaises(ValueError, sw.set_callback_rate, every=0)
+        self.assertRaises(ValueError, sw.set_callback_rate, every=None)
+        self.assertRaises(ValueError, sw.set_progress_bar, 'gui')
+        sw.set_progress_bar(None)
+        sw.set_config(note='no change of the progress bar')
+        self.assertFalse(sw.show_progress_bar)
+        d1 = sw._generate_callback_dict(0, {}, {'loop_i': 1})
+        d2 = sw._generate_callback_dict(1, {}, {'loop_i': 2})
+        self.assertIs(d1, d2)  # reused payload
+        self.assertEqual(d2['index'], 1)
+        self.assertEqual(d2['timings']['loop_i'], 2)
+        sw.add_callback(print)
+        sw.clear_callbacks()
+        self.assertEqual(sw._callback_methods, [])
+
+
+class TestParallel(unittest.TestCase):
+    def test_group_by_instrument(self):
+        ins1 = Instrument('test_group_ins1')
+        ins2 = Instrument('test_group_ins2')
+        try:
+            ins1.add_parameter('a', set_cmd=None, get_cmd=None)
+            ins1.add_parameter('b', set_cmd=None, get_cmd=None)
+            ins2.add_parameter('a', set_cmd=None, get_cmd=None)
+            a1, b1, a2 = ins1.a, ins1.b, ins2.a
+            d2 = DelegateParameter('d2', source=a2)
+            x = Parameter('x', set_cmd=None, get_cmd=None)
+            self.assertEqual(get_root_instrument(d2), ins2)
+            self.assertEqual(get_root_instrument(x), None)
+            groups = group_by_instrument([b1, d2, x, a1])
+            self.assertEqual(list(groups.keys()), [ins1, ins2, None])
+            self.assertEqual(groups[ins1], [b1, a1])
+            self.assertEqual(groups[ins2], [d2])
+            groups = group_by_instrument([(b1, 0), (a2, 1)], key=lambda kv: kv[0])
+            self.assertEqual(groups[ins2], [(a2, 1)])
+        finally:
+            ins1.close()
+            ins2.close()
+
+    def test_group_executor(self):
+        executor = GroupExecutor()
+        outputs, durations = executor.map(sum, {'a': [1, 2], 'b': [3, 4], 'c': [5]})
+        self.assertEqual(outputs, {'a': 3, 'b': 7, 'c': 5})
+        self.assertEqual(set(durations.keys()), {'a', 'b', 'c'})
+        self.assertRaises(TypeError, executor.map, sum, {'a': [1], 'b': ['x']})
+        executor.shutdown()
+
+    def test_set_parameters(self):
+        ins1 = Instrument('test_group_ins1')
+        ins2 = Instrument('test_group_ins2')
+        executor = GroupExecutor()
+        try:
+            order = []
+            ins1.add_parameter('a', set_cmd=lambda v: order.append(('a1', v)), post_delay=0.05)
+            ins1.add_parameter('b', set_cmd=lambda v: order.append(('b1', v)))
+            ins2.add_parameter('a', set_cmd=lambda v: order.append(('a2', v)), post_delay=0.1)
+            items = [(ins1.b, 1), (ins2.a, 2), (ins1.a, 3)]
+            self.assertAlmostEqual(set_parameters([(ins1.a, 0)], skip_post_delay=True), 0.05)
+            self.assertEqual(ins1.a.post_delay, 0.05)
+
+            order.clear()
+            durations = executor.set_parameters(items)
+            self.assertEqual(set(durations.keys()), {ins1, ins2})
+            group1 = [o for o in order if o[0] != 'a2']
+            self.assertEqual(group1, [('b1', 1), ('a1', 3)])
+
+            t0 = time.perf_counter()
+            durations = executor.set_parameters(items, settle=True)
+            self.assertLess(max(durations.values()), 0.05)
+            self.assertGreaterEqual(time.perf_counter() - t0, 0.1)
+            self.assertEqual(ins2.a.post_delay, 0.1)
+        finally:
+            executor.shutdown()
+            ins1.close()
+            ins2.close()
+
+
+    def test_snapshot_parameters(self):
+        class _BulkInstrument(Instrument):
+            def get_bulk_values(self, params):
+                self.bulk_calls.append(list(params))
+                return {p: self.values[p.name] for p in params}
+
+        ins1 = _BulkInstrument('test_bulk_ins')
+        ins2 = Instrument('test_group_ins2')
+        try:
+            ins1.bulk_calls, ins1.values = [], {'a': 1., 'b': 2.}
+            ins1.add_parameter('a', get_cmd=lambda: 1 / 0)  # only readable in bulk
+            ins1.add_parameter('b', get_cmd=lambda: 1 / 0)
+            ins2.add_parameter('c', get_cmd=lambda: 3.)
+            d = DelegateParameter('d', source=ins1.a, scale=2)
+            values = snapshot_parameters([ins2.c, d, ins1.b, ins1.a])
+            self.assertEqual(list(values.keys()), [ins2.c, d, ins1.b, ins1.a])
+            self.assertEqual(list(values.values()), [3., 0.5, 2., 1.])
+            self.assertEqual(ins1.bulk_calls, [[ins1.a, ins1.b]])  # a single call per instrument
+            self.assertEqual(ins1.a.cache.get(get_if_invalid=False), 1.)
+        finally:
+            ins1.close()
+            ins2.close()
+
+
 class TestFunctions(unittest.TestCase):
     def test_split_sweep_shape(self):
         shape = [2, 3, 4, 5]
@@ -100,6 +972,27 @@ class TestFunctions(unittest.TestCase):
         for (arg, b) in arg_expected:
             self.assertEqual(is_qc_param(arg), b)
 
+    def test_validate_qc_param_values(self):
+        x1 = Parameter('x1', set_cmd=None, vals=vals.Numbers(-1, 1))
+        x2 = DelegateParameter('x2', source=x1, vals=vals.Numbers(-0.5, 2))
+        validate_qc_param_values(x2, np.linspace(-0.5, 1, 1000))
+        self.assertRaises(ValueError, validate_qc_param_values, x2, [0, 1.5])  # source validator
+        self.assertRaises(ValueError, validate_qc_param_values, x2, [-0.6, 0])
+        self.assertRaises(ValueError, validate_qc_param_values, x2, [0, np.nan])
+        self.assertRaises(TypeError, validate_qc_param_values, x2, [True, False])  # same as qcodes
+        i1 = Parameter('i1', set_cmd=None, vals=vals.Ints(0, 10))
+        validate_qc_param_values(i1, np.arange(11))
+        self.assertRaises(TypeError, validate_qc_param_values, i1, [0., 1.])
+        self.assertRaises(ValueError, validate_qc_param_values, i1, [0, 11])
+        p1 = Parameter('p1', set_cmd=None, vals=vals.PermissiveInts(0, 10))
+        validate_qc_param_values(p1, [1., 2.000001])
+        self.assertRaises(TypeError, validate_qc_param_values, p1, [1., 2.5])
+        m1 = Parameter('m1', set_cmd=None, vals=vals.Multiples(divisor=3))
+        self.assertRaises(ValueError, validate_qc_param_values, m1, [3, 6, 7])
+        e1 = Parameter('e1', set_cmd=None, vals=vals.Enum('a', 'b'))  # not vectorized
+        validate_qc_param_values(e1, ['a', 'b'])
+        self.assertRaises(ValueError, validate_qc_param_values, e1, ['a', 'c'])
+
 
 class TestSweeper(unittest.TestCase):
     def test_defaults(self):
@@ -206,6 +1099,26 @@ class TestSweeper(unittest.TestCase):
         self.assertEqual(sw.sweep_parameters, {})
         npt.assert_equal(sw.sweep_shape, np.array([]))
 
+    def test_checkpoint_config(self):
+        x1 = Parameter('x1', unit='V', set_cmd=None, get_cmd=None)
+        x2 = Parameter('x2', unit='V', set_cmd=None, get_cmd=None)
+        sw = Sweeper('Sweeper')
+        sw.sweep_values(x1, [0, 1, 2], dim=1)
+        sw.sweep_values(x2, [True, False], dim=2)
+        sw.set_sweep_shape([3, 2])
+        sw.set_sweep_order([5, 4, 3, 2, 1, 0])
+        config = json.loads(json.dumps(sw.get_checkpoint_config()))
+        self.assertEqual(config['sweep_shape'], [3, 2])
+        self.assertEqual(config['sweep_axes'][1]['values'], [True, False])
+        self.assertTrue(config['sweep_order'].startswith('custom:'))
+        sw._validate_checkpoint_config(config)
+
+        sw.set_sweep_order('snake')
+        self.assertRaises(ValueError, sw._validate_checkpoint_config, config)
+        sw.set_sweep_order([5, 4, 3, 2, 1, 0])
+        sw.sweep_values(x1, [0, 1, 3], dim=1)
+        self.assertRaises(ValueError, sw._validate_checkpoint_config, config)
+
     def test_set_config(self):
         x1 = Parameter('x1', unit='V', set_cmd=None, get_cmd=None)
         sw = Sweeper('Sweeper')
@@ -248,6 +1161,187 @@ class TestSweeper(unittest.TestCase):
         sw.set_config(note=t)
         self.assertEqual(sw.note, t)
 
+        self.assertEqual(sw.write_buffer_size, 1)
+        sw.set_config(write_buffer_size=100, write_buffer_time=2)
+        self.assertEqual(sw.write_buffer_size, 100)
+        self.assertEqual(sw.write_buffer_time, 2)
+        self.assertRaises(ValueError, sw.set_config, write_buffer_size=0)
+
+        self.assertEqual(sw.pipeline, False)
+        sw.set_config(pipeline=True, pipeline_queue_size=10)
+        self.assertEqual(sw.pipeline, True)
+        self.assertEqual(sw.pipeline_queue_size, 10)
+
+        self.assertEqual(sw.sweep_order, 'raster')
+        sw.set_config(sweep_order='snake')
+        self.assertEqual(sw.sweep_order, 'snake')
+
+        self.assertEqual(sw.checkpoint_interval, 10)
+        sw.set_config(checkpoint_interval=60)
+        self.assertEqual(sw.checkpoint_interval, 60)
+        self.assertRaises(ValueError, sw.set_config, checkpoint_interval=-1)
+
+
+
+class TestSweepRoundTrip(DatabaseTestCase):
+    """ Sweeps executed in a qcodes database and loaded with SweeperContent """
+    shape = (5, 3)
+
+    def setUp(self):
+        self.x = Parameter('x', unit='V', set_cmd=None, get_cmd=None, initial_value=0.)
+        self.y = Parameter('y', unit='V', set_cmd=None, get_cmd=None, initial_value=0.)
+        self.r = Parameter('r', get_cmd=lambda: self.x() + 10 * self.y())
+        self.trace = Parameter('trace', get_cmd=lambda: np.arange(8.) + self.x() + 10 * self.y(),
+                               vals=vals.Arrays(shape=(8,)))
+
+    def _make_sweeper(self, readouts=None, **kwargs) -> Sweeper:
+        sw = Sweeper('Sweeper')
+        sw.sweep_linear(self.x, 0, 4, dim=1)
+        sw.sweep_linear(self.y, 0, 2, dim=2)
+        readouts = [self.r] if readouts is None else readouts
+        sw.set_config(sweep_shape=list(self.shape), readouts=readouts, show_progress_bar=False, **kwargs)
+        return sw
+
+    def _failing_readout(self, step: int) -> Parameter:
+        """ Same readout as r, which raises an error at the given step (ex: timeout of an instrument) """
+        calls = []
+
+        def get():
+            calls.append(1)
+            if len(calls) == step + 1:
+                raise RuntimeError('timeout')
+            return self.r()
+
+        return Parameter('r', get_cmd=get)
+
+    def _expected(self) -> np.ndarray:
+        x, y = np.meshgrid(np.linspace(0, 4, 5), np.linspace(0, 2, 3), indexing='ij')
+        return x + 10 * y
+
+    def test_write_buffer(self):
+        sw = self._make_sweeper()
+        sw.set_write_buffer(size=4)  # the last 3 steps are written by the final flush
+        content = self.load(sw.execute())
+        self.assertEqual(content.datasets[0].name, 'r')
+        npt.assert_equal(content.datasets[0].value, self._expected())
+        npt.assert_equal(content.axes[0].value, np.linspace(0, 4, 5))
+        self.assertTrue(np.all(content.get_measured_mask()))
+
+    def test_pipeline(self):
+        sw = self._make_sweeper(readouts=[self.r, self.trace], pipeline=True)
+        content = self.load(sw.execute())
+        npt.assert_equal(content.datasets[0].value, self._expected())
+        npt.assert_equal(content.datasets[1].value, np.arange(8.)[:, None, None] + self._expected())
+
+        # Interrupted in the acquisition thread: the steps measured before the error are saved
+        sw = self._make_sweeper(readouts=[self._failing_readout(step=7)], pipeline=True)
+        self.assertRaises(RuntimeError, sw.execute)
+        content = self.load_last()
+        npt.assert_equal(content.get_measured_mask().ravel(order='F'), np.arange(15) < 7)
+        npt.assert_equal(content.datasets[0].value.ravel(order='F')[:7], self._expected().ravel(order='F')[:7])
+
+    def test_resume(self):
+        sw = self._make_sweeper(readouts=[self._failing_readout(step=7)], sweep_order='snake')
+        self.assertRaises(RuntimeError, sw.execute)
+        first = self.load_last()
+        self.assertEqual(np.sum(first.get_measured_mask()), 7)
+
+        sw = self._make_sweeper(sweep_order='snake')
+        run_id = sw.resume(first.qc_ds.run_id)
+        content = self.load(run_id)
+        self.assertEqual(content.linked_run_ids, [first.qc_ds.run_id])
+        self.assertEqual(json.loads(content.qc_ds.metadata['sweep_checkpoint'])['resumed_from'], first.qc_ds.run_id)
+        self.assertEqual(np.sum(content._get_saved_mask()), 15 - 7)  # only the remaining steps in the new dataset
+        self.assertTrue(np.all(content.get_measured_mask()))
+        npt.assert_equal(content.datasets[0].value, self._expected())
+        self.assertRaises(ValueError, sw.resume, run_id)  # already completed
+
+    def test_rules(self):
+        sw = self._make_sweeper(readouts=[self.r, self.trace])
+        sw.add_rule(lambda res: res[self.r] - 10 * self.y() >= 2, 'skip', dim=1)  # x > 2 of each line
+        content = self.load(sw.execute())
+        skipped = np.linspace(0, 4, 5) > 2
+        expected = np.where(skipped[:, None], np.nan, self._expected())
+        npt.assert_equal(content.datasets[0].value, expected)
+        npt.assert_equal(content.datasets[1].value, np.arange(8.)[:, None, None] + expected)  # nan arrays
+        self.assertEqual(content.datasets[1].shape, (8,) + self.shape)
+        events = json.loads(content.qc_ds.metadata['sweep_rules'])
+        self.assertEqual([e['step'] for e in events], [2, 7, 12])
+
+        sw = self._make_sweeper()
+        sw.add_rule((self.r, '>', 11), 'abort')
+        content = self.load(sw.execute())
+        measured = self._expected().ravel(order='F')[:8]
+        npt.assert_equal(content.datasets[0].value.ravel(order='F')[:8], measured)  # the step 7 is saved
+        self.assertTrue(np.all(np.isnan(content.datasets[0].value.ravel(order='F')[8:])))
+        self.assertEqual(json.loads(content.qc_ds.metadata['sweep_rules'])[0]['action'], 'abort')
+
+    def test_reduction(self):
+        sw = self._make_sweeper(readouts=[self.r, self.trace])
+        sw.set_reduction(self.trace, 'boxcar', width=4, raw=True)
+        content = self.load(sw.execute())
+        ds = content.datasets[1]
+        self.assertEqual(ds.shape, (2,) + self.shape)
+        npt.assert_allclose(ds.value, np.array([1.5, 5.5])[:, None, None] + self._expected())
+        axis = ds.get_axis('trace_sample')
+        self.assertEqual(axis.dim, 0)
+        npt.assert_equal(axis.value, [1.5, 5.5])  # centers of the blocks
+        self.assertEqual(content.get_reduction('trace').width, 4)
+
+        path = content.qc_ds.metadata['sweep_raw_file']
+        self.assertEqual(os.path.dirname(path), os.path.join(self._db_folder, 'raw'))
+        raw = content.load_raw('trace')
+        self.assertEqual(raw.shape, (15, 8))
+        npt.assert_equal(raw, np.arange(8.)[None, :] + self._expected().ravel(order='F')[:, None])
+        self.assertRaises(ValueError, content.load_raw, 'r')
+
+    def test_executor_shutdown(self):
+        instruments = [Instrument(f'shutdown_i{k}') for k in range(2)]
+        try:
+            for instr in instruments:
+                instr.add_parameter('v', set_cmd=None, get_cmd=None, initial_value=0.)
+            sw = Sweeper('Sweeper')
+            sw.sweep_linear(instruments[0].v, 0, 1, dim=1)
+            sw.sweep_linear(instruments[1].v, 0, 1, dim=1)
+            sw.set_config(sweep_shape=[5], readouts=[self._failing_readout(step=2)], show_progress_bar=False,
+                          apply_method=sw.concurrent_apply)
+            self.assertRaises(RuntimeError, sw.execute)
+            self.assertIsNone(sw._group_executor._executor)  # the worker threads were stopped
+            self.assertFalse(any(t.name.startswith('GroupExecutor') for t in threading.enumerate()))
+        finally:
+            [instr.close() for instr in instruments]
+
+    def test_async_pipeline(self):
+        sw = AsyncSweeper('Sweeper')
+        sw.sweep_linear(self.x, 0, 4, dim=1)
+        sw.set_config(sweep_shape=[5], readouts=[self.r], show_progress_bar=False)
+        self.assertRaisesRegex(ValueError, 'pipeline', sw.execute, pipeline=True)
+        ds = load_by_id(sw.execute(pipeline=False))
+        npt.assert_equal(ds.get_parameter_data('r')['r']['r'], self._expected()[:, 0])
+
+    def test_lazy_loading(self):
+        sw = self._make_sweeper(readouts=[self.r, self.trace])
+        ds = load_by_id(sw.execute())
+        queries = []
+        get_parameter_data = ds.get_parameter_data
+        ds.get_parameter_data = lambda *names: queries.append(names) or get_parameter_data(*names)
+        content = SweeperContent(ds)
+        self.assertTrue(all(len(names) > 0 for names in queries))  # never the whole run
+        self.assertEqual([d.name for d in content.datasets], ['r', 'trace'])
+        self.assertFalse(any(d.is_loaded for d in content.datasets))
+        self.assertNotIn('r', content.qc_data.keys())
+        self.assertEqual(content.datasets[1].shape, (8,) + self.shape)
+        self.assertEqual(len(content.axes), 2 + 2)  # swept axes and counters, without loading
+
+        n_queries = len(queries)
+        npt.assert_equal(content.datasets[1].value, np.arange(8.)[:, None, None] + self._expected())
+        self.assertEqual(queries[n_queries:], [('trace',)])
+        self.assertNotIn('r', content.qc_data.keys())
+        content.datasets[1].value  # cached
+        self.assertEqual(len(queries), n_queries + 1)
+        npt.assert_equal(content.datasets[0].value, self._expected())
+        self.assertEqual(queries[n_queries + 1:], [('r',)])
+
 
 if __name__ == '__main__':
     unittest.main()